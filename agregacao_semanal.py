@@ -0,0 +1,145 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from armazem_notificacoes import para_date32
+from filtro_regional import montar_filtro_municipios
+from instrumentacao import contar, medir
+
+# Parciais (município, semana, casos) acumuladas antes de uma fusão intermediária:
+# a memória fica limitada ao tamanho do agregado, nunca ao número de notificações
+MAX_LINHAS_PARCIAIS = 1_000_000
+
+SCHEMA_CASOS = pa.schema([('ID_MN_RESI', pa.string()), ('DT_SEMANA', pa.date32()), ('casos', pa.int64())])
+
+
+def fim_da_semana_arrow(datas):
+    """date32 -> domingo que fecha a semana (W-SUN): data + (6 - dia da semana, segunda = 0)."""
+    dias = datas.cast(pa.int32())
+    return pc.add(dias, pc.subtract(6, pc.day_of_week(datas)).cast(pa.int32())).cast(pa.date32())
+
+
+def agregar_lote(batch, coluna_data='DT_NOTIFIC', coluna_municipio='ID_MN_RESI'):
+    """Um RecordBatch de notificações -> parcial (ID_MN_RESI, DT_SEMANA, casos). Sem data = descartada."""
+    semanas = fim_da_semana_arrow(para_date32(batch.column(coluna_data)))
+    tabela = pa.table({
+        'ID_MN_RESI': batch.column(coluna_municipio).cast(pa.string()),
+        'DT_SEMANA': semanas
+    }).filter(pc.is_valid(semanas))
+    return tabela.group_by(['ID_MN_RESI', 'DT_SEMANA']).aggregate([([], 'count_all')]) \
+        .rename_columns(['ID_MN_RESI', 'DT_SEMANA', 'casos'])
+
+
+def fundir_parciais(parciais):
+    """Soma parciais que repetem a mesma (município, semana)."""
+    tabela = pa.concat_tables(parciais)
+    return tabela.group_by(['ID_MN_RESI', 'DT_SEMANA']).aggregate([('casos', 'sum')]) \
+        .rename_columns(['ID_MN_RESI', 'DT_SEMANA', 'casos'])
+
+
+@medir("agregacao_semanal")
+def agregar_casos_semanais(fonte, codigos=None, max_workers=None, batch_size=200_000):
+    """
+    Casos por (município, semana epidemiológica) direto do Parquet do SINAN, sem
+    materializar notificações: o scan lê só DT_NOTIFIC e ID_MN_RESI (com o filtro
+    de municípios empurrado para o Arrow), cada lote vira uma parcial agrupada
+    numa thread do pool e as parciais são fundidas pelo caminho.
+
+    fonte: arquivo, pasta, lista de arquivos, pyarrow Dataset (ex: abrir_armazem()) ou
+    pyarrow Table (ex: ler_partes_consolidadas()).
+    Retorna uma pyarrow.Table (ID_MN_RESI, DT_SEMANA date32, casos int64) ordenada.
+    """
+    if fonte is None or (isinstance(fonte, list) and not fonte):
+        return SCHEMA_CASOS.empty_table()
+    if isinstance(fonte, pa.Table):
+        dataset = ds.dataset(fonte)
+    else:
+        dataset = fonte if isinstance(fonte, ds.Dataset) else ds.dataset(fonte, format="parquet")
+    scanner = dataset.scanner(
+        columns=['DT_NOTIFIC', 'ID_MN_RESI'],
+        filter=montar_filtro_municipios(codigos) if codigos else None,
+        batch_size=batch_size,
+        use_threads=True
+    )
+    max_workers = max_workers or os.cpu_count() or 1
+
+    parciais, pendentes = [], []
+    linhas_parciais = linhas_lidas = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in scanner.to_batches():
+            linhas_lidas += batch.num_rows
+            pendentes.append(executor.submit(agregar_lote, batch))
+            # No máximo 2 lotes por thread em voo: o scan não corre na frente da agregação
+            while len(pendentes) > 2 * max_workers or (pendentes and pendentes[0].done()):
+                parcial = pendentes.pop(0).result()
+                parciais.append(parcial)
+                linhas_parciais += parcial.num_rows
+                if linhas_parciais > MAX_LINHAS_PARCIAIS:
+                    parciais = [fundir_parciais(parciais)]
+                    linhas_parciais = parciais[0].num_rows
+        parciais.extend(futuro.result() for futuro in pendentes)
+
+    contar(linhas_lidas=linhas_lidas)
+    if not parciais:
+        return SCHEMA_CASOS.empty_table()
+    casos = fundir_parciais(parciais).sort_by([('ID_MN_RESI', 'ascending'), ('DT_SEMANA', 'ascending')])
+    contar(linhas=casos.num_rows)
+    return casos
+
+
+def para_pandas(casos):
+    """Agregado Arrow -> DataFrame com DT_SEMANA em datetime64[ns] (o formato das outras bases)."""
+    df = casos.to_pandas(date_as_object=False)
+    df['DT_SEMANA'] = df['DT_SEMANA'].astype('datetime64[ns]')
+    return df
+
+
+def completar_semanas(casos):
+    """
+    Cada município da sua primeira à sua última semana com caso (semana sem
+    notificação = 0), exatamente como o antigo resample('W-SUN').size().
+    """
+    if len(casos) == 0:
+        return casos
+    limites = casos.groupby('ID_MN_RESI', observed=True)['DT_SEMANA'].agg(['min', 'max'])
+    n_semanas = ((limites['max'] - limites['min']).dt.days // 7 + 1).to_numpy()
+    inicios = np.cumsum(n_semanas) - n_semanas
+    deslocamento = np.arange(n_semanas.sum()) - np.repeat(inicios, n_semanas)
+    grade = pd.MultiIndex.from_arrays([
+        np.repeat(limites.index.to_numpy(), n_semanas),
+        np.repeat(limites['min'].to_numpy(), n_semanas) + deslocamento * np.timedelta64(7, 'D')
+    ], names=['ID_MN_RESI', 'DT_SEMANA'])
+    return casos.set_index(['ID_MN_RESI', 'DT_SEMANA'])['casos'].reindex(grade, fill_value=0).reset_index()
+
+
+def serie_regional(casos, nome='casos'):
+    """Soma dos municípios por semana, contínua (semana sem caso = 0): (DT_SEMANA, nome)."""
+    if len(casos) == 0:
+        return pd.DataFrame({'DT_SEMANA': pd.Series(dtype='datetime64[ns]'), nome: pd.Series(dtype='int64')})
+    total = casos.groupby('DT_SEMANA')['casos'].sum()
+    semanas = pd.date_range(total.index.min(), total.index.max(), freq='W-SUN', name='DT_SEMANA')
+    return total.reindex(semanas, fill_value=0).rename(nome).reset_index()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Casos por município x semana direto de Parquets do SINAN.")
+    parser.add_argument("fontes", nargs="+", help="Arquivos/pastas DENGBR*.parquet")
+    parser.add_argument("--saida", default="casos_semanais.parquet")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    # Cada fonte pode ser uma pasta de fragmentos (ex: DENGBR24.parquet/)
+    fonte = ds.dataset([ds.dataset(f, format="parquet") for f in args.fontes])
+    casos = agregar_casos_semanais(fonte, max_workers=args.workers)
+    para_pandas(casos).to_parquet(args.saida, index=False)
+    print(f"🧊 {casos.num_rows} linhas (município x semana), {pc.sum(casos['casos']).as_py()} casos "
+          f"em {time.perf_counter() - inicio:.1f}s -> {args.saida}")
@@ -0,0 +1,146 @@
+import os
+import json
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from backtesting import ARQUIVO_DATASET, PASTA_CACHE, abrir_matriz, carregar_matriz
+from motor_features import LAGS_CASOS, LAGS_CLIMA
+from treinamento_com_dengue_e_clima import ARQUIVO_CONFIG_XGB, filtrar_features_por_lags
+
+# Validação cronológica: treina antes de 2023, valida em 2023 (2024 fica de fora)
+INICIO_VALIDACAO = "2023-01-01"
+FIM_VALIDACAO = "2024-01-01"
+
+PARADA_ANTECIPADA = 50
+
+# Conjuntos de lags candidatos (sempre subconjuntos das colunas do dataset)
+OPCOES_LAGS_CASOS = [LAGS_CASOS, [1, 2, 4], [1, 2], [1, 4, 8]]
+OPCOES_LAGS_CLIMA = [LAGS_CLIMA, [2, 3, 4], [3, 4, 8], [4, 8]]
+
+# Matriz do dataset aberta (mmap) uma vez por worker
+_MATRIZ = {}
+
+
+def sortear_configs(n, semente=42):
+    """Configurações aleatórias (XGBoost + conjunto de lags)."""
+    rng = np.random.default_rng(semente)
+    configs = []
+    for _ in range(n):
+        configs.append({
+            'parametros': {
+                'max_depth': int(rng.integers(3, 9)),
+                'learning_rate': float(10 ** rng.uniform(-2, -0.7)),
+                'subsample': float(rng.uniform(0.6, 1.0)),
+                'colsample_bytree': float(rng.uniform(0.5, 1.0)),
+                'min_child_weight': float(10 ** rng.uniform(0, 1)),
+                'reg_lambda': float(10 ** rng.uniform(-1, 1)),
+                'random_state': 42
+            },
+            'lags_casos': OPCOES_LAGS_CASOS[rng.integers(len(OPCOES_LAGS_CASOS))],
+            'lags_clima': OPCOES_LAGS_CLIMA[rng.integers(len(OPCOES_LAGS_CLIMA))]
+        })
+    return configs
+
+
+def _inicializar_worker(prefixo):
+    _MATRIZ['dados'] = abrir_matriz(prefixo)
+
+
+def _avaliar_config(config, max_rodadas, n_threads):
+    """
+    Worker: treina até max_rodadas árvores com parada antecipada na validação
+    cronológica. Retorna o RMSE da melhor iteração e quantas árvores ela usou.
+    """
+    matrizes, features = _MATRIZ['dados']
+    datas = matrizes['datas']
+    i_validacao = int(np.searchsorted(datas, np.datetime64(pd.Timestamp(INICIO_VALIDACAO), 'ns')))
+    i_fim = int(np.searchsorted(datas, np.datetime64(pd.Timestamp(FIM_VALIDACAO), 'ns')))
+
+    selecionadas = filtrar_features_por_lags(features, config['lags_casos'], config['lags_clima'])
+    X = matrizes['X'][:, [features.index(f) for f in selecionadas]]
+    y = matrizes['y']
+
+    model = xgb.XGBRegressor(
+        **config['parametros'],
+        n_estimators=max_rodadas,
+        early_stopping_rounds=PARADA_ANTECIPADA,
+        eval_metric='rmse',
+        n_jobs=n_threads
+    )
+    model.fit(X[:i_validacao], y[:i_validacao], eval_set=[(X[i_validacao:i_fim], y[i_validacao:i_fim])], verbose=False)
+    return {
+        'config': config,
+        'rodadas': max_rodadas,
+        'melhor_iteracao': int(model.best_iteration),
+        'rmse_validacao': float(model.best_score)
+    }
+
+
+def successive_halving(configs, executor, n_threads, rodadas_min=100, rodadas_max=2000, eta=3):
+    """
+    Todas as configs começam com poucas árvores; a cada rodada só o melhor 1/eta
+    segue, com eta vezes mais árvores. A parada antecipada corta cedo quem não melhora.
+    """
+    rodadas = rodadas_min
+    historico = []
+    while True:
+        resultados = list(executor.map(_avaliar_config, configs, [rodadas] * len(configs), [n_threads] * len(configs)))
+        resultados.sort(key=lambda r: r['rmse_validacao'])
+        historico.extend(resultados)
+        print(f"   🔎 {len(configs)} config(s) x até {rodadas} árvores | melhor RMSE: {resultados[0]['rmse_validacao']:.3f}")
+        if len(configs) == 1 or rodadas >= rodadas_max:
+            return resultados[0], historico
+        configs = [r['config'] for r in resultados[:max(1, math.ceil(len(configs) / eta))]]
+        rodadas = min(rodadas * eta, rodadas_max)
+
+
+def salvar_config(melhor, arquivo=ARQUIVO_CONFIG_XGB):
+    """Grava a melhor config pronta para o XGBRegressor (n_estimators = melhor iteração + 1)."""
+    config = {
+        'parametros': {**melhor['config']['parametros'], 'n_estimators': melhor['melhor_iteracao'] + 1},
+        'lags_casos': melhor['config']['lags_casos'],
+        'lags_clima': melhor['config']['lags_clima'],
+        'rmse_validacao': melhor['rmse_validacao'],
+        'validacao': [INICIO_VALIDACAO, FIM_VALIDACAO]
+    }
+    with open(arquivo + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(arquivo + ".tmp", arquivo)
+    return config
+
+
+def ajustar(n_configs=27, threads_por_trial=1, max_workers=None, semente=42,
+            arquivo=ARQUIVO_DATASET, pasta_cache=PASTA_CACHE):
+    """
+    Busca em paralelo: cada trial usa threads_por_trial threads do XGBoost e
+    cabem (núcleos // threads_por_trial) trials ao mesmo tempo.
+    """
+    prefixo = carregar_matriz(arquivo, pasta_cache)
+    max_workers = max_workers or max(1, (os.cpu_count() or 1) // threads_por_trial)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_worker,
+                             initargs=(prefixo,)) as executor:
+        melhor, historico = successive_halving(sortear_configs(n_configs, semente), executor, threads_por_trial)
+    return salvar_config(melhor), historico
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajuste de hiperparâmetros do modelo V2 (successive halving).")
+    parser.add_argument("--configs", type=int, default=27, help="Configurações sorteadas na primeira rodada.")
+    parser.add_argument("--threads-por-trial", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="Trials simultâneos (padrão: núcleos / threads).")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"🎛️ Ajustando XGBoost: {args.configs} configurações, validação {INICIO_VALIDACAO} a {FIM_VALIDACAO}...")
+    try:
+        config, _ = ajustar(args.configs, args.threads_por_trial, args.workers, args.semente)
+    except FileNotFoundError as e:
+        print(f"❌ Erro: Arquivo não encontrado ({e}). Rode processamento_final_merge.py antes.")
+    else:
+        print(f"🏆 RMSE validação: {config['rmse_validacao']:.3f} | {config['parametros']['n_estimators']} árvores")
+        print(f"💾 Configuração salva: {ARQUIVO_CONFIG_XGB}")
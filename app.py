@@ -1,8 +1,9 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
 import os
-from PIL import Image
+
+import streamlit as st
+
+from configuracao import caminho_dado
+from instrumentacao import medir
 
 # Configuração da Página
 st.set_page_config(
@@ -11,40 +12,112 @@ st.set_page_config(
     layout="wide"
 )
 
+# Arquivos publicados (resolvidos por configuracao.caminho_dado: pasta atual, datasets/, graficos/)
+ARQUIVO_NOTIFICACOES_LEGADO = "dataset_dengue_II_GERES.parquet"
+ARQUIVO_PREVISAO_V1 = "previsao_2024_estimada.parquet"
+ARQUIVO_PREVISAO_V2 = "previsao_2024_com_clima.parquet"
+
 # --- FUNÇÕES DE CARREGAMENTO ---
-@st.cache_data
+# Bibliotecas pesadas (pandas/pyarrow, plotly, PIL, xgboost) são importadas só
+# quando a função/seção que usa é executada. cache_resource guarda uma única
+# cópia (somente leitura) para todas as sessões, em vez de uma por usuário.
+# medir fica por baixo do cache: só as cargas de verdade (cache miss) vão para o log.
+@st.cache_resource
+@medir("painel_dados_historicos")
 def carregar_dados_historicos():
+    """Cubo semanal (município x semana) já agregado pelo pipeline."""
+    from cubo_semanal import ARQUIVO_CUBO, carregar_cubo, construir_cubo
+    try:
+        return carregar_cubo(caminho_dado(ARQUIVO_CUBO))
+    except FileNotFoundError:
+        pass
+    # Sem o cubo materializado, agrega uma vez no Arrow (só data e município) a partir
+    # da base particionada ou, em último caso, do dataset publicado em datasets/
+    from agregacao_semanal import agregar_casos_semanais, para_pandas
+    from armazem_notificacoes import PASTA_ARMAZEM, abrir_armazem
     try:
-        df = pd.read_parquet("dataset_dengue_II_GERES.parquet")
-        df['DT_NOTIFIC'] = pd.to_datetime(df['DT_NOTIFIC'])
-        return df
+        fonte = abrir_armazem(caminho_dado(PASTA_ARMAZEM))
     except FileNotFoundError:
+        fonte = caminho_dado(ARQUIVO_NOTIFICACOES_LEGADO)
+        if not os.path.exists(fonte):
+            return None
+    cubo = construir_cubo(para_pandas(agregar_casos_semanais(fonte)))
+    return cubo.set_index(['ID_MN_RESI', 'DT_SEMANA']).sort_index()
+
+def carregar_realidade_2024():
+    """
+    Casos reais de 2024 por município x semana: o cubo de 2024 gravado pela etapa
+    de comparação (comparativo_final_clima.py). O painel só lê; None se não existir.
+    """
+    from cubo_semanal import ARQUIVO_CUBO_2024
+    arquivo = caminho_dado(ARQUIVO_CUBO_2024)
+    if not os.path.exists(arquivo):
         return None
+    # mtime na chave do cache: um cubo regravado pelo pipeline é relido sem reiniciar o painel
+    return ler_cubo_2024(arquivo, os.path.getmtime(arquivo))
+
+@st.cache_resource
+@medir("painel_realidade_2024")
+def ler_cubo_2024(arquivo, versao):
+    from cubo_semanal import carregar_cubo
+    cubo = carregar_cubo(arquivo)
+    return cubo if len(cubo) else None
+
+def serie_realidade(realidade, municipio):
+    """Semanas cobertas pelo DENGBR24; município sem notificação numa semana coberta = 0."""
+    import pandas as pd
+    from cubo_semanal import CHAVE_REGIONAL
+    semanas = realidade.loc[CHAVE_REGIONAL].index
+    if municipio in realidade.index.get_level_values('ID_MN_RESI'):
+        serie = realidade.loc[municipio]['casos'].reindex(semanas, fill_value=0)
+    else:
+        serie = pd.Series(0, index=semanas)
+    return serie.rename('Realidade').reset_index()
+
+def somar_coluna(arquivo, colunas):
+    """Soma a primeira coluna existente do Parquet, lendo só ela."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    nomes = pq.read_schema(arquivo).names
+    coluna = next(c for c in colunas if c in nomes)
+    return pc.sum(pq.read_table(arquivo, columns=[coluna])[coluna]).as_py()
 
 @st.cache_data
+@medir("painel_previsoes_2024")
 def carregar_previsoes_2024():
     """Carrega os dados gerados pelos modelos para calcular KPIs"""
     dados = {}
     try:
         # Modelo V1 (Sem Clima)
-        if os.path.exists("previsao_2024_estimada.parquet"):
-            df_v1 = pd.read_parquet("previsao_2024_estimada.parquet")
-            dados['v1'] = df_v1['casos'].sum()
+        arquivo_v1 = caminho_dado(ARQUIVO_PREVISAO_V1)
+        if os.path.exists(arquivo_v1):
+            dados['v1'] = somar_coluna(arquivo_v1, ['casos'])
         
         # Modelo V2 (Com Clima)
-        if os.path.exists("previsao_2024_com_clima.parquet"):
-            df_v2 = pd.read_parquet("previsao_2024_com_clima.parquet")
+        arquivo_v2 = caminho_dado(ARQUIVO_PREVISAO_V2)
+        if os.path.exists(arquivo_v2):
             # Ajuste de nome de coluna dependendo do script que gerou
-            col_casos = 'casos_previstos_ia' if 'casos_previstos_ia' in df_v2.columns else 'casos'
-            dados['v2'] = df_v2[col_casos].sum()
+            dados['v2'] = somar_coluna(arquivo_v2, ['casos_previstos_ia', 'casos'])
             
     except Exception as e:
         st.warning(f"Não foi possível carregar métricas de 2024: {e}")
     return dados
 
+@st.cache_resource
+@medir("painel_motor")
+def carregar_motor():
+    """Modelos do registro + séries semanais, compartilhados por todas as sessões."""
+    from previsao_interativa import ARQUIVO_DATASET_REGIONAL, MotorPainel
+    from processamento_final_merge import ARQUIVO_PAINEL_MUNICIPAL
+    from registro_modelos import PASTA_MODELOS
+    return MotorPainel(caminho_dado(ARQUIVO_DATASET_REGIONAL), caminho_dado(ARQUIVO_PAINEL_MUNICIPAL),
+                       caminho_dado(PASTA_MODELOS))
+
 def carregar_imagem(nome_arquivo):
-    if os.path.exists(nome_arquivo):
-        return Image.open(nome_arquivo)
+    caminho = caminho_dado(nome_arquivo)
+    if os.path.exists(caminho):
+        from PIL import Image
+        return Image.open(caminho)
     return None
 
 # --- HEADER ---
@@ -56,16 +129,18 @@ Painel de inteligência epidemiológica que une dados do SINAN e variáveis clim
 para prever cenários de risco de arboviroses na Zona da Mata Norte e Agreste.
 """)
 
-df = carregar_dados_historicos()
+cubo = carregar_dados_historicos()
 
-if df is None:
+if cubo is None:
     st.error("⚠️ Arquivo de dados históricos não encontrado.")
     st.stop()
 
+from cubo_semanal import CHAVE_REGIONAL, fatiar_cubo, listar_municipios
+
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("⚙️ Filtros")
-    cidades = sorted(df['ID_MN_RESI'].unique())
+    cidades = sorted(listar_municipios(cubo))
     cidade_selecionada = st.selectbox("Município", ["Todos (Visão Regional)"] + list(cidades))
     
     st.markdown("---")
@@ -75,19 +150,15 @@ with st.sidebar:
     * **V2:** Histórico + Clima (Chuva/Temp com Lags Biológicos)
     """)
 
-if cidade_selecionada != "Todos (Visão Regional)":
-    df_filtrado = df[df['ID_MN_RESI'] == cidade_selecionada]
-else:
-    df_filtrado = df
-
-# Agrupamento Semanal
-df_semanal = df_filtrado.set_index('DT_NOTIFIC').resample('W').size().reset_index(name='casos')
+# Curva Semanal: fatia indexada do cubo (sem reagrupar notificações a cada seleção)
+municipio = cidade_selecionada if cidade_selecionada != "Todos (Visão Regional)" else CHAVE_REGIONAL
+df_semanal = fatiar_cubo(cubo, municipio)
 
 # --- KPIs GERAIS ---
 col1, col2, col3, col4 = st.columns(4)
-total_casos = df_filtrado.shape[0]
+total_casos = df_semanal['casos'].sum()
 pico_semanal = df_semanal['casos'].max()
-data_pico = df_semanal.loc[df_semanal['casos'].idxmax(), 'DT_NOTIFIC'].strftime('%d/%m/%Y')
+data_pico = df_semanal.loc[df_semanal['casos'].idxmax(), 'DT_SEMANA'].strftime('%d/%m/%Y')
 media_semanal = df_semanal['casos'].mean()
 
 col1.metric("Total Notificações (19-23)", f"{total_casos:,.0f}".replace(",", "."))
@@ -97,32 +168,49 @@ col4.metric("Média Semanal", f"{media_semanal:.1f}")
 
 st.markdown("---")
 
-# --- ABAS ---
-tab1, tab2, tab3 = st.tabs(["📊 Monitoramento", "🧠 A Mente da IA", "🔮 Validação & Impacto (2024)"])
+# --- SEÇÕES ---
+# st.tabs executa o conteúdo de todas as abas a cada interação; com a navegação
+# por seção, só a aberta roda (e só ela carrega modelo, plotly, imagens...)
+secao = st.radio(
+    "Seção", ["📊 Monitoramento", "🧠 A Mente da IA", "🔮 Validação & Impacto (2024)"],
+    horizontal=True, label_visibility="collapsed"
+)
 
-# ABA 1: HISTÓRICO
-with tab1:
+# SEÇÃO 1: HISTÓRICO
+if secao == "📊 Monitoramento":
+    import plotly.express as px
     st.subheader("Curva Epidemiológica Histórica (2019-2023)")
-    fig = px.line(df_semanal, x='DT_NOTIFIC', y='casos', markers=True)
+    fig = px.line(df_semanal, x='DT_SEMANA', y='casos', markers=True)
     fig.update_traces(line_color='#8B0000', line_width=2)
     fig.update_layout(xaxis_title="Data", yaxis_title="Casos", hovermode="x unified")
     st.plotly_chart(fig, use_container_width=True)
 
-# ABA 2: FEATURE IMPORTANCE
-with tab2:
+# SEÇÃO 2: FEATURE IMPORTANCE
+elif secao == "🧠 A Mente da IA":
+    import plotly.express as px
+    # Modelo persistido (registro) para importância sob demanda
+    motor = carregar_motor()
     st.subheader("O que impulsiona a epidemia?")
     col_feat1, col_feat2 = st.columns([2, 1])
     
     with col_feat1:
-        # Tenta carregar a imagem específica do modelo com clima
-        img_feat = carregar_imagem("feature_importance_clima.png")
-        if not img_feat:
-            img_feat = carregar_imagem("feature_importance.png") # Fallback
-            
-        if img_feat:
-            st.image(img_feat, caption="Peso das Variáveis na Decisão do Modelo", use_container_width=True)
+        if motor.disponivel(municipio):
+            # Calculado direto do booster do modelo usado para esta seleção
+            df_importancia = motor.importancia(municipio)
+            fig_imp = px.bar(df_importancia.iloc[::-1], x='ganho', y='feature', orientation='h')
+            fig_imp.update_traces(marker_color='#8B0000')
+            fig_imp.update_layout(xaxis_title="Ganho médio", yaxis_title="", title="Peso das Variáveis na Decisão do Modelo")
+            st.plotly_chart(fig_imp, use_container_width=True)
         else:
-            st.warning("Gráfico de importância não encontrado.")
+            # Sem modelo no registro: imagem gerada pelo script de treino
+            img_feat = carregar_imagem("feature_importance_clima.png")
+            if not img_feat:
+                img_feat = carregar_imagem("feature_importance.png") # Fallback
+                
+            if img_feat:
+                st.image(img_feat, caption="Peso das Variáveis na Decisão do Modelo", use_container_width=True)
+            else:
+                st.warning("Gráfico de importância não encontrado.")
             
     with col_feat2:
         st.info("""
@@ -135,8 +223,12 @@ with tab2:
         🌧️ **Chuva Acumulada:** Fundamental para formação de criadouros, aparecendo com forte relevância nos lags de 3 a 4 semanas.
         """)
 
-# ABA 3: O GRANDE FINAL (2024)
-with tab3:
+# SEÇÃO 3: O GRANDE FINAL (2024)
+else:
+    import plotly.express as px
+    from previsao_interativa import CENARIOS_PAINEL
+    # Modelo persistido (registro) para previsão sob demanda
+    motor = carregar_motor()
     st.subheader(" O Confronto Final: Realidade vs Potencial Biológico (2024)")
     
     st.markdown("""
@@ -144,27 +236,62 @@ with tab3:
     e o **risco biológico real** impulsionado pelo El Niño (IA V2 com Clima).
     """)
     
-    # Carregar Imagem Final
-    img_confronto = carregar_imagem("confronto_final_modelos.png")
-    
-    if img_confronto:
-        st.image(img_confronto, use_container_width=True, caption="Gráfico gerado pelo script 'comparativo_final_clima.py'")
+    # KPIs de 2024
+    metricas = carregar_previsoes_2024()
+
+    if motor.disponivel(municipio):
+        col_h, col_c = st.columns(2)
+        horizonte = col_h.slider("Horizonte (semanas a partir de jan/2024)", min_value=4, max_value=52, value=52, step=4)
+        cenario = col_c.selectbox("Cenário climático", list(CENARIOS_PAINEL))
+
+        # Previsão sob demanda (cache LRU por município, horizonte e cenário)
+        df_previsao = motor.prever(municipio, horizonte, cenario)
+        df_confronto = df_previsao.rename(columns={'casos_previstos_ia': 'IA V2 (Com Clima)'})
+        linhas = ['IA V2 (Com Clima)']
+        # Realidade de 2024 vem do DENGBR24 (o cubo histórico termina em 2023)
+        realidade_2024 = carregar_realidade_2024()
+        if realidade_2024 is not None:
+            df_confronto = df_confronto.merge(serie_realidade(realidade_2024, municipio), on='DT_SEMANA', how='left')
+            linhas = ['Realidade'] + linhas
+
+        fig_prev = px.line(df_confronto, x='DT_SEMANA', y=linhas, markers=True,
+                           color_discrete_map={'Realidade': 'black', 'IA V2 (Com Clima)': '#1f77b4'})
+        fig_prev.update_layout(xaxis_title="Semana", yaxis_title="Casos", hovermode="x unified", legend_title="")
+        st.plotly_chart(fig_prev, use_container_width=True)
+
+        metricas['v2'] = df_previsao['casos_previstos_ia'].sum()
+        mostrar_diagnostico = realidade_2024 is not None
+        if mostrar_diagnostico:
+            metricas['real'] = df_confronto['Realidade'].sum()
+        else:
+            st.caption("Casos reais de 2024 indisponíveis (cubo_semanal_2024_II_GERES.parquet não encontrado: "
+                       "rode a etapa comparativo do pipeline).")
     else:
-        st.error("Imagem 'confronto_final_modelos.png' não encontrada. Rode o script de comparação.")
+        # Sem modelo no registro: imagem gerada pelo script de comparação
+        img_confronto = carregar_imagem("confronto_final_modelos.png")
+        mostrar_diagnostico = bool(img_confronto)
+        
+        if img_confronto:
+            st.image(img_confronto, use_container_width=True, caption="Gráfico gerado pelo script 'comparativo_final_clima.py'")
+        else:
+            st.error("Modelo não encontrado no registro. Rode treinamento_com_dengue_e_clima.py (regional) ou treinamento_municipal.py --modo agrupado.")
 
     st.markdown("---")
     
-    # KPIs de 2024
-    metricas = carregar_previsoes_2024()
-    
     kpi1, kpi2, kpi3 = st.columns(3)
     
     # Se tivermos os dados carregados, mostramos. Senão, mostramos texto explicativo.
-    if 'v1' in metricas and 'v2' in metricas:
+    if 'real' in metricas:
+        kpi1.metric("Realidade 2024 (no horizonte)", f"{metricas['real']:.0f}")
+    if 'v1' in metricas:
         kpi2.metric("Previsão IA V1 (Só Histórico)", f"{metricas['v1']:.0f}", delta="Base Conservadora")
+    if 'v2' in metricas:
         kpi3.metric("Previsão IA V2 (Com Clima)", f"{metricas['v2']:.0f}", delta="Alto Risco Biológico", delta_color="off")
     
-    st.success("""
+    # O diagnóstico compara as duas linhas: só faz sentido com a realidade no gráfico
+    # (ou na imagem estática, que já traz a linha preta)
+    if mostrar_diagnostico:
+        st.success("""
     ### 🩺 Diagnóstico de Negócio: O "Delta da Eficiência"
     
     O gráfico revela uma história fascinante de Gestão Pública:
@@ -0,0 +1,128 @@
+import os
+import glob
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Base climática particionada (Hive): ID_MN_RESI=260410/ano=2024/parte-*.parquet
+PASTA_CLIMA = "clima_municipios"
+
+SCHEMA_PARTICOES = pa.schema([('ID_MN_RESI', pa.string()), ('ano', pa.int16())])
+
+SCHEMA_CLIMA = pa.schema([
+    ('date', pa.date32()),
+    ('temp_max', pa.float32()),
+    ('temp_min', pa.float32()),
+    ('temp_media', pa.float32()),
+    ('chuva_mm', pa.float32()),
+    ('umidade', pa.float32()),
+    ('ID_MN_RESI', pa.string()),
+    ('municipio_nome', pa.string()),
+    ('ano', pa.int16())
+])
+
+VARIAVEIS = ['temp_max', 'temp_min', 'temp_media', 'chuva_mm', 'umidade']
+
+# Acima disso uma partição (município/ano) é reescrita num arquivo só
+MAX_ARQUIVOS_POR_PARTICAO = 8
+
+
+def abrir_armazem(pasta=PASTA_CLIMA):
+    return ds.dataset(pasta, format="parquet", schema=SCHEMA_CLIMA,
+                      partitioning=ds.partitioning(SCHEMA_PARTICOES, flavor="hive"))
+
+
+def ler_clima(municipios=None, colunas=None, pasta=PASTA_CLIMA):
+    """Lê só os municípios/colunas pedidos. 'date' chega como datetime64."""
+    if not os.path.isdir(pasta):
+        raise FileNotFoundError(pasta)
+    filtro = None
+    if municipios is not None:
+        filtro = ds.field('ID_MN_RESI').isin(pa.array([str(m) for m in municipios], type=pa.string()))
+    tabela = abrir_armazem(pasta).to_table(columns=colunas, filter=filtro)
+    return tabela.to_pandas(date_as_object=False)
+
+
+def datas_existentes(pasta=PASTA_CLIMA):
+    """{ID_MN_RESI: DatetimeIndex} com os dias que a base já tem."""
+    if not os.path.isdir(pasta):
+        return {}
+    df = ler_clima(colunas=['ID_MN_RESI', 'date'], pasta=pasta)
+    return {codigo: pd.DatetimeIndex(grupo['date']).unique() for codigo, grupo in df.groupby('ID_MN_RESI')}
+
+
+def calcular_lacunas(existentes, data_inicio, data_fim):
+    """
+    Intervalos contíguos (inicio, fim) que faltam em [data_inicio, data_fim].
+    No uso diário isso é só a 'cauda' desde a última coleta.
+    """
+    esperado = pd.date_range(data_inicio, data_fim, freq='D')
+    faltando = esperado.difference(existentes) if existentes is not None else esperado
+    if faltando.empty:
+        return []
+    quebras = (faltando[1:] - faltando[:-1]) != pd.Timedelta(days=1)
+    inicios = [faltando[0]] + list(faltando[1:][quebras])
+    fins = list(faltando[:-1][quebras]) + [faltando[-1]]
+    return [(i.strftime('%Y-%m-%d'), f.strftime('%Y-%m-%d')) for i, f in zip(inicios, fins)]
+
+
+def anexar_clima(df_novo, pasta=PASTA_CLIMA):
+    """
+    Acrescenta dias novos na base. Dias sem nenhuma variável (a API de arquivo
+    tem atraso de alguns dias) não são gravados, para serem buscados de novo depois.
+    """
+    df = df_novo.dropna(subset=VARIAVEIS, how='all').copy()
+    if df.empty:
+        return 0
+    df['date'] = pd.to_datetime(df['date'])
+    df['ano'] = df['date'].dt.year.astype('int16')
+    df['date'] = df['date'].dt.date
+    tabela = pa.Table.from_pandas(df[SCHEMA_CLIMA.names], schema=SCHEMA_CLIMA, preserve_index=False)
+
+    ds.write_dataset(
+        tabela, pasta, format="parquet",
+        partitioning=ds.partitioning(SCHEMA_PARTICOES, flavor="hive"),
+        basename_template=f"parte-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore"
+    )
+    particoes = df[['ID_MN_RESI', 'ano']].drop_duplicates().itertuples(index=False)
+    for codigo, ano in particoes:
+        compactar_particao(os.path.join(pasta, f"ID_MN_RESI={codigo}", f"ano={ano}"))
+    return len(df)
+
+
+def compactar_particao(pasta_particao, limite=MAX_ARQUIVOS_POR_PARTICAO):
+    """Junta os arquivos de uma partição (ordenados por data) quando passam do limite."""
+    arquivos = sorted(glob.glob(os.path.join(pasta_particao, "*.parquet")))
+    if len(arquivos) <= limite:
+        return
+    tabela = pa.concat_tables([pq.read_table(a) for a in arquivos]).sort_by('date')
+    destino = os.path.join(pasta_particao, f"parte-{uuid.uuid4().hex[:12]}-0.parquet")
+    pq.write_table(tabela, destino + ".tmp")
+    os.replace(destino + ".tmp", destino)
+    for a in arquivos:
+        os.remove(a)
+
+
+def exportar_flat(arquivo_saida, pasta=PASTA_CLIMA):
+    """Gera o antigo Parquet único (mesmas colunas) para quem ainda lê o arquivo plano."""
+    df = ler_clima(pasta=pasta).drop(columns=['ano'])
+    df = df.sort_values(['ID_MN_RESI', 'date']).drop_duplicates(['ID_MN_RESI', 'date'], keep='last')
+    df['date'] = df['date'].dt.date
+    df.to_parquet(arquivo_saida, index=False)
+    return df
+
+
+def importar_flat(arquivo_plano, pasta=PASTA_CLIMA):
+    """
+    Semeia uma base vazia com o Parquet único de uma coleta anterior: a primeira
+    execução incremental parte do que já foi baixado em vez de refazer 2019 em diante.
+    """
+    if not os.path.exists(arquivo_plano):
+        return 0
+    df = pd.read_parquet(arquivo_plano)
+    df['ID_MN_RESI'] = df['ID_MN_RESI'].astype(str)
+    return anexar_clima(df, pasta)
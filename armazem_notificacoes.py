@@ -0,0 +1,116 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from instrumentacao import medir
+
+# Base regional particionada (Hive): ano_base=2019/ID_MN_RESI=260410/parte-0.parquet
+PASTA_ARMAZEM = "notificacoes_II_GERES"
+
+# Chaves de partição (ficam no caminho, não dentro dos arquivos)
+SCHEMA_PARTICOES = pa.schema([
+    ('ano_base', pa.int16()),
+    ('ID_MN_RESI', pa.dictionary(pa.int32(), pa.string()))
+])
+
+# Colunas do SINAN que são números de verdade (o resto é código categórico)
+COLUNAS_NUMERICAS = ['SEM_NOT', 'SEM_PRI', 'NU_ANO', 'NU_IDADE_N', 'ANO_NASC']
+
+
+def para_date32(coluna):
+    """Datas do SINAN chegam como date, 'AAAAMMDD' ou 'AAAA-MM-DD'. Tudo vira date32."""
+    if pa.types.is_date(coluna.type) or pa.types.is_timestamp(coluna.type):
+        return coluna.cast(pa.date32())
+    texto = pc.utf8_trim_whitespace(coluna.cast(pa.string()))
+    compacta = pc.strptime(texto, format='%Y%m%d', unit='s', error_is_null=True)
+    iso = pc.strptime(texto, format='%Y-%m-%d', unit='s', error_is_null=True)
+    return pc.coalesce(compacta, iso).cast(pa.date32())
+
+
+def para_menor_inteiro(coluna):
+    """Converte texto numérico para o menor inteiro que comporta os valores ('' vira nulo)."""
+    if pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type):
+        texto = pc.utf8_trim_whitespace(coluna)
+        coluna = pc.if_else(pc.equal(texto, ''), pa.scalar(None, pa.string()), texto).cast(pa.int64())
+    extremos = pc.min_max(coluna).as_py()
+    for tipo in (pa.int8(), pa.int16(), pa.int32()):
+        info_min, info_max = -(2 ** (tipo.bit_width - 1)), 2 ** (tipo.bit_width - 1) - 1
+        if extremos['min'] is None or (extremos['min'] >= info_min and extremos['max'] <= info_max):
+            return coluna.cast(tipo)
+    return coluna.cast(pa.int64())
+
+
+def compactar_tabela(tabela):
+    """
+    Tipos compactos para a base regional:
+    - DT_* -> date32 (ninguém precisa mais de pd.to_datetime)
+    - COLUNAS_NUMERICAS e ano_base -> menor inteiro possível
+    - demais textos (códigos, incluindo ID_MN_RESI) -> dictionary
+    """
+    colunas = []
+    for nome in tabela.column_names:
+        coluna = tabela[nome]
+        if nome.startswith('DT_'):
+            coluna = para_date32(coluna)
+        elif nome in COLUNAS_NUMERICAS or nome == 'ano_base':
+            try:
+                coluna = para_menor_inteiro(coluna)
+            except pa.ArrowInvalid:
+                coluna = coluna.dictionary_encode()
+        elif pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type):
+            coluna = coluna.dictionary_encode()
+        colunas.append(coluna)
+    return pa.table(colunas, names=tabela.column_names)
+
+
+@medir("gravar_armazem")
+def gravar_armazem(arquivo_regional, pasta=PASTA_ARMAZEM):
+    """
+    Gera a base particionada (ano_base / ID_MN_RESI) a partir do Parquet regional.
+    Só as partições presentes no arquivo são substituídas.
+    """
+    tabela = compactar_tabela(pq.read_table(arquivo_regional))
+    # As chaves de partição vão como texto/int16 simples para o caminho Hive
+    tabela = tabela.set_column(
+        tabela.schema.get_field_index('ID_MN_RESI'), 'ID_MN_RESI',
+        tabela['ID_MN_RESI'].cast(pa.string())
+    )
+    tabela = tabela.set_column(
+        tabela.schema.get_field_index('ano_base'), 'ano_base',
+        tabela['ano_base'].cast(pa.int16())
+    )
+    ds.write_dataset(
+        tabela, pasta, format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([('ano_base', pa.int16()), ('ID_MN_RESI', pa.string())]), flavor="hive"
+        ),
+        basename_template="parte-{i}.parquet",
+        # Partições pequenas: o rodapé pesa mais que os dados, então estatísticas só da data
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd", write_statistics=['DT_NOTIFIC']),
+        existing_data_behavior="delete_matching"
+    )
+    return tabela.num_rows
+
+
+def abrir_armazem(pasta=PASTA_ARMAZEM):
+    return ds.dataset(
+        pasta, format="parquet",
+        partitioning=ds.partitioning(SCHEMA_PARTICOES, flavor="hive", dictionaries="infer")
+    )
+
+
+def ler_notificacoes(anos=None, municipios=None, colunas=None, pasta=PASTA_ARMAZEM):
+    """
+    Notificações (linha a linha) só das partições e colunas pedidas: os filtros de
+    ano_base e ID_MN_RESI caem nas chaves Hive, então as outras pastas nem são abertas.
+    Devolve uma pyarrow.Table nos tipos da base: DT_* date32, ID_MN_RESI e demais
+    códigos dictionary, numéricos no menor inteiro (use .to_pandas() no final).
+    """
+    filtro = None
+    if anos is not None:
+        filtro = ds.field('ano_base').isin(pa.array(list(anos), type=pa.int16()))
+    if municipios is not None:
+        filtro_mun = ds.field('ID_MN_RESI').isin(pa.array([str(m) for m in municipios], type=pa.string()))
+        filtro = filtro_mun if filtro is None else filtro & filtro_mun
+    return abrir_armazem(pasta).to_table(columns=colunas, filter=filtro)
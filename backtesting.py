@@ -0,0 +1,210 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from configuracao import caminho_dado
+from cubo_semanal import ARQUIVO_CUBO
+from manifesto_fragmentos import hash_arquivo
+from motor_previsao import prever_recursivo_lote
+from treinamento_com_dengue_e_clima import PARAMETROS_V2, definir_features
+
+ARQUIVO_DATASET = "dataset_ml_completo_com_clima.parquet"
+PASTA_CACHE = "cache_backtest"
+ARQUIVO_DETALHE = "backtest_detalhe.parquet"
+ARQUIVO_RESUMO = "backtest_resumo.parquet"
+ARQUIVO_POR_PASSO = "backtest_por_passo.parquet"
+
+# Matriz do dataset aberta (mmap) uma vez por worker
+_MATRIZ = {}
+
+
+def carregar_matriz(arquivo=ARQUIVO_DATASET, pasta_cache=PASTA_CACHE):
+    """
+    Matriz de features float32 do dataset, em cache no disco (.npy) e chaveada
+    pelo SHA-256 do Parquet: o dataset só é relido quando muda.
+    Retorna o prefixo dos arquivos do cache (X, y, datas e lista de features).
+    """
+    prefixo = os.path.join(pasta_cache, hash_arquivo(arquivo)[:16])
+    if os.path.exists(prefixo + "_features.json"):
+        return prefixo
+
+    os.makedirs(pasta_cache, exist_ok=True)
+    df = pd.read_parquet(arquivo).sort_values('DT_SEMANA').reset_index(drop=True)
+    features = definir_features(df)
+    matrizes = {
+        'X': np.ascontiguousarray(df[features].to_numpy(dtype=np.float32)),
+        'y': df['casos'].to_numpy(dtype=np.float32),
+        'datas': df['DT_SEMANA'].to_numpy(dtype='datetime64[ns]')
+    }
+    for nome, matriz in matrizes.items():
+        with open(f"{prefixo}_{nome}.tmp", 'wb') as f:
+            np.save(f, matriz)
+        os.replace(f"{prefixo}_{nome}.tmp", f"{prefixo}_{nome}.npy")
+    # A lista de features é gravada por último: ela marca o cache como completo
+    with open(prefixo + "_features.tmp", 'w', encoding='utf-8') as f:
+        json.dump(features, f)
+    os.replace(prefixo + "_features.tmp", prefixo + "_features.json")
+    return prefixo
+
+
+def abrir_matriz(prefixo):
+    """X, y e datas mapeados em memória (sem cópia) + lista de features."""
+    with open(prefixo + "_features.json", encoding='utf-8') as f:
+        features = json.load(f)
+    matrizes = {nome: np.load(f"{prefixo}_{nome}.npy", mmap_mode='r') for nome in ('X', 'y', 'datas')}
+    return matrizes, features
+
+
+def gerar_cortes(inicio, fim, passo_semanas=13):
+    """Origens de um rolling-origin: de inicio a fim, a cada passo_semanas."""
+    return [d.strftime('%Y-%m-%d') for d in pd.date_range(inicio, fim, freq=f'{passo_semanas * 7}D')]
+
+
+def montar_folds(cortes, horizontes, gaps):
+    """Um fold para cada combinação (corte, horizonte em semanas, gap em semanas)."""
+    return [(c, int(h), int(g)) for c in cortes for h in horizontes for g in gaps]
+
+
+def fim_cobertura(arquivo_cubo=ARQUIVO_CUBO):
+    """
+    Última semana coberta pela base do SINAN: a maior DT_SEMANA do cubo semanal,
+    que sai da mesma base particionada do merge. O merge preenche com 0 as semanas
+    que a base ainda não cobre (ex: 2024 antes da carga do SINAN), então nenhum
+    fold é avaliado depois desta semana. None se o cubo não existir.
+    """
+    caminho = caminho_dado(arquivo_cubo)
+    if not os.path.exists(caminho):
+        return None
+    maximo = pc.max(pq.read_table(caminho, columns=['DT_SEMANA'])['DT_SEMANA']).as_py()
+    return np.datetime64(pd.Timestamp(maximo), 'ns') if maximo is not None else None
+
+
+def ultima_semana_observada(y, datas):
+    """Sem o cubo: a última semana com notificação (um zero real no fim da série fica de fora)."""
+    observadas = np.flatnonzero(np.asarray(y) > 0)
+    return datas[observadas[-1]] if len(observadas) else None
+
+
+def _inicializar_worker(prefixo, fim_observado=None):
+    _MATRIZ['dados'] = abrir_matriz(prefixo)
+    _MATRIZ['fim_observado'] = fim_observado
+
+
+def _avaliar_fold(corte, horizonte, gap):
+    """
+    Worker: treina com as semanas anteriores a (corte - gap) e prevê
+    recursivamente 'horizonte' semanas a partir do corte. Os lags de casos
+    partem do observado até o corte (o gap só envelhece o modelo, como no
+    experimento 'treino 19-21 -> teste 23' do notebook). A avaliação para na
+    última semana observada; fold sem nenhuma semana observada é pulado (None).
+    """
+    matrizes, features = _MATRIZ['dados']
+    X, y, datas = matrizes['X'], matrizes['y'], matrizes['datas']
+
+    data_corte = np.datetime64(pd.Timestamp(corte), 'ns')
+    i_corte = int(np.searchsorted(datas, data_corte))
+    i_treino = int(np.searchsorted(datas, data_corte - np.timedelta64(7 * gap, 'D')))
+    fim = min(i_corte + horizonte, len(y))
+    if _MATRIZ.get('fim_observado') is not None:
+        fim = min(fim, int(np.searchsorted(datas, _MATRIZ['fim_observado'], side='right')))
+    if i_treino == 0 or i_corte >= fim:
+        return None
+
+    model = xgb.XGBRegressor(**PARAMETROS_V2, n_jobs=1)
+    model.fit(X[:i_treino], y[:i_treino])
+    previsto = prever_recursivo_lote(model, np.array(X[i_corte:fim])[:, None, :], features, y[:i_corte])[0]
+
+    return pd.DataFrame({
+        'corte': corte,
+        'horizonte': horizonte,
+        'gap': gap,
+        'passo': np.arange(1, fim - i_corte + 1),
+        'DT_SEMANA': datas[i_corte:fim],
+        'casos': y[i_corte:fim],
+        'casos_previstos_ia': previsto
+    })
+
+
+def resumir(detalhe, chaves):
+    erro = detalhe['casos_previstos_ia'] - detalhe['casos']
+    agrupado = detalhe.assign(erro_abs=erro.abs(), erro_quad=erro ** 2).groupby(chaves)
+    resumo = agrupado.agg(semanas=('passo', 'size'), MAE=('erro_abs', 'mean'), MSE=('erro_quad', 'mean')).reset_index()
+    resumo['RMSE'] = np.sqrt(resumo.pop('MSE'))
+    return resumo
+
+
+def rodar_backtest(folds, arquivo=ARQUIVO_DATASET, max_workers=None, pasta_cache=PASTA_CACHE, fim_observado=None):
+    """
+    Avalia os folds em paralelo (1 fold por processo, XGBoost com 1 thread).
+    fim_observado limita as semanas avaliadas. Padrão: o fim da cobertura do SINAN
+    (fim_cobertura, pelo cubo semanal) ou, sem cubo, a última semana com notificação.
+    Retorna (detalhe por semana, MAE/RMSE por fold, MAE/RMSE por passo do horizonte).
+    """
+    prefixo = carregar_matriz(arquivo, pasta_cache)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(folds))
+    if fim_observado is None:
+        fim_observado = fim_cobertura()
+    if fim_observado is None:
+        print(f"   ⚠️ {ARQUIVO_CUBO} não encontrado: fim dos dados = última semana com notificação.")
+        matrizes, _ = abrir_matriz(prefixo)
+        fim_observado = ultima_semana_observada(matrizes['y'], matrizes['datas'])
+    else:
+        fim_observado = np.datetime64(pd.Timestamp(fim_observado), 'ns')
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_worker,
+                             initargs=(prefixo, fim_observado)) as executor:
+        resultados = list(executor.map(_avaliar_fold, *zip(*folds)))
+
+    pulados = [fold for fold, r in zip(folds, resultados) if r is None]
+    if pulados:
+        print(f"   ⏭️ {len(pulados)} fold(s) sem semana observada depois do corte "
+              f"(dados até {pd.Timestamp(fim_observado).date()}): {sorted({c for c, _, _ in pulados})}")
+    if len(pulados) == len(folds):
+        raise ValueError("Nenhum fold tem semanas observadas para avaliar.")
+
+    detalhe = pd.concat([r for r in resultados if r is not None], ignore_index=True)
+    por_fold = resumir(detalhe, ['corte', 'horizonte', 'gap'])
+    por_passo = resumir(detalhe, ['horizonte', 'gap', 'passo'])
+    return detalhe, por_fold, por_passo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtesting walk-forward do modelo V2 (folds em paralelo).")
+    parser.add_argument("--cortes", nargs="*", default=None, help="Datas de corte (AAAA-MM-DD).")
+    parser.add_argument("--rolling", nargs=3, metavar=("INICIO", "FIM", "PASSO_SEMANAS"), default=None,
+                        help="Gera cortes de INICIO a FIM a cada PASSO_SEMANAS (rolling-origin).")
+    parser.add_argument("--horizontes", type=int, nargs="+", default=[4, 12, 52], help="Horizontes em semanas.")
+    parser.add_argument("--gaps", type=int, nargs="+", default=[0], help="Semanas entre o fim do treino e o corte.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fim-observado", default=None,
+                        help="Última semana com dado real (padrão: última semana do cubo semanal do SINAN).")
+    args = parser.parse_args()
+
+    cortes = list(args.cortes or [])
+    if args.rolling:
+        cortes += gerar_cortes(args.rolling[0], args.rolling[1], int(args.rolling[2]))
+    if not cortes:
+        cortes = ["2023-01-01", "2024-01-01"]
+
+    folds = montar_folds(cortes, args.horizontes, args.gaps)
+    print(f"🧪 Backtest: {len(folds)} fold(s) ({len(cortes)} corte(s) x {len(args.horizontes)} horizonte(s) x {len(args.gaps)} gap(s))...")
+    try:
+        detalhe, por_fold, por_passo = rodar_backtest(folds, max_workers=args.workers,
+                                                      fim_observado=args.fim_observado)
+    except FileNotFoundError as e:
+        print(f"❌ Erro: Arquivo não encontrado ({e}). Rode processamento_final_merge.py antes.")
+    except ValueError as e:
+        print(f"❌ {e}")
+    else:
+        detalhe.to_parquet(ARQUIVO_DETALHE, index=False)
+        por_fold.to_parquet(ARQUIVO_RESUMO, index=False)
+        por_passo.to_parquet(ARQUIVO_POR_PASSO, index=False)
+        print(por_fold.to_string(index=False))
+        print(f"💾 Resultados salvos: {ARQUIVO_DETALHE} / {ARQUIVO_RESUMO} / {ARQUIVO_POR_PASSO}")
@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import platform
+import threading
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from agregacao_semanal import agregar_casos_semanais, para_pandas
+from filtro_regional import iterar_lotes_regiao
+from instrumentacao import rss_atual_mb
+from motor_features import aplicar_spec
+from motor_previsao import prever_recursivo_lote
+from processamento_final_merge import montar_painel_municipal
+from registro_municipios import codigos_regiao
+from treinamento_com_dengue_e_clima import PARAMETROS_V2, definir_features
+
+# Datasets sintéticos (reaproveitados entre execuções com os mesmos parâmetros) e resultados
+PASTA_DADOS_BENCHMARK = "benchmark_dados"
+ARQUIVO_RESULTADOS = "benchmark_resultados.jsonl"
+
+# Os primeiros municípios sintéticos são os da II GERES: o filtro regional acha a região
+CODIGOS_II_GERES = codigos_regiao()
+
+# Escalas prontas (notificações, municípios, anos)
+ESCALAS = {
+    'regional': (1_000_000, 20, [2019, 2020, 2021, 2022, 2023, 2024]),
+    'estadual': (10_000_000, 185, [2019, 2020, 2021, 2022, 2023, 2024]),
+    'nacional': (50_000_000, 5570, [2019, 2020, 2021, 2022, 2023, 2024])
+}
+
+# O arquivo do SINAN tem 121 colunas; as que o pipeline não lê viram texto em branco
+COLUNAS_EXTRAS_PADRAO = 100
+LINHAS_POR_FRAGMENTO = 500_000
+
+
+def codigos_sinteticos(n_municipios):
+    """Códigos IBGE de 6 dígitos: II GERES primeiro, depois códigos fictícios únicos."""
+    codigos = list(CODIGOS_II_GERES[:n_municipios])
+    candidato = 110000
+    while len(codigos) < n_municipios:
+        texto = str(candidato)
+        if texto not in CODIGOS_II_GERES:
+            codigos.append(texto)
+        candidato += 10
+    return codigos
+
+
+def texto_categorico(indices, valores):
+    """Coluna de texto a partir de índices numa lista pequena de valores (sem objetos Python por linha)."""
+    return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(valores)).dictionary_decode()
+
+
+def gerar_fragmento(rng, codigos, pesos, ano, n_linhas, n_extras):
+    """Um fragmento no formato do DENGBR: datas 'AAAAMMDD', códigos de 6 dígitos, tudo texto."""
+    dias = pd.date_range(f"{ano}-01-01", f"{ano}-12-31", freq='D')
+    # Sazonalidade: pico entre março e maio, como a dengue em PE
+    curva = 1.0 + 4.0 * np.exp(-0.5 * ((np.arange(len(dias)) - 105) / 35.0) ** 2)
+    dia = rng.choice(len(dias), size=n_linhas, p=curva / curva.sum())
+    sintomas = np.maximum(dia - rng.integers(0, 4, size=n_linhas), 0)
+    municipio = rng.choice(len(codigos), size=n_linhas, p=pesos)
+
+    datas_texto = dias.strftime('%Y%m%d').tolist()
+    semanas_texto = [f"{d.isocalendar()[0]}{d.isocalendar()[1]:02d}" for d in dias]
+    ufs = sorted({c[:2] for c in codigos})
+    uf_do_municipio = np.array([ufs.index(c[:2]) for c in codigos])
+
+    colunas = {
+        'TP_NOT': texto_categorico(np.zeros(n_linhas, dtype=np.int32), ['2']),
+        'ID_AGRAVO': texto_categorico(np.zeros(n_linhas, dtype=np.int32), ['A90  ']),
+        'DT_NOTIFIC': texto_categorico(dia, datas_texto),
+        'SEM_NOT': texto_categorico(dia, semanas_texto),
+        'NU_ANO': texto_categorico(np.zeros(n_linhas, dtype=np.int32), [str(ano)]),
+        'SG_UF_NOT': texto_categorico(uf_do_municipio[municipio], ufs),
+        'ID_MUNICIP': texto_categorico(municipio, codigos),
+        'DT_SIN_PRI': texto_categorico(sintomas, datas_texto),
+        'NU_IDADE_N': texto_categorico(rng.integers(0, 90, size=n_linhas), [f"40{i:02d}" for i in range(90)]),
+        'CS_SEXO': texto_categorico(rng.integers(0, 3, size=n_linhas), ['M', 'F', 'I']),
+        'SG_UF': texto_categorico(uf_do_municipio[municipio], ufs),
+        'ID_MN_RESI': texto_categorico(municipio, codigos),
+        'CLASSI_FIN': texto_categorico(rng.integers(0, 4, size=n_linhas), ['10', '5', '11', '12'])
+    }
+    branco = texto_categorico(np.zeros(n_linhas, dtype=np.int32), [' '])
+    for i in range(n_extras):
+        colunas[f'EXTRA_{i:03d}'] = branco
+    return pa.table(colunas)
+
+
+def gerar_dataset(n_notificacoes, n_municipios, anos, n_extras=COLUNAS_EXTRAS_PADRAO,
+                  pasta=PASTA_DADOS_BENCHMARK, semente=42):
+    """
+    Gera (ou reaproveita) um dataset SINAN sintético: uma pasta DENGBR<aa>.parquet
+    por ano, com fragmentos de até LINHAS_POR_FRAGMENTO linhas, como o PySUS baixa.
+    Municípios têm pesos desiguais (poucos concentram muitos casos).
+    Retorna (pasta do dataset, códigos dos municípios).
+    """
+    parametros = [n_notificacoes, n_municipios, list(anos), n_extras, semente]
+    destino = os.path.join(pasta, hashlib.sha256(json.dumps(parametros).encode()).hexdigest()[:12])
+    codigos = codigos_sinteticos(n_municipios)
+    if os.path.exists(os.path.join(destino, "parametros.json")):
+        return destino, codigos
+
+    rng = np.random.default_rng(semente)
+    pesos = rng.lognormal(0.0, 1.0, size=n_municipios)
+    pesos /= pesos.sum()
+    temporaria = destino + ".tmp"
+    for ano in anos:
+        pasta_ano = os.path.join(temporaria, f"DENGBR{str(ano)[2:]}.parquet")
+        os.makedirs(pasta_ano, exist_ok=True)
+        restantes = n_notificacoes // len(anos)
+        parte = 0
+        while restantes > 0:
+            n_linhas = min(restantes, LINHAS_POR_FRAGMENTO)
+            tabela = gerar_fragmento(rng, codigos, pesos, ano, n_linhas, n_extras)
+            pq.write_table(tabela, os.path.join(pasta_ano, f"{parte}.parquet"))
+            restantes -= n_linhas
+            parte += 1
+    with open(os.path.join(temporaria, "parametros.json"), 'w', encoding='utf-8') as f:
+        json.dump(parametros, f)
+    os.replace(temporaria, destino)
+    return destino, codigos
+
+
+def gerar_clima(codigos, anos, semente=42):
+    """Clima diário sintético por município (mesmas colunas do dados_climaticos_regional_detalhado)."""
+    rng = np.random.default_rng(semente)
+    dias = pd.date_range(f"{anos[0]}-01-01", f"{anos[-1]}-12-31", freq='D')
+    n = len(dias) * len(codigos)
+    sazonal = np.tile(np.cos(2 * np.pi * dias.dayofyear.to_numpy() / 365.25), len(codigos))
+    temp_media = 26 + 2 * sazonal + rng.normal(0, 1, n)
+    return pd.DataFrame({
+        'date': np.tile(dias.to_numpy(), len(codigos)),
+        'ID_MN_RESI': np.repeat(np.array(codigos), len(dias)),
+        'temp_max': temp_media + 4,
+        'temp_min': temp_media - 4,
+        'temp_media': temp_media,
+        'chuva_mm': np.maximum(rng.gamma(0.6, 8.0, n) * (1 + sazonal), 0),
+        'umidade': np.clip(75 + 10 * sazonal + rng.normal(0, 5, n), 0, 100)
+    })
+
+
+class Medicao:
+    """
+    Cronometra um bloco e amostra o RSS numa thread (a cada 10 ms): o pico
+    inclui memória do Arrow e do XGBoost, que o tracemalloc não enxerga.
+    """
+
+    def __init__(self, nome, resultados, linhas=None):
+        self.nome, self.resultados, self.linhas = nome, resultados, linhas
+
+    def __enter__(self):
+        self.rss_inicio = self.pico = rss_atual_mb()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        self.inicio = time.perf_counter()
+        return self
+
+    def _amostrar(self):
+        while not self._parar.wait(0.01):
+            self.pico = max(self.pico, rss_atual_mb())
+
+    def __exit__(self, *erro):
+        duracao = time.perf_counter() - self.inicio
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, rss_atual_mb())
+        linha = {
+            'etapa': self.nome,
+            'segundos': round(duracao, 4),
+            'rss_inicio_mb': round(self.rss_inicio, 1),
+            'rss_pico_mb': round(self.pico, 1),
+            'rss_delta_mb': round(self.pico - self.rss_inicio, 1)
+        }
+        if self.linhas is not None:
+            linha['linhas'] = int(self.linhas)
+            linha['linhas_por_s'] = round(self.linhas / duracao) if duracao > 0 else None
+        self.resultados.append(linha)
+        print(f"   ⏱️ {self.nome:<18} {duracao:8.2f}s | pico RSS {self.pico:8.0f} MB")
+        return False
+
+
+def rodar_benchmark(n_notificacoes, n_municipios, anos, n_extras=COLUNAS_EXTRAS_PADRAO, arvores=100,
+                    pasta=PASTA_DADOS_BENCHMARK):
+    """
+    Mede as etapas do pipeline sobre um dataset sintético:
+    filtro regional (scan do Brasil), agregação semanal direto do Parquet nacional,
+    merge com o clima (painel município x semana), features, treino do modelo
+    agrupado e a previsão recursiva de 52 semanas para todos os municípios.
+    """
+    etapas = []
+    inicio = time.perf_counter()
+    pasta_dataset, codigos = gerar_dataset(n_notificacoes, n_municipios, anos, n_extras, pasta)
+    geracao = time.perf_counter() - inicio
+    arquivos = sorted(os.path.join(raiz, f) for raiz, _, fs in os.walk(pasta_dataset) for f in fs if f.endswith(".parquet"))
+    dataset = ds.dataset(arquivos, format="parquet")
+    bytes_dataset = sum(os.path.getsize(f) for f in arquivos)
+
+    with Medicao('filtro_regional', etapas, n_notificacoes):
+        linhas_regiao = sum(b.num_rows for b in iterar_lotes_regiao(dataset, CODIGOS_II_GERES))
+    etapas[-1]['linhas_saida'] = linhas_regiao
+
+    # Casos por município x semana direto do Parquet nacional: as notificações nunca viram pandas
+    with Medicao('agregacao_semanal', etapas, n_notificacoes):
+        casos = para_pandas(agregar_casos_semanais(dataset))
+    etapas[-1]['linhas_saida'] = len(casos)
+
+    df_clima = gerar_clima(codigos, anos)
+    with Medicao('merge_clima', etapas, len(df_clima)):
+        painel = montar_painel_municipal(casos, df_clima, f"{anos[0]}-01-01", f"{anos[-1]}-12-31")
+    del casos, df_clima
+    etapas[-1]['linhas_saida'] = len(painel)
+
+    with Medicao('features', etapas, len(painel)):
+        painel = aplicar_spec(painel, grupo='ID_MN_RESI').dropna().reset_index(drop=True)
+
+    features = [c for c in definir_features(painel) if c != 'ID_MN_RESI']
+    inicio_previsao = f"{anos[-1]}-01-01"
+    treino = (painel['DT_SEMANA'] < inicio_previsao).to_numpy()
+    X = np.ascontiguousarray(painel[features].to_numpy(dtype=np.float32))
+    y = painel['casos'].to_numpy(dtype=np.float32)
+    with Medicao('treino', etapas, int(treino.sum())):
+        model = xgb.XGBRegressor(**{**PARAMETROS_V2, 'n_estimators': arvores}, n_jobs=os.cpu_count())
+        model.fit(X[treino], y[treino])
+
+    # Previsão: todos os municípios no mesmo lote (semanas, municípios, features)
+    n_municipios_painel = painel['ID_MN_RESI'].nunique()
+    n_semanas_total = len(painel) // n_municipios_painel
+    n_futuro = int((~treino).sum()) // n_municipios_painel
+    tensor = X.reshape(n_municipios_painel, n_semanas_total, -1)[:, -n_futuro:].transpose(1, 0, 2).copy()
+    historicos = y.reshape(n_municipios_painel, n_semanas_total)[:, :-n_futuro]
+    with Medicao('previsao_recursiva', etapas, n_municipios_painel * n_futuro):
+        prever_recursivo_lote(model, tensor, features, historicos)
+
+    return {
+        'quando': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'versao': versao_codigo(),
+        'ambiente': {
+            'python': platform.python_version(),
+            'pyarrow': pa.__version__,
+            'pandas': pd.__version__,
+            'xgboost': xgb.__version__,
+            'nucleos': os.cpu_count()
+        },
+        'escala': {
+            'notificacoes': n_notificacoes,
+            'municipios': n_municipios,
+            'anos': list(anos),
+            'colunas_extras': n_extras,
+            'arvores': arvores,
+            'bytes_dataset': bytes_dataset
+        },
+        'geracao_s': round(geracao, 3),
+        'etapas': etapas
+    }
+
+
+def versao_codigo():
+    """Commit atual (para comparar resultados entre versões), ou None fora do git."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def anexar_resultado(resultado, arquivo=ARQUIVO_RESULTADOS):
+    """Uma linha JSON por execução (histórico para comparar versões)."""
+    with open(arquivo, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+
+def comparar_com_anterior(resultado, arquivo=ARQUIVO_RESULTADOS):
+    """Razão de tempo por etapa contra a última execução na mesma escala (antes desta)."""
+    if not os.path.exists(arquivo):
+        return None
+    with open(arquivo, encoding='utf-8') as f:
+        anteriores = [json.loads(linha) for linha in f if linha.strip()]
+    anteriores = [r for r in anteriores if r['escala'] == resultado['escala'] and r['quando'] != resultado['quando']]
+    if not anteriores:
+        return None
+    base = {e['etapa']: e for e in anteriores[-1]['etapas']}
+    return anteriores[-1].get('versao'), {
+        e['etapa']: round(e['segundos'] / base[e['etapa']]['segundos'], 3)
+        for e in resultado['etapas'] if base.get(e['etapa'], {}).get('segundos')
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados SINAN sintéticos.")
+    parser.add_argument("--escala", choices=list(ESCALAS), default='regional', help="Escala pronta.")
+    parser.add_argument("--notificacoes", type=int, default=None, help="Sobrescreve o nº de notificações da escala.")
+    parser.add_argument("--municipios", type=int, default=None, help="Sobrescreve o nº de municípios da escala.")
+    parser.add_argument("--anos", type=int, nargs="+", default=None)
+    parser.add_argument("--colunas-extras", type=int, default=COLUNAS_EXTRAS_PADRAO)
+    parser.add_argument("--arvores", type=int, default=100, help="Árvores do XGBoost no treino medido.")
+    parser.add_argument("--saida", default=ARQUIVO_RESULTADOS)
+    args = parser.parse_args()
+
+    n_notificacoes, n_municipios, anos = ESCALAS[args.escala]
+    n_notificacoes = args.notificacoes or n_notificacoes
+    n_municipios = args.municipios or n_municipios
+    anos = sorted(args.anos or anos)
+
+    print(f"🏋️ Benchmark: {n_notificacoes:,} notificações, {n_municipios} municípios, {anos[0]}-{anos[-1]}")
+    resultado = rodar_benchmark(n_notificacoes, n_municipios, anos, args.colunas_extras, args.arvores)
+    comparacao = comparar_com_anterior(resultado, args.saida)
+    anexar_resultado(resultado, args.saida)
+    print(f"💾 Resultado anexado em {args.saida} (versão {resultado['versao']})")
+    if comparacao:
+        versao, razoes = comparacao
+        print(f"📈 Tempo relativo à execução anterior ({versao}):")
+        for etapa, razao in razoes.items():
+            print(f"   {etapa:<18} x{razao:.2f}")
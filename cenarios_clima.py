@@ -0,0 +1,186 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from motor_features import calcular_matriz
+from motor_previsao import prever_recursivo_lote
+from treinamento_com_dengue_e_clima import configurar_modelo_regional, treinar_modelo_clima
+
+ARQUIVO_DATASET = "dataset_ml_completo_com_clima.parquet"
+ARQUIVO_CENARIOS = "previsao_2024_cenarios.parquet"
+INICIO_PREVISAO = "2024-01-01"
+
+COLUNAS_CLIMA = ['temp_max', 'temp_min', 'temp_media', 'chuva_mm', 'umidade']
+PERCENTIS = [5, 25, 50, 75, 95]
+
+# Abaixo disso o ensemble roda no processo principal (não compensa serializar o modelo)
+CENARIOS_POR_WORKER = 256
+
+
+def definir_cenarios(n_aleatorios=500, anos_analogos=(), semente=42):
+    """
+    Lista de cenários "e se...":
+    - 'observado': clima real (a mesma trajetória do treinamento_com_dengue_e_clima)
+    - 'analogo_AAAA': clima de outro ano (ex.: um ano de El Niño) na mesma semana do ano
+    - 'aleatorio_i': chuva x fator lognormal, temperatura e umidade + deltas normais
+    """
+    cenarios = [{'nome': 'observado'}]
+    for ano in anos_analogos:
+        cenarios.append({'nome': f'analogo_{ano}', 'ano_analogo': int(ano)})
+
+    rng = np.random.default_rng(semente)
+    for i in range(n_aleatorios):
+        cenarios.append({
+            'nome': f'aleatorio_{i}',
+            'fator_chuva': float(rng.lognormal(0.0, 0.3)),
+            'delta_temp': float(rng.normal(0.0, 1.0)),
+            'delta_umid': float(rng.normal(0.0, 4.0))
+        })
+    return cenarios
+
+
+def clima_cenarios(base, futuro, cenarios):
+    """
+    Clima semanal de cada cenário: array (cenários, semanas da série, variáveis).
+    Só as semanas de previsão (futuro) são alteradas; o histórico fica igual.
+    """
+    observado = base[COLUNAS_CLIMA].to_numpy(dtype=np.float32)
+    clima = np.repeat(observado[None, :, :], len(cenarios), axis=0)
+
+    semana = base['DT_SEMANA'].dt.isocalendar().week.to_numpy().astype(int)
+    ano = base['DT_SEMANA'].dt.year.to_numpy()
+    i_chuva = COLUNAS_CLIMA.index('chuva_mm')
+    i_umid = COLUNAS_CLIMA.index('umidade')
+    i_temp = [COLUNAS_CLIMA.index(c) for c in ('temp_max', 'temp_min', 'temp_media')]
+
+    for s, cenario in enumerate(cenarios):
+        if 'ano_analogo' in cenario:
+            # Mesma semana epidemiológica no ano análogo (semana sem par mantém o observado)
+            do_ano = np.flatnonzero(ano == cenario['ano_analogo'])
+            mapa = {semana[i]: i for i in do_ano}
+            origem = np.array([mapa.get(semana[i], i) for i in futuro])
+            clima[s, futuro] = observado[origem]
+        if 'fator_chuva' in cenario:
+            clima[s, futuro, i_chuva] *= cenario['fator_chuva']
+        if 'delta_temp' in cenario:
+            clima[s, futuro[:, None], i_temp] += cenario['delta_temp']
+        if 'delta_umid' in cenario:
+            clima[s, futuro, i_umid] = np.clip(clima[s, futuro, i_umid] + cenario['delta_umid'], 0.0, 100.0)
+    return clima
+
+
+def montar_tensor(base, features, cenarios, inicio=INICIO_PREVISAO):
+    """
+    Tensor float32 (semanas, cenários, features) no layout de definir_features.
+
+    O clima de todos os cenários é empilhado num painel (cenário x semana) e as
+    features saem de uma passada só do motor_features (grupo = cenário), com a
+    mesma spec do treino. Os lag_casos_w* ficam para o motor.
+    """
+    futuro = np.flatnonzero((base['DT_SEMANA'] >= inicio).to_numpy())
+    clima = clima_cenarios(base, futuro, cenarios)
+    n_cenarios, n_semanas = clima.shape[:2]
+
+    painel = pd.DataFrame(clima.reshape(n_cenarios * n_semanas, -1), columns=COLUNAS_CLIMA)
+    painel['DT_SEMANA'] = np.tile(base['DT_SEMANA'].to_numpy(), n_cenarios)
+    painel['casos'] = np.tile(base['casos'].to_numpy(dtype=np.float32), n_cenarios)
+    painel['cenario'] = np.repeat(np.arange(n_cenarios), n_semanas)
+    matriz, nomes = calcular_matriz(painel, grupo='cenario')
+
+    posicoes = {nome: i for i, nome in enumerate(nomes)}
+    X = np.empty((n_cenarios * n_semanas, len(features)), dtype=np.float32)
+    for j, nome in enumerate(features):
+        if nome in posicoes:
+            X[:, j] = matriz[:, posicoes[nome]]
+        elif nome in painel:
+            X[:, j] = painel[nome].to_numpy(dtype=np.float32)
+        else:
+            # Colunas fixas da base (ex: cod_municipio do modelo agrupado)
+            X[:, j] = np.tile(base[nome].to_numpy(dtype=np.float32), n_cenarios)
+
+    X = X.reshape(n_cenarios, n_semanas, -1)[:, futuro].transpose(1, 0, 2)
+    return np.ascontiguousarray(X), base['DT_SEMANA'].iloc[futuro].reset_index(drop=True), futuro
+
+
+def _prever_fatia(modelo_bruto, X, features, historico_casos):
+    """Worker: reconstrói o booster (1 thread) e roda uma fatia de cenários."""
+    booster = xgb.Booster()
+    booster.load_model(bytearray(modelo_bruto))
+    booster.set_param({'nthread': 1})
+    return prever_recursivo_lote(booster, X, features, historico_casos)
+
+
+def prever_ensemble(model, X, features, historico_casos, max_workers=None, cenarios_por_worker=CENARIOS_POR_WORKER):
+    """
+    Roda o ensemble inteiro: (cenários, semanas).
+    Ensembles grandes são fatiados no eixo dos cenários entre processos; cada
+    fatia continua fazendo uma chamada de previsão por semana.
+    """
+    n_cenarios = X.shape[1]
+    max_workers = max_workers or os.cpu_count() or 1
+    n_fatias = min(max_workers, -(-n_cenarios // cenarios_por_worker))
+    if n_fatias <= 1:
+        return prever_recursivo_lote(model, X, features, historico_casos)
+
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    modelo_bruto = bytes(booster.save_raw())
+    fatias = np.array_split(np.arange(n_cenarios), n_fatias)
+    with ProcessPoolExecutor(max_workers=n_fatias) as executor:
+        futuros = [
+            executor.submit(_prever_fatia, modelo_bruto, np.ascontiguousarray(X[:, idx]), features, historico_casos)
+            for idx in fatias
+        ]
+        return np.concatenate([f.result() for f in futuros], axis=0)
+
+
+def resumir_ensemble(datas, previsoes, cenarios):
+    """Faixas de percentis por semana + trajetórias nomeadas (observado e análogos)."""
+    resumo = pd.DataFrame({'DT_SEMANA': datas})
+    for p, valores in zip(PERCENTIS, np.percentile(previsoes, PERCENTIS, axis=0)):
+        resumo[f'p{p:02d}'] = valores
+    for s, cenario in enumerate(cenarios):
+        if not cenario['nome'].startswith('aleatorio_'):
+            resumo[cenario['nome']] = previsoes[s]
+    return resumo
+
+
+def rodar_cenarios(n_aleatorios=500, anos_analogos=(), semente=42, max_workers=None,
+                   arquivo=ARQUIVO_DATASET, arquivo_saida=ARQUIVO_CENARIOS):
+    print("🌦️ Iniciando ensemble de cenários climáticos para 2024...")
+
+    df = pd.read_parquet(arquivo).sort_values('DT_SEMANA').reset_index(drop=True)
+    # Mesmas features e parâmetros (config_xgb_v2.json) da previsão publicada: o
+    # treino cai no mesmo hash do registro e reaproveita o modelo v2_regional
+    features, parametros = configurar_modelo_regional(df)
+    df_treino = df[df['DT_SEMANA'] < INICIO_PREVISAO]
+
+    print(f"📚 Treinando modelo V2 com {len(df_treino)} semanas...")
+    model = treinar_modelo_clima(df_treino, features, parametros=parametros)
+
+    # Série semanal (data, clima, casos): base para o clima de cada cenário
+    base = df[['DT_SEMANA'] + COLUNAS_CLIMA + ['casos']].copy()
+    cenarios = definir_cenarios(n_aleatorios, anos_analogos, semente)
+    X, datas, futuro = montar_tensor(base, features, cenarios)
+
+    print(f"🔮 Prevendo {len(cenarios)} cenários x {len(datas)} semanas...")
+    previsoes = prever_ensemble(model, X, features, base['casos'].to_numpy()[:futuro[0]], max_workers=max_workers)
+
+    resumo = resumir_ensemble(datas, previsoes, cenarios)
+    resumo.to_parquet(arquivo_saida, index=False)
+    print(f"💾 Faixas salvas: {arquivo_saida}")
+    return resumo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ensemble de cenários climáticos (modelo V2).")
+    parser.add_argument("--cenarios", type=int, default=500, help="Cenários aleatórios (chuva/temperatura/umidade).")
+    parser.add_argument("--analogos", type=int, nargs="*", default=[2019, 2023], help="Anos análogos (ex.: El Niño).")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="Processos para ensembles grandes.")
+    args = parser.parse_args()
+
+    rodar_cenarios(args.cenarios, args.analogos, args.semente, args.workers)
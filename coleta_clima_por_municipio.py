@@ -1,121 +1,328 @@
 import openmeteo_requests
+import requests
 import requests_cache
 import pandas as pd
 from retry_requests import retry
+import os
 import time
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-def coletar_clima_regional():
+from configuracao import caminho_dado
+from instrumentacao import contar, medir
+from registro_municipios import coordenadas_regiao
+from armazem_clima import PASTA_CLIMA, anexar_clima, calcular_lacunas, datas_existentes, exportar_flat, importar_flat
+
+# Endpoint configurável (ex: servidor stub local nos testes)
+URL_ARCHIVE = os.environ.get("OPEN_METEO_URL", "https://archive-api.open-meteo.com/v1/archive")
+
+# Período do estudo (o mesmo da coleta completa); --data-fim estende a base
+DATA_INICIO_PADRAO = "2019-01-01"
+DATA_FIM_PADRAO = "2024-12-31"
+ARQUIVO_CLIMA = "dados_climaticos_regional_detalhado.parquet"
+
+VARIAVEIS_DIARIAS = ["temperature_2m_max", "temperature_2m_min", "temperature_2m_mean",
+                     "precipitation_sum", "relative_humidity_2m_mean"]
+
+# Dicionário de Coordenadas (II GERES - PE), do cadastro datasets/municipios.csv
+# Fonte: IBGE / Google Maps
+MUNICIPIOS = coordenadas_regiao()
+
+
+class LimitadorTaxa:
+    """
+    Token bucket compartilhado pelas threads, com ajuste adaptativo (AIMD):
+    cada 429 corta a taxa pela metade e pausa todo mundo pelo tempo pedido pela API;
+    cada sucesso devolve um pouco da taxa até o máximo configurado.
+    """
+
+    def __init__(self, chamadas_por_minuto=600):
+        self.taxa_maxima = chamadas_por_minuto / 60.0
+        self.taxa = self.taxa_maxima
+        self.capacidade = float(chamadas_por_minuto)
+        self.tokens = self.capacidade
+        self.ultimo = time.monotonic()
+        self.pausado_ate = 0.0
+        self.lock = threading.Lock()
+
+    def _repor(self, agora):
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+        self.ultimo = agora
+
+    def adquirir(self, custo):
+        """
+        Bloqueia até haver tokens. Um pedido mais caro que o balde inteiro sai
+        quando o balde enche e deixa o saldo negativo (as próximas esperam a dívida).
+        """
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self._repor(agora)
+                necessario = min(custo, self.capacidade)
+                if agora >= self.pausado_ate and self.tokens >= necessario:
+                    self.tokens -= custo
+                    return
+                espera = max(self.pausado_ate - agora, (necessario - self.tokens) / self.taxa)
+            time.sleep(min(espera, 5.0))
+
+    def penalizar(self, espera):
+        with self.lock:
+            self.taxa = max(self.taxa_maxima / 64, self.taxa / 2)
+            self.pausado_ate = max(self.pausado_ate, time.monotonic() + espera)
+            self.tokens = min(self.tokens, 0.0)
+
+    def recompensar(self):
+        with self.lock:
+            self.taxa = min(self.taxa_maxima, self.taxa + self.taxa_maxima * 0.1)
+
+
+def custo_requisicao(n_locais, data_inicio, data_fim, n_variaveis=len(VARIAVEIS_DIARIAS)):
+    """
+    Custo em 'chamadas' da Open-Meteo: cada local conta 1, multiplicado por blocos
+    de 2 semanas de dados e de 10 variáveis (regra de chamadas fracionárias da API).
+    """
+    dias = (pd.Timestamp(data_fim) - pd.Timestamp(data_inicio)).days + 1
+    return n_locais * max(1.0, dias / 14) * max(1.0, n_variaveis / 10)
+
+
+def espera_por_limite(erro_msg):
+    """Quanto esperar segundo a resposta 429 da API (None = limite diário, desistir)."""
+    if 'Daily' in erro_msg:
+        return None
+    if 'Hourly' in erro_msg:
+        return 3600
+    return 60  # 'Minutely' ou 429 sem detalhe
+
+
+def criar_cliente(arquivo_cache='.cache', expira_dias=30):
+    """
+    Cliente da API (com cache em disco se arquivo_cache for informado).
+    O cache expira: quem evita rebaixar dados antigos agora é a base climática.
+    """
+    if arquivo_cache:
+        sessao = requests_cache.CachedSession(arquivo_cache, expire_after = timedelta(days=expira_dias))
+    else:
+        sessao = requests.Session()
+    retry_session = retry(sessao, retries = 5, backoff_factor = 0.2)
+    return openmeteo_requests.Client(session = retry_session), sessao
+
+
+def podar_cache(sessao, tamanho_max_mb=200):
+    """
+    Política de despejo do cache HTTP: remove o que expirou e, se o arquivo
+    SQLite ainda passar do limite, vai descartando as respostas mais antigas.
+    """
+    if not isinstance(sessao, requests_cache.CachedSession):
+        return
+    sessao.cache.delete(expired=True)
+    caminho = str(sessao.cache.db_path)
+    idade = timedelta(days=16)
+    while os.path.exists(caminho) and os.path.getsize(caminho) > tamanho_max_mb * 1024 ** 2:
+        if idade < timedelta(hours=1):
+            sessao.cache.clear()
+            break
+        sessao.cache.delete(older_than=idade)
+        idade = idade / 2
+
+
+def em_cache(sessao, url, params):
+    """True se a resposta já está no cache local (não consome cota da API)."""
+    if not isinstance(sessao, requests_cache.CachedSession):
+        return False
+    requisicao = requests.Request('GET', url, params={**params, 'format': 'flatbuffers'}).prepare()
+    return sessao.cache.contains(request=requisicao)
+
+
+def extrair_dados_diarios(response, codigo_ibge, nome):
+    daily = response.Daily()
+
+    daily_data = {
+        "date": pd.date_range(
+            start = pd.to_datetime(daily.Time(), unit = "s", utc = True),
+            end = pd.to_datetime(daily.TimeEnd(), unit = "s", utc = True),
+            freq = pd.Timedelta(seconds = daily.Interval()),
+            inclusive = "left"
+        ),
+        "temp_max": daily.Variables(0).ValuesAsNumpy(),
+        "temp_min": daily.Variables(1).ValuesAsNumpy(),
+        "temp_media": daily.Variables(2).ValuesAsNumpy(),
+        "chuva_mm": daily.Variables(3).ValuesAsNumpy(),
+        "umidade": daily.Variables(4).ValuesAsNumpy()
+    }
+
+    df_cidade = pd.DataFrame(data = daily_data)
+
+    # Adiciona identificadores para o JOIN futuro
+    df_cidade['ID_MN_RESI'] = codigo_ibge # A chave para cruzar com o SINAN
+    df_cidade['municipio_nome'] = nome
+    df_cidade['date'] = df_cidade['date'].dt.date
+    return df_cidade
+
+
+@medir("requisicao_clima")
+def baixar_lote(lote, openmeteo, sessao, limitador, url, data_inicio, data_fim, max_tentativas=5):
+    """
+    Uma requisição para vários municípios (listas de latitude/longitude).
+    A API devolve uma resposta por local, na mesma ordem.
+    """
+    nomes = ", ".join(coords['nome'] for _, coords in lote)
+    params = {
+        "latitude": [coords['lat'] for _, coords in lote],
+        "longitude": [coords['lon'] for _, coords in lote],
+        "start_date": data_inicio,
+        "end_date": data_fim,
+        "daily": VARIAVEIS_DIARIAS,
+        "timezone": "America/Sao_Paulo"
+    }
+    custo = custo_requisicao(len(lote), data_inicio, data_fim)
+
+    for tentativa in range(1, max_tentativas + 1):
+        if not em_cache(sessao, url, params):
+            limitador.adquirir(custo)
+        try:
+            responses = openmeteo.weather_api(url, params=dict(params))
+            limitador.recompensar()
+            print(f"   📍 Baixado: {nomes}")
+            dados = [extrair_dados_diarios(response, codigo_ibge, coords['nome'])
+                     for (codigo_ibge, coords), response in zip(lote, responses)]
+            contar(locais=len(lote), linhas=sum(len(df) for df in dados))
+            return dados
+
+        except Exception as e:
+            erro_msg = str(e)
+            if 'limit exceeded' in erro_msg or '429' in erro_msg:
+                espera = espera_por_limite(erro_msg)
+                if espera is None:
+                    print(f"      ⛔ Limite diário da API atingido. Desistindo de: {nomes}")
+                    return []
+                print(f"      ⚠️ Limite de API atingido. Esperando {espera} segundos... (Tentativa {tentativa}/{max_tentativas})")
+                limitador.penalizar(espera)
+            else:
+                print(f"❌ Erro em {nomes}: {e}")
+                return [] # Se for outro erro, desiste desse lote
+
+    return []
+
+
+def executar_tarefas(tarefas, openmeteo, sessao, limitador, url, max_workers=4):
+    """
+    Roda as tarefas (lote de municípios, data_inicio, data_fim) no ThreadPool.
+    A ordem das tarefas é preservada pelo map.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        resultados = pool.map(
+            lambda tarefa: baixar_lote(tarefa[0], openmeteo, sessao, limitador, url, tarefa[1], tarefa[2]),
+            tarefas
+        )
+        return [df for dfs in resultados for df in dfs]
+
+
+def dividir_em_lotes(itens, locais_por_requisicao):
+    return [itens[i:i + locais_por_requisicao] for i in range(0, len(itens), locais_por_requisicao)]
+
+
+@medir("coleta_clima", modo="completa")
+def coletar_clima_regional(municipios=MUNICIPIOS, data_inicio=DATA_INICIO_PADRAO, data_fim=DATA_FIM_PADRAO,
+                           url=URL_ARCHIVE, max_workers=4, locais_por_requisicao=10,
+                           chamadas_por_minuto=600, arquivo_cache='.cache',
+                           arquivo_saida=ARQUIVO_CLIMA):
+    """
+    Coleta o clima diário de cada município em paralelo (ThreadPool), agrupando
+    vários locais por requisição e respeitando a cota da API via token bucket.
+    """
     print("🌤️ Iniciando Coleta Climática de Precisão (Por Município)...")
 
     # 1. Configurar Cliente API com Cache
-    cache_session = requests_cache.CachedSession('.cache', expire_after = -1)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
-
-    # 2. Dicionário de Coordenadas (II GERES - PE)
-    # Fonte: IBGE / Google Maps
-    municipios = {
-        "260290": {"nome": "Buenos Aires", "lat": -7.7258, "lon": -35.3122},
-        "260410": {"nome": "Carpina", "lat": -7.8502, "lon": -35.2474},
-        "260845": {"nome": "Lagoa do Carro", "lat": -7.7569, "lon": -35.3217},
-        "260850": {"nome": "Lagoa de Itaenga", "lat": -7.9352, "lon": -35.2902},
-        "260950": {"nome": "Nazaré da Mata", "lat": -7.7431, "lon": -35.2217},
-        "261060": {"nome": "Paudalho", "lat": -7.9011, "lon": -35.1708},
-        "261560": {"nome": "Tracunhaém", "lat": -7.8033, "lon": -35.2325},
-        "261640": {"nome": "Vicência", "lat": -7.6575, "lon": -35.3275},
-        "260190": {"nome": "Bom Jardim", "lat": -7.7958, "lon": -35.5869},
-        "260415": {"nome": "Casinhas", "lat": -7.9258, "lon": -35.7172},
-        "260500": {"nome": "Cumaru", "lat": -8.0055, "lon": -35.6989},
-        "260540": {"nome": "Feira Nova", "lat": -7.9511, "lon": -35.3889},
-        "260800": {"nome": "João Alfredo", "lat": -7.8558, "lon": -35.5889},
-        "260890": {"nome": "Limoeiro", "lat": -7.8742, "lon": -35.4519},
-        "260900": {"nome": "Machados", "lat": -7.6750, "lon": -35.5233},
-        "260990": {"nome": "Orobó", "lat": -7.7458, "lon": -35.6022},
-        "261040": {"nome": "Passira", "lat": -7.9422, "lon": -35.5819},
-        "261230": {"nome": "Salgadinho", "lat": -7.9372, "lon": -35.6358},
-        "261450": {"nome": "Surubim", "lat": -7.8336, "lon": -35.7533},
-        "261618": {"nome": "Vertente do Lério", "lat": -7.7803, "lon": -35.7336}
-    }
+    openmeteo, sessao = criar_cliente(arquivo_cache)
+    limitador = LimitadorTaxa(chamadas_por_minuto)
 
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    
-    lista_dados = []
+    # 2. Lotes de municípios (uma requisição multi-local por lote)
+    itens = list(municipios.items())
+    lotes = dividir_em_lotes(itens, locais_por_requisicao)
+    print(f"   🧵 {len(itens)} municípios em {len(lotes)} requisição(ões), {max_workers} em paralelo")
 
-    # 3. Loop de Coleta
-    for codigo_ibge, coords in municipios.items():
-        print(f"   📍 Baixando: {coords['nome']} ({codigo_ibge})...")
-        
-        params = {
-            "latitude": coords['lat'],
-            "longitude": coords['lon'],
-            "start_date": "2019-01-01",
-            "end_date": "2024-12-31", # Pega até o final de 2024 para bater com a validação
-            "daily": ["temperature_2m_max", "temperature_2m_min", "temperature_2m_mean", 
-                      "precipitation_sum", "relative_humidity_2m_mean"],
-            "timezone": "America/Sao_Paulo"
-        }
-
-        sucesso = False
-        tentativas = 0
-        
-        # Loop de Tentativa (Retry Manual)
-        while not sucesso and tentativas < 3:
-            try:
-                # Faz a requisição
-                responses = openmeteo.weather_api(url, params=params)
-                response = responses[0]
-                
-                # Processa
-                daily = response.Daily()
-                
-                daily_data = {
-                    "date": pd.date_range(
-                        start = pd.to_datetime(daily.Time(), unit = "s", utc = True),
-                        end = pd.to_datetime(daily.TimeEnd(), unit = "s", utc = True),
-                        freq = pd.Timedelta(seconds = daily.Interval()),
-                        inclusive = "left"
-                    ),
-                    "temp_max": daily.Variables(0).ValuesAsNumpy(),
-                    "temp_min": daily.Variables(1).ValuesAsNumpy(),
-                    "temp_media": daily.Variables(2).ValuesAsNumpy(),
-                    "chuva_mm": daily.Variables(3).ValuesAsNumpy(),
-                    "umidade": daily.Variables(4).ValuesAsNumpy()
-                }
-                
-                df_cidade = pd.DataFrame(data = daily_data)
-                
-                # Adiciona identificadores para o JOIN futuro
-                df_cidade['ID_MN_RESI'] = codigo_ibge # A chave para cruzar com o SINAN
-                df_cidade['municipio_nome'] = coords['nome']
-                df_cidade['date'] = df_cidade['date'].dt.date
-                
-                lista_dados.append(df_cidade)
-                sucesso = True
-                
-                # Pausa aumentada para evitar bloqueio (5 segundos)
-                time.sleep(5)
-                
-            except Exception as e:
-                tentativas += 1
-                erro_msg = str(e)
-                if 'limit exceeded' in erro_msg or '429' in erro_msg:
-                    print(f"      ⚠️ Limite de API atingido. Esperando 60 segundos... (Tentativa {tentativas}/3)")
-                    time.sleep(60) # Espera 1 minuto se for bloqueado
-                else:
-                    print(f"❌ Erro em {coords['nome']}: {e}")
-                    break # Se for outro erro, desiste dessa cidade
+    # 3. Coleta concorrente
+    tarefas = [(lote, data_inicio, data_fim) for lote in lotes]
+    lista_dados = executar_tarefas(tarefas, openmeteo, sessao, limitador, url, max_workers)
+    podar_cache(sessao)
 
     # 4. Consolidação
     if lista_dados:
         df_final = pd.concat(lista_dados)
-        arquivo_saida = "dados_climaticos_regional_detalhado.parquet"
         df_final.to_parquet(arquivo_saida, index=False)
-        
+
         print(f"\n✅ SUCESSO! Base climática gerada: {arquivo_saida}")
         print(f"📊 Total de registros diários: {len(df_final)}")
         print(df_final.head())
+        return df_final
     else:
         print("⚠️ Nenhum dado coletado.")
+        return None
+
+@medir("coleta_clima", modo="incremental")
+def atualizar_clima_incremental(municipios=MUNICIPIOS, data_inicio=DATA_INICIO_PADRAO, data_fim=DATA_FIM_PADRAO,
+                                url=URL_ARCHIVE, max_workers=4, locais_por_requisicao=10,
+                                chamadas_por_minuto=600, arquivo_cache='.cache', pasta=PASTA_CLIMA,
+                                arquivo_saida=ARQUIVO_CLIMA):
+    """
+    Atualização incremental: descobre, por município, quais dias faltam na base
+    climática (normalmente só a cauda desde a última execução) e baixa apenas isso.
+    Municípios com a mesma lacuna viram uma única requisição multi-local.
+    Base vazia é semeada com o Parquet plano já existente (coleta anterior).
+    """
+    print(f"🌤️ Atualização Climática Incremental ({data_inicio} → {data_fim})...")
+
+    # 1. O que falta, por município
+    existentes = datas_existentes(pasta)
+    if not existentes:
+        arquivo_plano = caminho_dado(arquivo_saida)
+        importados = importar_flat(arquivo_plano, pasta)
+        if importados:
+            print(f"   📥 Base semeada com {importados} dia(s)-município de {arquivo_plano}")
+            existentes = datas_existentes(pasta)
+    lacunas = {}
+    for codigo_ibge, coords in municipios.items():
+        for intervalo in calcular_lacunas(existentes.get(codigo_ibge), data_inicio, data_fim):
+            lacunas.setdefault(intervalo, []).append((codigo_ibge, coords))
+
+    tarefas = [(lote, inicio, fim)
+               for (inicio, fim), itens in sorted(lacunas.items())
+               for lote in dividir_em_lotes(itens, locais_por_requisicao)]
+
+    if not tarefas:
+        print("✅ Base climática já está em dia. Nada a baixar.")
+    else:
+        print(f"   🧵 {len(tarefas)} requisição(ões) para {len(lacunas)} intervalo(s) faltante(s)")
+
+        # 2. Baixar só as lacunas
+        openmeteo, sessao = criar_cliente(arquivo_cache)
+        limitador = LimitadorTaxa(chamadas_por_minuto)
+        lista_dados = executar_tarefas(tarefas, openmeteo, sessao, limitador, url, max_workers)
+        podar_cache(sessao)
+
+        # 3. Anexar na base particionada
+        if lista_dados:
+            novos = anexar_clima(pd.concat(lista_dados), pasta)
+            print(f"   💾 {novos} dia(s)-município novos gravados em {pasta}/")
+
+    # 4. Arquivo plano para as etapas seguintes
+    if not os.path.isdir(pasta):
+        print("⚠️ Nenhum dado coletado.")
+        return None
+    df_final = exportar_flat(arquivo_saida, pasta)
+    print(f"\n✅ SUCESSO! Base climática gerada: {arquivo_saida}")
+    print(f"📊 Total de registros diários: {len(df_final)}")
+    return df_final
 
 if __name__ == "__main__":
-    coletar_clima_regional()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Atualização incremental do clima diário por município.")
+    parser.add_argument("--data-inicio", default=DATA_INICIO_PADRAO)
+    parser.add_argument("--data-fim", default=DATA_FIM_PADRAO,
+                        help=f"Último dia da base (padrão: {DATA_FIM_PADRAO}, fim do período do estudo; "
+                             "use a data de ontem para acompanhar a temporada atual)")
+    args = parser.parse_args()
+
+    atualizar_clima_incremental(data_inicio=args.data_inicio, data_fim=args.data_fim)
@@ -1,127 +1,392 @@
-import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pysus import SINAN
-import gc  # Garbage Collector (Limpeza de memória)
 import os
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from filtro_regional import iterar_lotes_por_regiao, iterar_lotes_regiao
+from instrumentacao import contar, medir
+from manifesto_fragmentos import PASTA_FRAGMENTOS_REGIONAIS, atualizar_regiao_incremental
+from armazem_notificacoes import gravar_armazem, PASTA_ARMAZEM
+from cubo_semanal import gerar_cubo, ARQUIVO_CUBO
+from registro_municipios import ARQUIVO_MUNICIPIOS, REGIAO_PADRAO, codigos_regiao, mapa_regioes
 
 # 1. Configurações Iniciais
-# CORREÇÃO CRÍTICA: Códigos IBGE convertidos para 6 dígitos (Padrão SINAN)
+# Códigos IBGE de 6 dígitos (padrão SINAN) vêm do cadastro de municípios
 # Região: II GERES - Limoeiro (Mata Norte e Agreste Setentrional)
-codigos_municipios_6_digitos = [
-    # Cidades da II GERES
-    "260290", # Buenos Aires
-    "260410", # Carpina
-    "260845", # Lagoa do Carro
-    "260850", # Lagoa de Itaenga
-    "260950", # Nazaré da Mata
-    "261060", # Paudalho
-    "261560", # Tracunhaém
-    "261640", # Vicência
-    "260190", # Bom Jardim
-    "260415", # Casinhas
-    "260500", # Cumaru
-    "260540", # Feira Nova
-    "260800", # João Alfredo
-    "260890", # Limoeiro
-    "260900", # Machados
-    "260990", # Orobó
-    "261040", # Passira
-    "261230", # Salgadinho
-    "261450", # Surubim
-    "261618"  # Vertente do Lério
-]
-
-def processar_ano_a_ano(anos):
+codigos_municipios_6_digitos = codigos_regiao(REGIAO_PADRAO)
+
+def arquivo_regiao(regiao):
+    """Parquet regional de uma GERES (a II mantém o nome de sempre)."""
+    return f"dataset_dengue_{regiao}_GERES.parquet"
+
+def listar_caminhos_parquet(parquet_set):
     """
-    Baixa o arquivo Brasil, filtra a II GERES e salva parciais.
+    O PySUS devolve um ParquetSet ou uma lista deles, e cada um pode ser uma pasta
+    de fragmentos (ex: DENGBR24.parquet/*-0.parquet). Queremos a lista de arquivos.
     """
+    conjuntos = parquet_set if isinstance(parquet_set, (list, tuple)) else [parquet_set]
+    caminhos = []
+    for conjunto in conjuntos:
+        caminho = str(conjunto.path)
+        if os.path.isdir(caminho):
+            caminhos.extend(sorted(glob.glob(os.path.join(caminho, "*.parquet"))))
+        else:
+            caminhos.append(caminho)
+    return caminhos
+
+def alinhar_lote(batch, ano, schema):
+    """Encaixa um lote no schema unificado (anos diferentes têm colunas diferentes)."""
+    colunas = []
+    for campo in schema:
+        if campo.name == 'ano_base':
+            colunas.append(pa.array([ano] * batch.num_rows, type=campo.type))
+        elif campo.name in batch.schema.names:
+            colunas.append(batch.column(campo.name).cast(campo.type))
+        else:
+            colunas.append(pa.nulls(batch.num_rows, type=campo.type))
+    return pa.RecordBatch.from_arrays(colunas, schema=schema)
+
+def montar_schema_final(schemas):
+    """União das colunas de todos os anos + ano_base."""
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    return schema.append(pa.field('ano_base', pa.int64()))
+
+def gravar_parquet_atomico(arquivo_saida, schema, lotes):
+    """
+    Anexa os lotes (ano, RecordBatch) no ParquetWriter e devolve o total de linhas.
+    Escreve num .tmp e só troca no final, para nunca deixar um arquivo pela metade.
+    Sem nenhuma linha o .tmp é descartado: a coleta anterior continua valendo.
+    """
+    arquivo_tmp = arquivo_saida + ".tmp"
+    total = 0
+    try:
+        with pq.ParquetWriter(arquivo_tmp, schema) as writer:
+            for ano, batch in lotes:
+                writer.write_batch(alinhar_lote(batch, ano, schema))
+                total += batch.num_rows
+                contar(linhas_gravadas=batch.num_rows)
+        if total:
+            os.replace(arquivo_tmp, arquivo_saida)
+    finally:
+        if os.path.exists(arquivo_tmp):
+            os.remove(arquivo_tmp)
+    if not total:
+        print(f"   ⚠️ Nenhuma linha filtrada: {arquivo_saida} não foi alterado.")
+    return total
+
+def baixar_fontes(anos):
+    """Baixa o arquivo Brasil de cada ano. Retorna [(ano, pyarrow Dataset)] (só metadados na memória)."""
     sinan = SINAN().load()
-    arquivos_gerados = []
+    fontes = []
 
     for ano in anos:
         print(f"\n🔄 INICIANDO CICLO: {ano}")
         try:
-            # 1. Localizar o arquivo
+            # Localizar o arquivo
             files = sinan.get_files('DENG', year=ano)
             if not files:
                 print(f"⚠️ Arquivo de {ano} não encontrado.")
                 continue
 
-            # 2. Baixar
+            # Baixar
             print(f"   ⬇️ Baixando Brasil {ano}...")
-            parquet_set = sinan.download(files) 
-
-            # 3. Converter para DataFrame
-            print(f"   🔨 Carregando na memória...")
-            df_br = parquet_set.to_dataframe()
-            
-            # 4. Filtragem (Usando coluna ID_MN_RESI - Município de Residência)
-            if 'ID_MN_RESI' in df_br.columns:
-                # Garante formato string e remove espaços
-                df_br['ID_MN_RESI'] = df_br['ID_MN_RESI'].astype(str).str.strip()
-                
-                # Filtra pela lista de 6 dígitos
-                df_pe = df_br[df_br['ID_MN_RESI'].isin(codigos_municipios_6_digitos)].copy()
-                df_pe['ano_base'] = ano
-                
-                registros = len(df_pe)
-                print(f"   ✅ SUCESSO! Encontrados {registros} casos na II GERES.")
-                
-                # 5. Salvar checkpoint
-                if registros > 0:
-                    nome_arquivo = f"temp_dengue_{ano}.parquet"
-                    df_pe.to_parquet(nome_arquivo, index=False)
-                    arquivos_gerados.append(nome_arquivo)
-                    print(f"   💾 Salvo: {nome_arquivo}")
-                
-            else:
+            parquet_set = sinan.download(files)
+            dataset = ds.dataset(listar_caminhos_parquet(parquet_set), format="parquet")
+
+            # Filtragem usa a coluna ID_MN_RESI (Município de Residência)
+            if 'ID_MN_RESI' not in dataset.schema.names:
                 print(f"   ⚠️ Coluna ID_MN_RESI não encontrada.")
+                continue
 
-            # 6. Faxina na Memória (Essencial!)
-            del df_br
-            if 'df_pe' in locals(): del df_pe
-            del parquet_set
-            gc.collect()
-            print(f"   🧹 Memória limpa.")
+            fontes.append((ano, dataset))
 
         except Exception as e:
             print(f"❌ Erro em {ano}: {e}")
-            gc.collect()
 
-    return arquivos_gerados
+    return fontes
 
-def consolidar_dados(lista_arquivos):
-    """Junta os pedaços em um arquivo final"""
-    print(f"\n🔗 Consolidando {len(lista_arquivos)} arquivos...")
-    if not lista_arquivos:
-        return pd.DataFrame()
-    
-    df_final = pd.concat([pd.read_parquet(f) for f in lista_arquivos])
-    
-    # Limpa arquivos temporários
-    for f in lista_arquivos:
+@medir("coleta_sinan", modo="sequencial")
+def processar_ano_a_ano(anos, arquivo_saida="dataset_dengue_II_GERES.parquet", batch_size=50000):
+    """
+    Baixa o arquivo Brasil de cada ano e grava a II GERES direto no Parquet final,
+    lote a lote. O pico de memória depende do batch_size, não do tamanho do ano.
+    """
+    # 1. Baixar todos os anos (só metadados vão para a memória)
+    fontes = baixar_fontes(anos)
+    if not fontes:
+        return 0
+
+    # 2. Schema único para o arquivo final (união das colunas de todos os anos)
+    schema = montar_schema_final([dataset.schema for _, dataset in fontes])
+
+    # 3. Streaming: filtra cada lote no Arrow e anexa no ParquetWriter
+    def lotes_filtrados():
+        for ano, dataset in fontes:
+            print(f"   🔨 Filtrando {ano} em streaming...")
+            registros = 0
+            for batch in iterar_lotes_regiao(dataset, codigos_municipios_6_digitos, batch_size=batch_size):
+                yield ano, batch
+                registros += batch.num_rows
+            print(f"   ✅ SUCESSO! Encontrados {registros} casos na II GERES.")
+
+    return gravar_parquet_atomico(arquivo_saida, schema, lotes_filtrados())
+
+@medir("coleta_sinan", modo="multirregiao")
+def processar_multirregiao(anos, regioes=None, batch_size=50000):
+    """
+    Várias GERES numa passada só pelo arquivo Brasil de cada ano: o scan filtra
+    pela união dos municípios e cada lote é roteado para o Parquet da sua região
+    (busca vetorizada código -> região do cadastro). Custa o mesmo que uma região.
+    Retorna {região: linhas gravadas}. Menos de duas regiões = ValueError (o modo
+    de uma região só é o processar_ano_a_ano).
+    """
+    regioes = mapa_regioes(regioes)
+    if len(regioes) < 2:
+        raise ValueError(
+            f"Modo multirregião precisa de pelo menos duas GERES; o cadastro ({ARQUIVO_MUNICIPIOS}) "
+            f"resolveu só: {', '.join(regioes) or 'nenhuma'}. Acrescente as linhas das outras "
+            f"GERES ou aponte $DENGUE_DADOS para o cadastro estadual."
+        )
+    fontes = baixar_fontes(anos)
+    if not fontes:
+        return {}
+
+    schema = montar_schema_final([dataset.schema for _, dataset in fontes])
+    writers = {}
+    totais = dict.fromkeys(regioes, 0)
+    try:
+        for ano, dataset in fontes:
+            print(f"   🔨 Filtrando {ano} em streaming para {len(regioes)} região(ões)...")
+            for regiao, batch in iterar_lotes_por_regiao(dataset, regioes, batch_size=batch_size):
+                if regiao not in writers:
+                    writers[regiao] = pq.ParquetWriter(arquivo_regiao(regiao) + ".tmp", schema)
+                writers[regiao].write_batch(alinhar_lote(batch, ano, schema))
+                totais[regiao] += batch.num_rows
+                contar(linhas_gravadas=batch.num_rows)
+        for regiao, writer in writers.items():
+            writer.close()
+            os.replace(arquivo_regiao(regiao) + ".tmp", arquivo_regiao(regiao))
+    except Exception:
+        for regiao, writer in writers.items():
+            writer.close()
+            if os.path.exists(arquivo_regiao(regiao) + ".tmp"):
+                os.remove(arquivo_regiao(regiao) + ".tmp")
+        raise
+
+    for regiao, total in totais.items():
+        print(f"   ✅ {regiao} GERES: {total} casos -> {arquivo_regiao(regiao) if total else '(nenhum)'}")
+    return totais
+
+# --- MODO PARALELO (Pool de Processos) ---
+
+def memoria_padrao_mb():
+    """Metade da RAM física (ou 2 GB se o sistema não informar)."""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (2 * 1024 ** 2)
+    except (ValueError, OSError, AttributeError):
+        return 2048
+
+def estimar_memoria_fragmento(caminho):
+    """
+    Estimativa do pico de um worker lendo o fragmento: o maior row group
+    descomprimido (o leitor decodifica um row group por vez) vezes 2 (Parquet -> Arrow).
+    """
+    metadata = pq.read_metadata(caminho)
+    maior = max((metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)), default=0)
+    return 2 * maior
+
+def _inicializar_worker():
+    # Cada processo usa 1 thread do Arrow; o paralelismo vem do pool
+    pa.set_cpu_count(1)
+    pa.set_io_thread_count(1)
+
+def baixar_ano(ano):
+    """Worker: baixa o arquivo Brasil de um ano e devolve os caminhos dos fragmentos."""
+    sinan = SINAN().load()
+    files = sinan.get_files('DENG', year=ano)
+    if not files:
+        return []
+    return listar_caminhos_parquet(sinan.download(files))
+
+@medir("filtrar_fragmento")
+def filtrar_fragmento(caminho, codigos, batch_size=50000):
+    """Worker: devolve só as linhas da região de um fragmento (tabela pequena)."""
+    return pa.Table.from_batches(
+        list(iterar_lotes_regiao(caminho, codigos, batch_size=batch_size)),
+        schema=pq.read_schema(caminho)
+    )
+
+@medir("coleta_sinan", modo="paralelo")
+def processar_anos_em_paralelo(anos, arquivo_saida="dataset_dengue_II_GERES.parquet",
+                               max_workers=None, memoria_max_mb=None, batch_size=50000):
+    """
+    Baixa e filtra vários anos ao mesmo tempo, fragmento a fragmento, num pool de processos.
+
+    - memoria_max_mb: orçamento somado dos workers. Um fragmento só é enviado se a
+      estimativa dele couber no que sobra (sempre há pelo menos um em andamento).
+    - A saída é gravada na ordem (ano, fragmento), independente de quem terminou primeiro.
+    """
+    max_workers = max_workers or os.cpu_count()
+    orcamento = (memoria_max_mb or memoria_padrao_mb()) * 1024 ** 2
+    print(f"⚙️ Pool: {max_workers} workers | Orçamento de memória: {orcamento // 1024 ** 2} MB")
+
+    schemas = {}      # ano -> schema do arquivo Brasil
+    fila = []         # (ordem, ano, caminho, estimativa) aguardando orçamento
+    resultados = {}   # ordem -> (ano, tabela filtrada)
+    pendentes = {}    # future -> (tipo, info)
+    em_uso = 0
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_worker) as pool:
+        # 1. Downloads de todos os anos em paralelo
+        for ano in anos:
+            print(f"   ⬇️ Baixando Brasil {ano}...")
+            pendentes[pool.submit(baixar_ano, ano)] = ('download', ano)
+
+        while pendentes:
+            concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+
+            for future in concluidos:
+                tipo, info = pendentes.pop(future)
+
+                if tipo == 'download':
+                    ano = info
+                    try:
+                        caminhos = future.result()
+                    except Exception as e:
+                        print(f"❌ Erro em {ano}: {e}")
+                        continue
+                    if not caminhos:
+                        print(f"⚠️ Arquivo de {ano} não encontrado.")
+                        continue
+
+                    schema = pa.unify_schemas([pq.read_schema(c) for c in caminhos], promote_options="permissive")
+                    if 'ID_MN_RESI' not in schema.names:
+                        print(f"   ⚠️ Coluna ID_MN_RESI não encontrada ({ano}).")
+                        continue
+
+                    schemas[ano] = schema
+                    print(f"   📂 {ano}: {len(caminhos)} fragmento(s) na fila.")
+                    for indice, caminho in enumerate(caminhos):
+                        fila.append(((anos.index(ano), indice), ano, caminho, estimar_memoria_fragmento(caminho)))
+                    fila.sort(key=lambda tarefa: tarefa[0])
+
+                else:
+                    ordem, ano, estimativa = info
+                    em_uso -= estimativa
+                    # Um fragmento com erro invalida a saída determinística: aborta
+                    resultados[ordem] = (ano, future.result())
+
+            # 2. Envia fragmentos enquanto couberem no orçamento e houver worker livre
+            em_andamento = sum(1 for tipo, _ in pendentes.values() if tipo == 'fragmento')
+            while fila and em_andamento < max_workers and (em_uso == 0 or em_uso + fila[0][3] <= orcamento):
+                ordem, ano, caminho, estimativa = fila.pop(0)
+                future = pool.submit(filtrar_fragmento, caminho, codigos_municipios_6_digitos, batch_size)
+                pendentes[future] = ('fragmento', (ordem, ano, estimativa))
+                em_uso += estimativa
+                em_andamento += 1
+
+    if not schemas:
+        return 0
+
+    for ano in anos:
+        if ano in schemas:
+            registros = sum(t.num_rows for a, t in resultados.values() if a == ano)
+            print(f"   ✅ SUCESSO! Encontrados {registros} casos na II GERES em {ano}.")
+
+    # 3. Merge determinístico: ordem (ano, fragmento)
+    schema = montar_schema_final([schemas[ano] for ano in anos if ano in schemas])
+
+    def lotes_ordenados():
+        for ordem in sorted(resultados):
+            ano, tabela = resultados[ordem]
+            for batch in tabela.to_batches():
+                yield ano, batch
+
+    return gravar_parquet_atomico(arquivo_saida, schema, lotes_ordenados())
+
+# --- MODO INCREMENTAL (Manifesto de Fragmentos) ---
+
+@medir("coleta_sinan", modo="incremental")
+def processar_incremental(anos, arquivo_saida="dataset_dengue_II_GERES.parquet",
+                          pasta_fragmentos=PASTA_FRAGMENTOS_REGIONAIS, batch_size=50000):
+    """
+    Só refiltra os fragmentos nacionais novos ou alterados (ver manifesto_fragmentos).
+    As partes regionais ficam em pasta_fragmentos e o Parquet final é remontado a
+    partir delas, o que custa segundos (só linhas da II GERES).
+    """
+    fontes = []
+    for ano in anos:
+        print(f"\n🔄 INICIANDO CICLO: {ano}")
         try:
-            os.remove(f)
-        except:
-            pass
-        
-    return df_final
+            caminhos = baixar_ano(ano)
+        except Exception as e:
+            print(f"❌ Erro em {ano}: {e}")
+            continue
+        if not caminhos:
+            print(f"⚠️ Arquivo de {ano} não encontrado.")
+            continue
+        if 'ID_MN_RESI' not in pq.read_schema(caminhos[0]).names:
+            print(f"   ⚠️ Coluna ID_MN_RESI não encontrada.")
+            continue
+        fontes.extend((ano, caminho) for caminho in caminhos)
+
+    if not fontes:
+        return 0
+
+    partes = atualizar_regiao_incremental(fontes, codigos_municipios_6_digitos, pasta_fragmentos, batch_size=batch_size)
+    schema = montar_schema_final([pq.read_schema(parte) for _, parte in partes])
+
+    def lotes_das_partes():
+        for ano, parte in partes:
+            for batch in pq.ParquetFile(parte).iter_batches(batch_size=batch_size):
+                yield ano, batch
+
+    return gravar_parquet_atomico(arquivo_saida, schema, lotes_das_partes())
 
 if __name__ == "__main__":
     # Vamos tentar os últimos 5 anos disponíveis
     anos_estudo = [2019, 2020, 2021, 2022, 2023] 
+    arquivo_final = "dataset_dengue_II_GERES.parquet"
+    
+    parser = argparse.ArgumentParser(description="Coleta SINAN (Dengue) da II GERES")
+    parser.add_argument("--workers", type=int, default=1, help="Processos em paralelo (1 = sequencial)")
+    parser.add_argument("--memoria-mb", type=int, default=None, help="Orçamento de memória somado dos workers")
+    parser.add_argument("--incremental", action="store_true", help="Só refiltra fragmentos novos/alterados (manifesto)")
+    parser.add_argument("--regioes", nargs="*", default=None,
+                        help="Duas ou mais GERES do cadastro numa passada só (sem valor = todas do municipios.csv)")
+    args = parser.parse_args()
     
-    print("🚀 Coletando dados da II GERES (Limoeiro/PE)...")
-    arquivos_temp = processar_ano_a_ano(anos_estudo)
+    if args.regioes is not None:
+        regioes = args.regioes or None
+        print(f"🚀 Coletando várias GERES numa passada: {', '.join(regioes or ['todas do cadastro'])}...")
+        try:
+            totais = processar_multirregiao(anos_estudo, regioes)
+        except (KeyError, ValueError) as e:
+            parser.error(str(e))
+        print(f"📦 {sum(totais.values())} notificações em {len(totais)} região(ões).")
+        # Armazém e cubo continuam sendo os da II GERES
+        total = totais.get(REGIAO_PADRAO, 0)
+    else:
+        print("🚀 Coletando dados da II GERES (Limoeiro/PE)...")
+        if args.incremental:
+            total = processar_incremental(anos_estudo, arquivo_saida=arquivo_final)
+        elif args.workers > 1:
+            total = processar_anos_em_paralelo(anos_estudo, arquivo_saida=arquivo_final,
+                                               max_workers=args.workers, memoria_max_mb=args.memoria_mb)
+        else:
+            total = processar_ano_a_ano(anos_estudo, arquivo_saida=arquivo_final)
     
-    if arquivos_temp:
-        df_completo = consolidar_dados(arquivos_temp)
-        
-        # Salva o arquivo final
-        arquivo_final = "dataset_dengue_II_GERES.parquet"
-        df_completo.to_parquet(arquivo_final, index=False)
-        
+    if total:
+        gravar_armazem(arquivo_final, PASTA_ARMAZEM)
         print(f"\n🏆 CONCLUÍDO! Arquivo gerado: {arquivo_final}")
-        print(f"📊 Total acumulado de notificações: {len(df_completo)}")
-        print(df_completo.head())
+        print(f"🗂️ Base particionada (ano/município) atualizada: {PASTA_ARMAZEM}/")
+        gerar_cubo(ARQUIVO_CUBO)
+        print(f"🧊 Cubo semanal (município x semana) atualizado: {ARQUIVO_CUBO}")
+        print(f"📊 Total acumulado de notificações: {total}")
+        print(pq.ParquetFile(arquivo_final).read_row_group(0).slice(0, 5).to_pandas())
     else:
-        print("\n⚠️ Nenhum dado encontrado. Verifique os códigos ou anos.")
\ No newline at end of file
+        print("\n⚠️ Nenhum dado encontrado. Verifique os códigos ou anos.")
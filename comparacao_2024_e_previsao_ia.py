@@ -2,20 +2,18 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pysus import SINAN
-import pyarrow.parquet as pq
 import os
-import gc
 import glob
 
+from agregacao_semanal import agregar_casos_semanais, para_pandas, serie_regional
+from manifesto_fragmentos import PASTA_FRAGMENTOS_REGIONAIS, atualizar_regiao_incremental, ler_partes_consolidadas
+from registro_municipios import codigos_regiao
+
 # Configuração visual
 sns.set_theme(style="whitegrid")
 
-# Códigos da II GERES (Mata Norte + Agreste) - 6 Dígitos
-codigos_municipios = [
-    "260290", "260410", "260845", "260850", "260950", "261060", "261560", "261640",
-    "260190", "260415", "260500", "260540", "260800", "260890", "260900", "260990", 
-    "261040", "261230", "261450", "261618"
-]
+# Códigos da II GERES (Mata Norte + Agreste) - 6 Dígitos, do cadastro de municípios
+codigos_municipios = codigos_regiao()
 
 def baixar_e_filtrar_blindado_v2():
     print("🛡️ Iniciando Protocolo V2 (Suporte a Diretórios)...")
@@ -66,45 +64,21 @@ def baixar_e_filtrar_blindado_v2():
 
     print(f"📊 Total de arquivos a processar: {len(lista_arquivos_para_ler)}")
 
-    # 4. PROCESSAMENTO EM STREAMING (Loop nos arquivos -> Loop nos chunks)
-    lista_dfs = []
-    total_linhas = 0
-    
-    for arq in lista_arquivos_para_ler:
-        print(f"   🔨 Processando: {os.path.basename(arq)}...")
-        try:
-            parquet_file = pq.ParquetFile(arq)
-            
-            # Batch size seguro
-            for batch in parquet_file.iter_batches(batch_size=50000):
-                df_chunk = batch.to_pandas()
-                
-                if 'ID_MN_RESI' in df_chunk.columns:
-                    df_chunk['ID_MN_RESI'] = df_chunk['ID_MN_RESI'].astype(str).str.strip()
-                    
-                    # Filtra Região
-                    df_filtrado = df_chunk[df_chunk['ID_MN_RESI'].isin(codigos_municipios)].copy()
-                    
-                    if not df_filtrado.empty:
-                        df_filtrado = df_filtrado[['DT_NOTIFIC', 'ID_MN_RESI']]
-                        lista_dfs.append(df_filtrado)
-                        total_linhas += len(df_filtrado)
-                
-                del df_chunk
-                
-        except Exception as e:
-            print(f"   ⚠️ Erro ao ler {arq}: {e}")
-            continue
-        
-        gc.collect()
+    # 4. LEITURA INCREMENTAL (Manifesto: só refiltra fragmentos novos/alterados)
+    partes = atualizar_regiao_incremental(
+        [(2024, arq) for arq in sorted(lista_arquivos_para_ler)],
+        codigos_municipios, PASTA_FRAGMENTOS_REGIONAIS, ignorar_erros=True
+    )
+    # Partes consolidadas num Arrow IPC mapeado em memória (refeito só quando o manifesto
+    # muda) e casos por semana agregados no Arrow: só a série semanal chega ao pandas
+    tabela = ler_partes_consolidadas(partes, PASTA_FRAGMENTOS_REGIONAIS, colunas=['DT_NOTIFIC', 'ID_MN_RESI'])
+    casos = para_pandas(agregar_casos_semanais(tabela))
+    total_linhas = int(casos['casos'].sum())
 
     # 5. Consolidação
-    if lista_dfs:
-        print(f"🔗 Consolidando {len(lista_dfs)} fragmentos...")
-        df_final = pd.concat(lista_dfs)
-        df_final['DT_NOTIFIC'] = pd.to_datetime(df_final['DT_NOTIFIC'])
-        
-        df_real = df_final.set_index('DT_NOTIFIC').resample('W-SUN').size().reset_index(name='casos_reais')
+    if total_linhas > 0:
+        print(f"🔗 Consolidando {len(partes)} fragmentos...")
+        df_real = serie_regional(casos, 'casos_reais').rename(columns={'DT_SEMANA': 'DT_NOTIFIC'})
         print(f"🏆 SUCESSO! Recuperados {total_linhas} casos da sua região.")
         return df_real
     else:
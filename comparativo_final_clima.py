@@ -8,9 +8,14 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import seaborn as sns
 import pandas as pd
-import pyarrow.dataset as ds
 import locale
 
+from configuracao import caminho_dado
+from cubo_semanal import ARQUIVO_CUBO_2024, construir_cubo
+from agregacao_semanal import agregar_casos_semanais, para_pandas, serie_regional
+from manifesto_fragmentos import PASTA_FRAGMENTOS_REGIONAIS, atualizar_regiao_incremental, ler_partes_consolidadas
+from registro_municipios import codigos_regiao
+
 # Configuração visual e de idioma
 sns.set_theme(style="whitegrid")
 try:
@@ -18,12 +23,8 @@ try:
 except:
     print("⚠️ Aviso: Locale PT-BR não disponível no sistema. Datas podem ficar em inglês.")
 
-# Códigos da II GERES (Mata Norte + Agreste)
-codigos_municipios = [
-    "260290", "260410", "260845", "260850", "260950", "261060", "261560", "261640",
-    "260190", "260415", "260500", "260540", "260800", "260890", "260900", "260990", 
-    "261040", "261230", "261450", "261618"
-]
+# Códigos da II GERES (Mata Norte + Agreste), do cadastro de municípios
+codigos_municipios = codigos_regiao()
 
 def encontrar_caminho_dados():
     """Caça o arquivo ou pasta do DENGBR24 onde quer que ele esteja."""
@@ -64,42 +65,30 @@ def carregar_real_2024_blindado():
         return None
 
     print(f"🚀 Iniciando leitura inteligente via PyArrow Dataset...")
-    lista_dfs = []
+    
+    fragmentos = sorted(glob.glob(os.path.join(caminho, "*.parquet"))) if os.path.isdir(caminho) else [caminho]
     
     try:
-        dataset = ds.dataset(caminho, format="parquet")
-        
-        # Iterar em batches (lotes) para não estourar a memória (8GB)
-        # batch_size limita quantas linhas vem por vez
-        scanner = dataset.scanner(batch_size=50000)
-        
-        for batch in scanner.to_batches():
-            df_chunk = batch.to_pandas()
-            
-            # Padronização e Filtro
-            if 'ID_MN_RESI' in df_chunk.columns:
-                df_chunk['ID_MN_RESI'] = df_chunk['ID_MN_RESI'].astype(str).str.strip()
-                
-                # Filtra apenas a região II GERES
-                df_filtrado = df_chunk[df_chunk['ID_MN_RESI'].isin(codigos_municipios)].copy()
-                
-                if not df_filtrado.empty:
-                    lista_dfs.append(df_filtrado[['DT_NOTIFIC']])
-            
-            # Libera memória imediatamente
-            del df_chunk
-
+        # Manifesto: só fragmentos novos/alterados são refiltrados (com projeção e
+        # filtro empurrados para o Arrow); os demais vêm das partes regionais já prontas
+        partes = atualizar_regiao_incremental(
+            [(2024, f) for f in fragmentos], codigos_municipios, PASTA_FRAGMENTOS_REGIONAIS
+        )
+        # Partes consolidadas num Arrow IPC mapeado em memória (refeito só quando o manifesto
+        # muda) e casos por semana agregados no Arrow: só a série semanal chega ao pandas
+        tabela = ler_partes_consolidadas(partes, PASTA_FRAGMENTOS_REGIONAIS, colunas=['DT_NOTIFIC', 'ID_MN_RESI'])
+        casos = para_pandas(agregar_casos_semanais(tabela))
     except Exception as e:
         print(f"❌ Erro crítico na leitura: {e}")
         return None
 
-    if lista_dfs:
+    if len(casos) > 0:
         print(f"   ✅ Processamento concluído. Consolidando...")
-        df_final = pd.concat(lista_dfs)
-        df_final['DT_NOTIFIC'] = pd.to_datetime(df_final['DT_NOTIFIC'])
-        
+        # Cubo de 2024 (município x semana) para o painel, que só lê o arquivo
+        construir_cubo(casos).to_parquet(ARQUIVO_CUBO_2024, index=False)
+        print(f"   🧊 Cubo semanal de 2024 gravado: {ARQUIVO_CUBO_2024}")
         # Agrupa por Semana
-        df_real = df_final.set_index('DT_NOTIFIC').resample('W-SUN').size().reset_index(name='casos_real')
+        df_real = serie_regional(casos, 'casos_real').rename(columns={'DT_SEMANA': 'DT_NOTIFIC'})
         return df_real
     else:
         print("⚠️ Dados lidos, mas nenhum caso de Pernambuco (II GERES) encontrado.")
@@ -108,7 +97,7 @@ def carregar_real_2024_blindado():
 def gerar_confronto_final():
     # 1. Carregar Previsões (IA)
     try:
-        df_v1 = pd.read_parquet("previsao_2024_estimada.parquet") # Sem Clima
+        df_v1 = pd.read_parquet(caminho_dado("previsao_2024_estimada.parquet")) # Sem Clima (V1 publicado)
         df_v2 = pd.read_parquet("previsao_2024_com_clima.parquet") # Com Clima
         
         # Prepara colunas
@@ -0,0 +1,27 @@
+import os
+
+# Raiz do projeto (pasta dos scripts)
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+# Onde procurar os artefatos, em ordem: $DENGUE_DADOS, pasta atual (saída dos
+# scripts do pipeline), datasets/ e graficos/ (versões publicadas no repositório)
+PASTAS_DADOS = [
+    pasta for pasta in (
+        os.environ.get("DENGUE_DADOS"),
+        os.getcwd(),
+        os.path.join(RAIZ, "datasets"),
+        os.path.join(RAIZ, "graficos")
+    ) if pasta
+]
+
+
+def caminho_dado(nome):
+    """
+    Caminho de um arquivo/pasta de dados: o primeiro que existir em PASTAS_DADOS.
+    Se não existir em nenhuma, devolve o da primeira pasta (onde seria gravado).
+    """
+    for pasta in PASTAS_DADOS:
+        caminho = os.path.join(pasta, nome)
+        if os.path.exists(caminho):
+            return caminho
+    return os.path.join(PASTAS_DADOS[0], nome)
@@ -0,0 +1,60 @@
+import pandas as pd
+
+from agregacao_semanal import agregar_casos_semanais, completar_semanas, para_pandas, serie_regional
+from armazem_notificacoes import abrir_armazem
+from instrumentacao import medir
+
+# Cubo materializado: município x semana epidemiológica (W-SUN) + total regional
+ARQUIVO_CUBO = "cubo_semanal_II_GERES.parquet"
+# Mesmo formato para 2024 (DENGBR24), gravado pela etapa de comparação
+ARQUIVO_CUBO_2024 = "cubo_semanal_2024_II_GERES.parquet"
+CHAVE_REGIONAL = "TOTAL"
+COLUNAS_CUBO = ['ID_MN_RESI', 'DT_SEMANA', 'casos']
+
+
+def construir_cubo(casos):
+    """
+    Cubo a partir das contagens (ID_MN_RESI, DT_SEMANA, casos) do agregar_casos_semanais.
+    Cada município cobre da sua primeira à sua última semana com notificação (semanas
+    sem caso = 0), igual ao antigo resample('W').size() do painel. O total regional
+    entra com ID_MN_RESI = 'TOTAL'.
+    """
+    regional = serie_regional(casos)
+    regional.insert(0, 'ID_MN_RESI', CHAVE_REGIONAL)
+
+    cubo = pd.concat([completar_semanas(casos), regional], ignore_index=True)
+    cubo['casos'] = cubo['casos'].astype('int32')
+    return cubo.sort_values(['ID_MN_RESI', 'DT_SEMANA']).reset_index(drop=True)
+
+
+@medir("gerar_cubo")
+def gerar_cubo(arquivo_saida=ARQUIVO_CUBO):
+    """Etapa do pipeline: agrega a base particionada no Arrow e grava o cubo semanal."""
+    cubo = construir_cubo(para_pandas(agregar_casos_semanais(abrir_armazem())))
+    cubo.to_parquet(arquivo_saida, index=False)
+    return cubo
+
+
+def carregar_cubo(arquivo=ARQUIVO_CUBO):
+    """Cubo indexado por (ID_MN_RESI, DT_SEMANA), pronto para fatiar."""
+    cubo = pd.read_parquet(arquivo, columns=COLUNAS_CUBO)
+    return cubo.set_index(['ID_MN_RESI', 'DT_SEMANA']).sort_index()
+
+
+def fatiar_cubo(cubo, municipio=CHAVE_REGIONAL):
+    """Série semanal (DT_SEMANA, casos) de um município ou do total regional."""
+    return cubo.loc[municipio].reset_index()
+
+
+def listar_municipios(cubo):
+    return [m for m in cubo.index.get_level_values('ID_MN_RESI').unique() if m != CHAVE_REGIONAL]
+
+
+if __name__ == "__main__":
+    print("🧊 Gerando cubo semanal (município x semana)...")
+    try:
+        cubo = gerar_cubo()
+    except FileNotFoundError as e:
+        print(f"❌ Erro: Base de notificações não encontrada ({e}). Rode coleta_de_dados.py antes.")
+    else:
+        print(f"✅ SUCESSO! Cubo gerado: {ARQUIVO_CUBO} ({len(cubo)} linhas)")
@@ -0,0 +1,88 @@
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from instrumentacao import ativa, contar, contar_lote
+
+# Colunas que as validações realmente usam do arquivo nacional
+COLUNAS_VALIDACAO = ['DT_NOTIFIC', 'ID_MN_RESI']
+
+
+def montar_filtro_municipios(codigos, coluna='ID_MN_RESI'):
+    """
+    Monta a expressão de filtro do PyArrow para uma lista de municípios.
+
+    A faixa (mínimo/máximo) deixa o leitor pular row groups inteiros só olhando
+    as estatísticas do Parquet; o isin faz o corte fino no kernel do Arrow.
+    Os códigos do SINAN têm sempre 6 caracteres, então a comparação exata equivale
+    ao antigo astype(str).str.strip() + isin.
+    """
+    codigos = sorted(set(codigos))
+    campo = ds.field(coluna)
+    return (campo >= codigos[0]) & (campo <= codigos[-1]) & campo.isin(pa.array(codigos, type=pa.string()))
+
+
+def escanear_regiao(caminho, codigos, colunas=COLUNAS_VALIDACAO, batch_size=50000):
+    """
+    Lê do Parquet nacional (arquivo, pasta ou lista de arquivos) só as colunas
+    pedidas e só as linhas da região. Nada do resto do Brasil vira objeto Python.
+
+    Retorna uma pyarrow.Table (use .to_pandas() no final, já pequena).
+    """
+    dataset = ds.dataset(caminho, format="parquet")
+    scanner = dataset.scanner(
+        columns=list(colunas),
+        filter=montar_filtro_municipios(codigos),
+        batch_size=batch_size,
+        use_threads=True
+    )
+    tabela = scanner.to_table()
+    contar(linhas=tabela.num_rows, bytes=tabela.nbytes)
+    return tabela
+
+
+def iterar_lotes_regiao(caminho, codigos, colunas=None, batch_size=50000):
+    """
+    Versão em streaming do escanear_regiao: devolve um RecordBatch filtrado por vez.
+    A memória fica limitada ao tamanho do lote, não ao tamanho do arquivo nacional.
+    colunas=None mantém todas as colunas do SINAN.
+    """
+    dataset = caminho if isinstance(caminho, ds.Dataset) else ds.dataset(caminho, format="parquet")
+    scanner = dataset.scanner(
+        columns=list(colunas) if colunas is not None else None,
+        filter=montar_filtro_municipios(codigos),
+        batch_size=batch_size,
+        use_threads=True
+    )
+    if ativa():
+        # Entrada do scan (rodapés do Parquet, sem ler dados) para a vazão linhas lidas/s
+        contar(linhas_lidas=dataset.count_rows(), bytes_lidos=sum(os.path.getsize(f) for f in dataset.files))
+    for batch in scanner.to_batches():
+        if batch.num_rows > 0:
+            contar_lote(batch)  # Vazão do scan na etapa aberta (instrumentacao)
+            yield batch
+
+
+def iterar_lotes_por_regiao(caminho, regioes, colunas=None, batch_size=50000, coluna='ID_MN_RESI'):
+    """
+    Uma passada só pelo Parquet nacional para várias regiões ({região: códigos}).
+    O scan filtra pela união dos códigos e cada lote é repartido por uma busca
+    vetorizada código -> região (index_in + take no Arrow), sem laço por linha.
+    Devolve pares (região, RecordBatch).
+    """
+    nomes = list(regioes)
+    codigos = [codigo for regiao in nomes for codigo in regioes[regiao]]
+    if len(set(codigos)) != len(codigos):
+        raise ValueError("Um município aparece em mais de uma região.")
+    valores = pa.array(codigos, type=pa.string())
+    regiao_do_codigo = pa.array([i for i, regiao in enumerate(nomes) for _ in regioes[regiao]], type=pa.int32())
+
+    for batch in iterar_lotes_regiao(caminho, codigos, colunas, batch_size):
+        if len(nomes) == 1:
+            yield nomes[0], batch
+            continue
+        destino = pc.take(regiao_do_codigo, pc.index_in(batch[coluna], value_set=valores))
+        for i in pc.unique(destino).to_pylist():
+            yield nomes[i], batch.filter(pc.equal(destino, i))
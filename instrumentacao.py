@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import uuid
+import cProfile
+import resource
+import argparse
+import functools
+import threading
+from contextlib import contextmanager
+
+from configuracao import caminho_dado
+
+# Log JSON-lines das etapas, desligado por padrão: DENGUE_METRICAS=1 grava em
+# ARQUIVO_METRICAS_PADRAO na pasta de dados (caminho_dado), DENGUE_METRICAS=<arquivo> em outro destino
+ARQUIVO_METRICAS_PADRAO = "metricas_pipeline.jsonl"
+
+
+def destino_metricas(valor):
+    """Valor de DENGUE_METRICAS -> arquivo do log ("" = desligado)."""
+    if valor in ("", "0"):
+        return ""
+    return caminho_dado(ARQUIVO_METRICAS_PADRAO) if valor == "1" else valor
+
+
+ARQUIVO_METRICAS = destino_metricas(os.environ.get("DENGUE_METRICAS", ""))
+# cProfile por etapa: DENGUE_PERFIL=merge_regional,treino_regional (ou *) grava um .prof em PASTA_PERFIS
+ETAPAS_PERFIL = {nome.strip() for nome in os.environ.get("DENGUE_PERFIL", "").split(",") if nome.strip()}
+PASTA_PERFIS = "perfis"
+
+# Intervalo entre amostras de RSS enquanto houver etapa aberta
+INTERVALO_AMOSTRA = 0.02
+
+_local = threading.local()
+_trava = threading.Lock()
+_ativas = set()
+_amostrador = {}
+_perfil_ativo = threading.Lock()
+
+
+def ativa():
+    return ARQUIVO_METRICAS not in ("", "0")
+
+
+def rss_atual_mb():
+    """RSS do processo agora (Linux: /proc/self/statm; fora dele, o pico do getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 1024)
+
+
+def _amostrar():
+    """Thread única do processo: atualiza o pico de RSS de todas as etapas abertas."""
+    evento = _amostrador['evento']
+    while True:
+        evento.wait()
+        while True:
+            with _trava:
+                spans = list(_ativas)
+                if not spans:
+                    evento.clear()
+            if not spans:
+                break
+            rss = rss_atual_mb()
+            for span in spans:
+                span.pico_mb = max(span.pico_mb, rss)
+            time.sleep(INTERVALO_AMOSTRA)
+
+
+def _iniciar_amostrador():
+    with _trava:
+        if _amostrador.get('pid') != os.getpid():  # processo novo (fork) precisa da sua thread
+            _amostrador['pid'] = os.getpid()
+            _amostrador['evento'] = threading.Event()
+            threading.Thread(target=_amostrar, daemon=True).start()
+
+
+class Span:
+    """Uma etapa em andamento: tempo, pico de RSS e contadores (linhas, bytes...)."""
+
+    def __init__(self, nome, atributos, pai, internas=True):
+        self.nome = nome
+        self.atributos = atributos
+        self.pai = pai
+        self.internas = internas
+        self.id = uuid.uuid4().hex[:12]
+        self.contadores = {}
+        self.rss_inicio_mb = self.pico_mb = rss_atual_mb()
+
+    def contar(self, **valores):
+        for chave, valor in valores.items():
+            self.contadores[chave] = self.contadores.get(chave, 0) + int(valor)
+
+
+class _SpanInativo:
+    def contar(self, **valores):
+        pass
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+
+def contar(**valores):
+    """Soma contadores (ex: linhas=, bytes=) na etapa aberta mais interna desta thread."""
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].contar(**valores)
+
+
+def anotar(**atributos):
+    """Acrescenta atributos (ex: reaproveitado=True) à etapa aberta mais interna desta thread."""
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].atributos.update(atributos)
+
+
+def contar_lote(batch):
+    """Atalho para laços de RecordBatch (iter_batches / scanner.to_batches)."""
+    contar(linhas=batch.num_rows, bytes=batch.nbytes)
+
+
+def registrar(linha, arquivo=None):
+    """Anexa uma linha JSON ao log (uma escrita só: seguro entre processos)."""
+    dados = (json.dumps(linha, ensure_ascii=False, default=str) + "\n").encode('utf-8')
+    descritor = os.open(arquivo or ARQUIVO_METRICAS, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(descritor, dados)
+    finally:
+        os.close(descritor)
+
+
+@contextmanager
+def etapa(nome, internas=True, **atributos):
+    """
+    Mede um bloco: duração, RSS inicial e de pico, contadores e vazão (contador/s).
+    Etapas aninhadas registram o id da etapa mãe. Com DENGUE_PERFIL contendo o
+    nome (ou *), o bloco roda sob cProfile e o .prof vai para PASTA_PERFIS.
+    internas=False: etapas abertas dentro deste bloco não geram linhas próprias
+    (os contadores delas somam neste), ex: uma linha por micro-lote de um serviço.
+    """
+    pilha = _pilha()
+    if not ativa() or (pilha and not pilha[-1].internas):
+        yield _SpanInativo()
+        return
+
+    _iniciar_amostrador()
+    span = Span(nome, atributos, pilha[-1].id if pilha else None, internas)
+    pilha.append(span)
+    with _trava:
+        _ativas.add(span)
+        _amostrador['evento'].set()
+
+    perfil = None
+    if (nome in ETAPAS_PERFIL or "*" in ETAPAS_PERFIL) and _perfil_ativo.acquire(blocking=False):
+        perfil = cProfile.Profile()  # Um perfil por vez (o cProfile não aninha)
+        perfil.enable()
+
+    erro = None
+    quando = time.strftime('%Y-%m-%dT%H:%M:%S')
+    inicio = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        arquivo_perfil = None
+        if perfil is not None:
+            perfil.disable()
+            _perfil_ativo.release()
+            os.makedirs(PASTA_PERFIS, exist_ok=True)
+            arquivo_perfil = os.path.join(PASTA_PERFIS, f"{nome}_{os.getpid()}_{span.id}.prof")
+            perfil.dump_stats(arquivo_perfil)
+        with _trava:
+            _ativas.discard(span)
+        pilha.pop()
+
+        linha = {
+            'etapa': nome,
+            'id': span.id,
+            'pai': span.pai,
+            'pid': os.getpid(),
+            'inicio': quando,
+            'segundos': round(duracao, 6),
+            'rss_inicio_mb': round(span.rss_inicio_mb, 1),
+            'rss_pico_mb': round(max(span.pico_mb, rss_atual_mb()), 1),
+            **span.contadores
+        }
+        for chave, valor in span.contadores.items():
+            if duracao > 0:
+                linha[f'{chave}_por_s'] = round(valor / duracao, 1)
+        if atributos:
+            linha['atributos'] = atributos
+        if erro:
+            linha['erro'] = erro
+        if arquivo_perfil:
+            linha['perfil'] = arquivo_perfil
+        try:
+            registrar(linha)
+        except OSError:
+            pass  # Métrica nunca derruba a etapa
+
+
+def medir(nome=None, **atributos):
+    """Decorador: a chamada inteira da função vira uma etapa (nome padrão = nome da função)."""
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with etapa(nome or funcao.__name__, **atributos):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorar
+
+
+def ler_metricas(arquivo=None):
+    arquivo = arquivo or ARQUIVO_METRICAS or caminho_dado(ARQUIVO_METRICAS_PADRAO)
+    import pandas as pd
+    with open(arquivo, encoding='utf-8') as f:
+        return pd.DataFrame([json.loads(linha) for linha in f if linha.strip()])
+
+
+def resumir_metricas(df):
+    """Por etapa: execuções, tempo total/mediano/máximo, maior pico de RSS e vazão mediana."""
+    agregacoes = {
+        'execucoes': ('segundos', 'size'),
+        'segundos_total': ('segundos', 'sum'),
+        'segundos_mediana': ('segundos', 'median'),
+        'segundos_max': ('segundos', 'max'),
+        'rss_pico_mb': ('rss_pico_mb', 'max')
+    }
+    for coluna in ('linhas_lidas_por_s', 'linhas_por_s', 'bytes_por_s'):
+        if coluna in df:
+            agregacoes[coluna] = (coluna, 'median')
+    return df.groupby('etapa').agg(**agregacoes).sort_values('segundos_total', ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumo do log de métricas das etapas.")
+    parser.add_argument("arquivo", nargs="?", default=ARQUIVO_METRICAS or caminho_dado(ARQUIVO_METRICAS_PADRAO))
+    args = parser.parse_args()
+
+    try:
+        resumo = resumir_metricas(ler_metricas(args.arquivo))
+    except FileNotFoundError:
+        print(f"❌ Log não encontrado: {args.arquivo}. Rode alguma etapa do pipeline com DENGUE_METRICAS=1 antes.")
+    else:
+        print(f"📊 Etapas em {args.arquivo} (ordenadas pelo tempo total):")
+        print(resumo.round(2).to_string())
@@ -0,0 +1,234 @@
+import os
+import json
+import hashlib
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from filtro_regional import iterar_lotes_regiao
+from instrumentacao import anotar, contar, medir
+
+# Partes regionais por fragmento + manifesto (coleta, scripts de 2024 e painel)
+PASTA_FRAGMENTOS_REGIONAIS = "regional_fragmentos"
+
+# 2: partes com caminho absoluto (manifestos antigos são refeitos)
+VERSAO_MANIFESTO = 2
+
+# Consolidado das partes em Arrow IPC (Feather v2) sem compressão: reaberto por
+# memory map, as colunas apontam direto para o arquivo (zero cópia)
+NOME_CONSOLIDADO = "consolidado.arrow"
+
+
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """SHA-256 do conteúdo, lido em blocos de 1 MB."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def carregar_manifesto(arquivo_manifesto):
+    if not os.path.exists(arquivo_manifesto):
+        return {'versao': VERSAO_MANIFESTO, 'regiao': [], 'fragmentos': {}}
+    with open(arquivo_manifesto, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_manifesto(manifesto, arquivo_manifesto):
+    """Grava num .tmp e troca, para o manifesto nunca ficar corrompido."""
+    arquivo_tmp = arquivo_manifesto + ".tmp"
+    with open(arquivo_tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(arquivo_tmp, arquivo_manifesto)
+
+
+def fragmento_inalterado(caminho, registro):
+    """
+    Compara o fragmento com o que o manifesto conhece.
+    Tamanho + mtime iguais: confia sem ler o arquivo. Se só o mtime mudou
+    (ex: DATASUS republicou o mesmo conteúdo), o hash decide.
+    """
+    if registro is None or not os.path.exists(registro.get('saida', '')):
+        return False
+    info = os.stat(caminho)
+    if info.st_size != registro['tamanho']:
+        return False
+    if info.st_mtime_ns == registro['mtime_ns']:
+        return True
+    if hash_arquivo(caminho) == registro['sha256']:
+        registro['mtime_ns'] = info.st_mtime_ns
+        return True
+    return False
+
+
+@medir("filtrar_fragmento")
+def filtrar_fragmento_para_parte(caminho, codigos, arquivo_parte, batch_size=50000):
+    """Filtra um fragmento nacional e grava a parte regional (mesmo vazia). Retorna as linhas."""
+    os.makedirs(os.path.dirname(arquivo_parte), exist_ok=True)
+    linhas = 0
+    with pq.ParquetWriter(arquivo_parte + ".tmp", pq.read_schema(caminho)) as writer:
+        for batch in iterar_lotes_regiao(caminho, codigos, batch_size=batch_size):
+            writer.write_batch(batch)
+            linhas += batch.num_rows
+    os.replace(arquivo_parte + ".tmp", arquivo_parte)
+    return linhas
+
+
+def nome_parte(pasta_saida, ano, chave):
+    """
+    Caminho da parte regional de um fragmento. O sufixo com hash do caminho de
+    origem evita colisão entre fontes com o mesmo nome (cache do PySUS x downloads_2024).
+    """
+    base = os.path.splitext(os.path.basename(chave))[0]
+    sufixo = hashlib.sha1(chave.encode('utf-8')).hexdigest()[:8]
+    return os.path.abspath(os.path.join(pasta_saida, str(ano), f"{base}_{sufixo}.parquet"))
+
+
+def atualizar_regiao_incremental(fontes, codigos, pasta_saida, arquivo_manifesto=None,
+                                 batch_size=50000, ignorar_erros=False):
+    """
+    Mantém em pasta_saida uma parte regional por fragmento nacional e só refiltra
+    os fragmentos novos ou alterados desde a última execução.
+
+    - fontes: lista de (ano, caminho_do_fragmento), na ordem desejada da saída.
+    - Retorna a lista (ano, caminho_da_parte) na mesma ordem das fontes.
+
+    O manifesto (JSON) guarda tamanho, mtime, SHA-256 e a parte gerada (caminho
+    absoluto) de cada fragmento. Se a lista de municípios mudar, tudo é refiltrado.
+    Vários chamadores podem dividir a pasta: a limpeza de partes órfãs só olha as
+    pastas de origem desta chamada, então fontes de outro script ficam intactas.
+    ignorar_erros=True pula (com aviso) fragmentos ilegíveis em vez de abortar; a parte
+    de uma versão anterior do fragmento é removida, para não entrar desatualizada.
+    """
+    arquivo_manifesto = arquivo_manifesto or os.path.join(pasta_saida, "manifesto.json")
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    manifesto = carregar_manifesto(arquivo_manifesto)
+    regiao = sorted(set(codigos))
+    if manifesto.get('versao') != VERSAO_MANIFESTO or manifesto.get('regiao') != regiao:
+        manifesto = {'versao': VERSAO_MANIFESTO, 'regiao': regiao, 'fragmentos': {}}
+
+    fragmentos = manifesto['fragmentos']
+    partes = []
+    refiltrados = 0
+
+    try:
+        for ano, caminho in fontes:
+            chave = os.path.abspath(caminho)
+            registro = fragmentos.get(chave)
+
+            if registro is not None and registro['ano'] == ano and fragmento_inalterado(caminho, registro):
+                partes.append((ano, registro['saida']))
+                continue
+
+            arquivo_parte = nome_parte(pasta_saida, ano, chave)
+            try:
+                linhas = filtrar_fragmento_para_parte(caminho, codigos, arquivo_parte, batch_size=batch_size)
+            except Exception as e:
+                if not ignorar_erros:
+                    raise
+                # A parte antiga é de uma versão do fragmento que não existe mais: sai junto
+                print(f"   ⚠️ Erro ao ler {caminho}: {e}")
+                antiga = fragmentos.pop(chave, None)
+                for arquivo in {arquivo_parte, antiga['saida'] if antiga else arquivo_parte}:
+                    if os.path.exists(arquivo):
+                        os.remove(arquivo)
+                continue
+            info = os.stat(caminho)
+            fragmentos[chave] = {
+                'ano': ano,
+                'tamanho': info.st_size,
+                'mtime_ns': info.st_mtime_ns,
+                'sha256': hash_arquivo(caminho),
+                'saida': arquivo_parte,
+                'linhas': linhas
+            }
+            partes.append((ano, arquivo_parte))
+            refiltrados += 1
+
+        # Fragmentos que sumiram da fonte (para os anos e pastas de origem processados)
+        # saem da base regional
+        anos = {ano for ano, _ in fontes}
+        atuais = {os.path.abspath(caminho) for _, caminho in fontes}
+        raizes = {os.path.dirname(chave) for chave in atuais}
+        orfaos = [
+            c for c, r in fragmentos.items()
+            if r['ano'] in anos and os.path.dirname(c) in raizes and c not in atuais
+        ]
+        for chave in orfaos:
+            registro = fragmentos.pop(chave)
+            if os.path.exists(registro['saida']):
+                os.remove(registro['saida'])
+    finally:
+        # Salva mesmo em caso de erro: o que já foi filtrado não é refeito
+        salvar_manifesto(manifesto, arquivo_manifesto)
+
+    contar(fragmentos=len(fontes), refiltrados=refiltrados)
+    print(f"   🧾 Manifesto: {refiltrados} de {len(fontes)} fragmento(s) refiltrado(s).")
+    return partes
+
+
+def ler_partes(partes, colunas=None):
+    """Junta as partes regionais numa pyarrow.Table (só as colunas pedidas)."""
+    tabelas = [pq.read_table(parte, columns=colunas) for _, parte in partes]
+    if not tabelas:
+        return None
+    return pa.concat_tables(tabelas, promote_options="permissive")
+
+
+def impressao_partes(partes, arquivo_manifesto, colunas=None):
+    """
+    Identidade do conjunto de partes: região, colunas e, por parte, o SHA-256 do
+    fragmento de origem registrado no manifesto. Muda quando qualquer fragmento muda.
+    """
+    manifesto = carregar_manifesto(arquivo_manifesto)
+    origem = {r['saida']: r['sha256'] for r in manifesto['fragmentos'].values()}
+    conteudo = {
+        'versao': manifesto.get('versao'),
+        'regiao': manifesto.get('regiao'),
+        'colunas': list(colunas) if colunas is not None else None,
+        'partes': [(ano, parte, origem.get(parte)) for ano, parte in partes]
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+@medir("consolidado_regional")
+def ler_partes_consolidadas(partes, pasta_saida, colunas=None, arquivo_manifesto=None):
+    """
+    ler_partes com cache: as partes viram um único arquivo Arrow IPC em pasta_saida,
+    marcado com a impressao_partes. Enquanto o manifesto não mudar, a tabela é
+    reaberta por memory map, sem reler as centenas de partes Parquet.
+    O nome do arquivo vem do conjunto de partes + colunas: chamadores com fontes
+    diferentes na mesma pasta têm cada um o seu consolidado.
+    """
+    if not partes:
+        return None
+    arquivo_manifesto = arquivo_manifesto or os.path.join(pasta_saida, "manifesto.json")
+    impressao = impressao_partes(partes, arquivo_manifesto, colunas).encode('ascii')
+    conjunto = json.dumps({'partes': sorted(parte for _, parte in partes), 'colunas': colunas})
+    sufixo = hashlib.sha1(conjunto.encode('utf-8')).hexdigest()[:12]
+    arquivo_cache = os.path.join(pasta_saida, f"{sufixo}_{NOME_CONSOLIDADO}")
+
+    if os.path.exists(arquivo_cache):
+        try:
+            leitor = pa.ipc.open_file(pa.memory_map(arquivo_cache))
+            if (leitor.schema.metadata or {}).get(b'impressao') == impressao:
+                tabela = leitor.read_all()
+                contar(linhas=tabela.num_rows)
+                anotar(reaproveitado=True)
+                return tabela
+        except (OSError, pa.ArrowInvalid):
+            pass  # Cache corrompido ou de outra versão: refaz
+
+    tabela = ler_partes(partes, colunas=colunas)
+    if tabela is None:
+        return None
+    tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), b'impressao': impressao})
+    with pa.OSFile(arquivo_cache + ".tmp", 'wb') as destino:
+        with pa.ipc.new_file(destino, tabela.schema) as writer:
+            writer.write_table(tabela)
+    os.replace(arquivo_cache + ".tmp", arquivo_cache)
+    contar(linhas=tabela.num_rows)
+    anotar(reaproveitado=False)
+    return pa.ipc.open_file(pa.memory_map(arquivo_cache)).read_all()
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Prefixo usado no nome da feature -> coluna semanal de origem
+ORIGENS = {'casos': 'casos', 'chuva': 'chuva_mm', 'temp': 'temp_media', 'umid': 'umidade'}
+
+# Defasagens do modelo V2 (mesmo layout no treino, na previsão e nos cenários)
+LAGS_CASOS = [1, 2, 4, 8]
+LAGS_CLIMA = [2, 3, 4, 8]
+VARIAVEIS_LAG_CLIMA = {p: c for p, c in ORIGENS.items() if p != 'casos'}
+
+# Agregações das janelas móveis (sempre sobre as semanas anteriores, sem a atual)
+AGREGACOES = {
+    'media': np.mean,
+    'soma': np.sum,
+    'min': np.min,
+    'max': np.max,
+    'desvio': lambda valores, axis: np.std(valores, axis=axis, ddof=1)
+}
+
+# Spec declarativa: cada bloco vira colunas na ordem (lag/janela, prefixo[, agregação])
+# - lags: (prefixos, defasagens) -> lag_<prefixo>_w<lag>
+# - janelas: (prefixos, tamanhos, agregações) -> <agregação>_<prefixo>_<tamanho>w
+#   ex: (['casos'], [4, 8], ['media']) = media_movel_4w/8w do notebook
+SPEC_V2 = {
+    'sazonalidade': True,
+    'lags': [
+        (['casos'], LAGS_CASOS),
+        # O mosquito demora ~2 a 4 semanas para nascer após a chuva.
+        (list(VARIAVEIS_LAG_CLIMA), LAGS_CLIMA)
+    ],
+    'janelas': []
+}
+
+
+def nomes_features(spec=SPEC_V2):
+    """Nomes das colunas geradas pela spec, na ordem da matriz."""
+    nomes = []
+    if spec.get('sazonalidade'):
+        nomes += ['semana_do_ano', 'semana_sin', 'semana_cos']
+    for prefixos, lags in spec.get('lags', []):
+        nomes += [f'lag_{p}_w{lag}' for lag in lags for p in prefixos]
+    for prefixos, tamanhos, agregacoes in spec.get('janelas', []):
+        nomes += [f'{a}_{p}_{t}w' for t in tamanhos for p in prefixos for a in agregacoes]
+    return nomes
+
+
+def posicao_no_grupo(df, grupo=None):
+    """Índice de cada linha dentro do seu grupo (grupos contíguos, já ordenados por data)."""
+    n = len(df)
+    if grupo is None:
+        return np.arange(n)
+    codigos = pd.factorize(df[grupo])[0]
+    inicios = np.r_[0, np.flatnonzero(codigos[1:] != codigos[:-1]) + 1]
+    return np.arange(n) - np.repeat(inicios, np.diff(np.r_[inicios, n]))
+
+
+def calcular_matriz(df, spec=SPEC_V2, grupo=None):
+    """
+    Calcula todas as features da spec numa matriz float32 (linhas, features).
+
+    df precisa estar ordenado por (grupo, DT_SEMANA). Cada série de origem vira
+    um array contíguo uma única vez; lags são fatias deslocadas e janelas usam
+    uma visão deslizante (sem cópia). Linhas cujo lag/janela cairia antes do
+    início do grupo (ex: outro município) ficam NaN, como no shift() do pandas.
+    """
+    nomes = nomes_features(spec)
+    n = len(df)
+    matriz = np.full((n, len(nomes)), np.nan, dtype=np.float32)
+    posicao = posicao_no_grupo(df, grupo)
+
+    prefixos = {p for bloco in spec.get('lags', []) + spec.get('janelas', []) for p in bloco[0]}
+    series = {p: df[ORIGENS[p]].to_numpy(dtype=np.float64) for p in prefixos}
+
+    coluna = 0
+    if spec.get('sazonalidade'):
+        semana = df['DT_SEMANA'].dt.isocalendar().week.to_numpy().astype(np.float64)
+        matriz[:, 0] = semana
+        matriz[:, 1] = np.sin(2 * np.pi * semana / 53)
+        matriz[:, 2] = np.cos(2 * np.pi * semana / 53)
+        coluna = 3
+
+    for prefixos_bloco, lags in spec.get('lags', []):
+        for lag in lags:
+            for p in prefixos_bloco:
+                if lag < n:
+                    matriz[lag:, coluna] = series[p][:-lag]
+                matriz[posicao < lag, coluna] = np.nan
+                coluna += 1
+
+    for prefixos_bloco, tamanhos, agregacoes in spec.get('janelas', []):
+        for tamanho in tamanhos:
+            for p in prefixos_bloco:
+                # janela[k] = série[k : k + tamanho] -> vale para a semana k + tamanho
+                janela = sliding_window_view(series[p], tamanho)[:-1] if tamanho < n else None
+                for a in agregacoes:
+                    if janela is not None:
+                        matriz[tamanho:, coluna] = AGREGACOES[a](janela, axis=1)
+                    matriz[posicao < tamanho, coluna] = np.nan
+                    coluna += 1
+
+    return matriz, nomes
+
+
+def aplicar_spec(df, spec=SPEC_V2, grupo=None):
+    """Cópia do df com as features da spec acrescentadas (float32)."""
+    matriz, nomes = calcular_matriz(df, spec, grupo)
+    base = df.drop(columns=[c for c in nomes if c in df.columns])
+    return pd.concat([base, pd.DataFrame(matriz, columns=nomes, index=df.index)], axis=1)
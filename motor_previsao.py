@@ -0,0 +1,103 @@
+import re
+
+import numpy as np
+
+from instrumentacao import contar, medir
+from motor_features import AGREGACOES
+
+# lag_casos_w1, lag_casos_w2... -> defasagem (em semanas) de cada coluna autoregressiva
+PADRAO_LAG_CASOS = re.compile(r'^lag_casos_w(\d+)$')
+# media_casos_4w, max_casos_8w... -> janelas móveis de casos (motor_features)
+PADRAO_JANELA_CASOS = re.compile(r'^(%s)_casos_(\d+)w$' % '|'.join(AGREGACOES))
+
+
+def indices_lags_casos(features):
+    """[(posição da coluna na matriz, defasagem)] para as colunas lag_casos_w*."""
+    pares = []
+    for posicao, nome in enumerate(features):
+        casamento = PADRAO_LAG_CASOS.match(nome)
+        if casamento:
+            pares.append((posicao, int(casamento.group(1))))
+    return pares
+
+
+def indices_janelas_casos(features):
+    """[(posição da coluna, agregação, tamanho)] para as janelas móveis de casos."""
+    trios = []
+    for posicao, nome in enumerate(features):
+        casamento = PADRAO_JANELA_CASOS.match(nome)
+        if casamento:
+            trios.append((posicao, AGREGACOES[casamento.group(1)], int(casamento.group(2))))
+    return trios
+
+
+@medir("previsao_recursiva")
+def prever_recursivo(model, df_futuro, features, historico_casos):
+    """
+    Previsão walk-forward: a previsão de cada semana alimenta os lags de casos
+    das semanas seguintes.
+
+    Em vez de montar um DataFrame por semana, trabalha num buffer NumPy float32
+    pré-alocado (clima e calendário já vêm de df_futuro), atualiza só as colunas
+    lag_casos_w* (e janelas de casos, se houver) no lugar e chama inplace_predict
+    do booster direto no array.
+
+    Retorna um np.ndarray com uma previsão (>= 0) por linha de df_futuro.
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    X = np.ascontiguousarray(df_futuro[features].to_numpy(dtype=np.float32))
+    lags = indices_lags_casos(features)
+    janelas = indices_janelas_casos(features)
+
+    # Histórico + espaço para as previsões, num único vetor
+    n_hist = len(historico_casos)
+    n_semanas = X.shape[0]
+    serie = np.empty(n_hist + n_semanas, dtype=np.float32)
+    serie[:n_hist] = historico_casos
+    contar(linhas=n_semanas)
+
+    for i in range(n_semanas):
+        t = n_hist + i
+        linha = X[i:i + 1]
+        for coluna, lag in lags:
+            linha[0, coluna] = serie[t - lag]
+        for coluna, agregar, tamanho in janelas:
+            linha[0, coluna] = agregar(serie[t - tamanho:t], axis=0)
+        serie[t] = max(0.0, float(booster.inplace_predict(linha)[0]))  # Sem casos negativos
+
+    return serie[n_hist:]
+
+
+@medir("previsao_recursiva", lote=True)
+def prever_recursivo_lote(model, X, features, historico_casos):
+    """
+    Mesma recursão do prever_recursivo, mas para vários cenários ao mesmo tempo.
+
+    - X: tensor float32 (semanas, cenários, features); X[t] é contíguo e vira uma
+      única chamada inplace_predict por semana para o ensemble inteiro.
+    - historico_casos: casos observados antes da primeira semana, comum a todos
+      (semanas,) ou um por cenário (cenários, semanas), ex: municípios diferentes
+      no mesmo lote.
+
+    Retorna np.ndarray (cenários, semanas).
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    lags = indices_lags_casos(features)
+    janelas = indices_janelas_casos(features)
+
+    n_semanas, n_cenarios, _ = X.shape
+    n_hist = np.shape(historico_casos)[-1]
+    serie = np.empty((n_cenarios, n_hist + n_semanas), dtype=np.float32)
+    serie[:, :n_hist] = np.asarray(historico_casos, dtype=np.float32)
+    contar(linhas=n_semanas * n_cenarios)
+
+    for i in range(n_semanas):
+        t = n_hist + i
+        for coluna, lag in lags:
+            X[i, :, coluna] = serie[:, t - lag]
+        for coluna, agregar, tamanho in janelas:
+            X[i, :, coluna] = agregar(serie[:, t - tamanho:t], axis=1)
+        serie[:, t] = np.maximum(booster.inplace_predict(X[i]), 0.0)  # Sem casos negativos
+
+    return serie[:, n_hist:]
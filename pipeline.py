@@ -0,0 +1,331 @@
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from configuracao import RAIZ, caminho_dado
+from manifesto_fragmentos import hash_arquivo
+
+# Estado entre execuções (impressão digital de cada etapa + cache de hashes) e relatório
+ARQUIVO_ESTADO = "pipeline_estado.json"
+ARQUIVO_RELATORIO = "pipeline_relatorio.json"
+PASTA_LOGS = "pipeline_logs"
+
+# Cada etapa é um script do projeto rodado como está (processo próprio, pasta atual).
+# - entradas/saidas: arquivos ou pastas trocados entre etapas (definem o DAG)
+# - externa: lê fontes de fora (DATASUS, Open-Meteo); roda sempre, a menos de --offline.
+#   Os scripts de coleta já são incrementais, e se o que gravam não mudar as etapas
+#   seguintes continuam puladas.
+# - fontes: entradas que nenhuma etapa produz (artefatos publicados ou de scripts
+#   rodados à mão, achados via caminho_dado). Toda outra entrada precisa de produtor.
+ETAPAS = [
+    {
+        'nome': 'sinan',
+        'script': 'coleta_de_dados.py',
+        'argumentos': ['--incremental'],
+        'externa': True,
+        'entradas': [],
+        'saidas': ['dataset_dengue_II_GERES.parquet', 'notificacoes_II_GERES', 'cubo_semanal_II_GERES.parquet']
+    },
+    {
+        'nome': 'clima',
+        'script': 'coleta_clima_por_municipio.py',
+        'externa': True,
+        'entradas': [],
+        'saidas': ['dados_climaticos_regional_detalhado.parquet']
+    },
+    {
+        'nome': 'merge',
+        'script': 'processamento_final_merge.py',
+        'entradas': ['notificacoes_II_GERES', 'dados_climaticos_regional_detalhado.parquet'],
+        'saidas': ['dataset_ml_completo_com_clima.parquet', 'dataset_ml_municipal.parquet']
+    },
+    {
+        'nome': 'treino',
+        'script': 'treinamento_com_dengue_e_clima.py',
+        # config_xgb_v2.json: ajuste_hiperparametros.py, rodado à mão (opcional)
+        'entradas': ['dataset_ml_completo_com_clima.parquet', 'config_xgb_v2.json'],
+        'fontes': ['config_xgb_v2.json'],
+        'saidas': ['previsao_2024_com_clima.parquet', 'feature_importance_clima.png']
+    },
+    {
+        'nome': 'treino_municipal',
+        'script': 'treinamento_municipal.py',
+        'entradas': ['dataset_ml_municipal.parquet'],
+        'saidas': ['previsao_2024_municipios.parquet']
+    },
+    {
+        'nome': 'cenarios',
+        'script': 'cenarios_clima.py',
+        'entradas': ['dataset_ml_completo_com_clima.parquet', 'config_xgb_v2.json'],
+        'fontes': ['config_xgb_v2.json'],
+        'saidas': ['previsao_2024_cenarios.parquet']
+    },
+    {
+        'nome': 'comparativo',
+        'script': 'comparativo_final_clima.py',
+        # previsao_2024_estimada.parquet: modelo V1 (só histórico), publicado em datasets/;
+        # downloads_2024: arquivos DENGBR24 baixados à mão
+        'entradas': ['previsao_2024_estimada.parquet', 'previsao_2024_com_clima.parquet', 'downloads_2024'],
+        'fontes': ['previsao_2024_estimada.parquet', 'downloads_2024'],
+        'saidas': ['confronto_final_modelos.png', 'cubo_semanal_2024_II_GERES.parquet']
+    }
+]
+
+
+def validar_etapas(etapas):
+    """Cada saída com um só produtor; cada entrada com produtor ou declarada em 'fontes'."""
+    produtor = {}
+    for e in etapas:
+        for saida in e['saidas']:
+            if saida in produtor:
+                raise ValueError(f"{saida} produzida por {produtor[saida]} e {e['nome']}")
+            produtor[saida] = e['nome']
+    for e in etapas:
+        orfas = [x for x in e['entradas'] if x not in produtor and x not in e.get('fontes', [])]
+        if orfas:
+            raise ValueError(f"Etapa {e['nome']}: entradas sem produtor nem fonte declarada: {', '.join(orfas)}")
+
+
+def dependencias(etapas):
+    """{etapa: etapas que produzem alguma das suas entradas}."""
+    produtor = {saida: e['nome'] for e in etapas for saida in e['saidas']}
+    return {
+        e['nome']: sorted({produtor[x] for x in e['entradas'] if x in produtor and produtor[x] != e['nome']})
+        for e in etapas
+    }
+
+
+def selecionar(etapas, alvos):
+    """Etapas pedidas + tudo de que elas dependem (na ordem declarada)."""
+    if not alvos:
+        return etapas
+    deps = dependencias(etapas)
+    escolhidas, pendentes = set(), list(alvos)
+    while pendentes:
+        nome = pendentes.pop()
+        if nome not in deps:
+            raise ValueError(f"Etapa desconhecida: {nome}")
+        if nome not in escolhidas:
+            escolhidas.add(nome)
+            pendentes.extend(deps[nome])
+    return [e for e in etapas if e['nome'] in escolhidas]
+
+
+def modulos_locais(script, raiz=RAIZ):
+    """O script e todos os módulos do projeto que ele importa (direta ou indiretamente)."""
+    vistos, pendentes = set(), [script]
+    while pendentes:
+        arquivo = pendentes.pop()
+        if arquivo in vistos:
+            continue
+        vistos.add(arquivo)
+        with open(os.path.join(raiz, arquivo), encoding='utf-8') as f:
+            arvore = ast.parse(f.read())
+        for no in ast.walk(arvore):
+            if isinstance(no, ast.Import):
+                nomes = [a.name for a in no.names]
+            elif isinstance(no, ast.ImportFrom) and no.level == 0 and no.module:
+                nomes = [no.module]
+            else:
+                continue
+            for nome in nomes:
+                candidato = nome.split('.')[0] + ".py"
+                if os.path.exists(os.path.join(raiz, candidato)):
+                    pendentes.append(candidato)
+    return sorted(vistos)
+
+
+class Hashes:
+    """
+    SHA-256 de arquivos e pastas com o mesmo atalho do manifesto de fragmentos:
+    tamanho + mtime iguais ao já visto = hash reaproveitado, sem reler o arquivo.
+    """
+
+    def __init__(self, conhecidos=None):
+        self.conhecidos = conhecidos or {}
+
+    def arquivo(self, caminho):
+        info = os.stat(caminho)
+        chave = os.path.abspath(caminho)
+        registro = self.conhecidos.get(chave)
+        if registro and registro[0] == info.st_size and registro[1] == info.st_mtime_ns:
+            return registro[2]
+        digest = hash_arquivo(caminho)
+        self.conhecidos[chave] = [info.st_size, info.st_mtime_ns, digest]
+        return digest
+
+    def caminho(self, caminho):
+        """Hash de um arquivo, de uma pasta (nomes relativos + conteúdo) ou 'ausente'."""
+        if os.path.isfile(caminho):
+            return self.arquivo(caminho)
+        if not os.path.isdir(caminho):
+            return "ausente"
+        h = hashlib.sha256()
+        for pasta, subpastas, arquivos in os.walk(caminho):
+            subpastas.sort()
+            for nome in sorted(arquivos):
+                completo = os.path.join(pasta, nome)
+                h.update(os.path.relpath(completo, caminho).encode('utf-8'))
+                h.update(self.arquivo(completo).encode('ascii'))
+        return h.hexdigest()
+
+
+def impressao_digital(etapa, hashes, raiz=RAIZ):
+    """Hash do código (script + módulos locais), dos argumentos e de cada entrada."""
+    partes = {
+        'argumentos': etapa.get('argumentos', []),
+        'codigo': {m: hashes.arquivo(os.path.join(raiz, m)) for m in modulos_locais(etapa['script'], raiz)},
+        'entradas': {x: hashes.caminho(caminho_dado(x) if x in etapa.get('fontes', []) else x)
+                     for x in etapa['entradas']}
+    }
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def carregar_estado(arquivo=ARQUIVO_ESTADO):
+    if not os.path.exists(arquivo):
+        return {'etapas': {}, 'hashes': {}}
+    with open(arquivo, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_estado(estado, arquivo=ARQUIVO_ESTADO):
+    with open(arquivo + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2, ensure_ascii=False)
+    os.replace(arquivo + ".tmp", arquivo)
+
+
+def executar_script(etapa, pasta_logs=PASTA_LOGS, raiz=RAIZ):
+    """Roda o script da etapa num processo novo; a saída vai para o log da etapa."""
+    os.makedirs(pasta_logs, exist_ok=True)
+    arquivo_log = os.path.join(pasta_logs, f"{etapa['nome']}.log")
+    with open(arquivo_log, 'w', encoding='utf-8') as log:
+        processo = subprocess.run(
+            [sys.executable, os.path.join(raiz, etapa['script'])] + etapa.get('argumentos', []),
+            stdout=log, stderr=subprocess.STDOUT, env={**os.environ, 'PYTHONUNBUFFERED': '1'}
+        )
+    return processo.returncode, arquivo_log
+
+
+def rodar_pipeline(etapas=ETAPAS, alvos=None, forcar=(), offline=False, max_workers=2,
+                   arquivo_estado=ARQUIVO_ESTADO, executar=executar_script):
+    """
+    Executa o DAG: cada etapa começa assim que as etapas das quais depende
+    terminam, com até max_workers etapas independentes ao mesmo tempo (ex: SINAN
+    e clima). Uma etapa é pulada quando o hash do seu código + entradas é o mesmo
+    da última execução bem-sucedida e todas as saídas existem.
+
+    Retorna o relatório: uma linha por etapa (status, motivo, duração).
+    """
+    validar_etapas(etapas)
+    etapas = selecionar(etapas, alvos)
+    deps = dependencias(etapas)
+    estado = carregar_estado(arquivo_estado)
+    hashes = Hashes(estado.get('hashes'))
+    relatorio = {}
+    inicio_total = time.perf_counter()
+
+    def decidir(etapa):
+        """(roda?, motivo, impressão digital). Chamado só depois das dependências terminarem."""
+        digital = impressao_digital(etapa, hashes)
+        saidas_ok = all(os.path.exists(s) for s in etapa['saidas'])
+        if etapa['nome'] in forcar:
+            return True, "forçada", digital
+        if etapa.get('externa'):
+            if offline and saidas_ok:
+                return False, "offline", digital
+            return True, "fonte externa", digital
+        if not saidas_ok:
+            return True, "saída ausente", digital
+        if estado['etapas'].get(etapa['nome'], {}).get('digital') != digital:
+            return True, "entradas/código mudaram", digital
+        return False, "inalterada", digital
+
+    pendentes = {e['nome']: e for e in etapas}
+    em_execucao = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pendentes or em_execucao:
+            for nome in list(pendentes):
+                # Pronta quando todas as dependências já têm resultado (executada/pulada/falhou)
+                if not all(d in relatorio for d in deps[nome]):
+                    continue
+                etapa = pendentes.pop(nome)
+                falhas = [d for d in deps[nome] if relatorio[d]['status'] in ("falhou", "bloqueada")]
+                if falhas:
+                    relatorio[nome] = {'etapa': nome, 'status': "bloqueada", 'motivo': f"depende de {', '.join(falhas)}", 'duracao_s': 0.0}
+                    continue
+                roda, motivo, digital = decidir(etapa)
+                if not roda:
+                    relatorio[nome] = {'etapa': nome, 'status': "pulada", 'motivo': motivo, 'duracao_s': 0.0}
+                    print(f"   ⏭️ {nome}: pulada ({motivo})")
+                    continue
+                print(f"   ▶️ {nome}: executando ({motivo})...")
+                futuro = executor.submit(executar, etapa)
+                em_execucao[futuro] = (nome, motivo, digital, time.perf_counter())
+
+            if not em_execucao:
+                continue
+            prontos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                nome, motivo, digital, inicio = em_execucao.pop(futuro)
+                duracao = time.perf_counter() - inicio
+                try:
+                    codigo, arquivo_log = futuro.result()
+                except Exception as e:
+                    codigo, arquivo_log = str(e), None
+                linha = {'etapa': nome, 'motivo': motivo, 'duracao_s': round(duracao, 3), 'log': arquivo_log}
+                if codigo == 0:
+                    linha['status'] = "executada"
+                    # Só grava a impressão digital depois do sucesso
+                    estado['etapas'][nome] = {'digital': digital, 'concluida_em': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                    print(f"   ✅ {nome}: {duracao:.1f}s")
+                else:
+                    linha['status'] = "falhou"
+                    estado['etapas'].pop(nome, None)
+                    print(f"   ❌ {nome}: falhou ({codigo}) após {duracao:.1f}s. Veja {arquivo_log}")
+                relatorio[nome] = linha
+
+    estado['hashes'] = hashes.conhecidos
+    salvar_estado(estado, arquivo_estado)
+    return {
+        'etapas': [relatorio[e['nome']] for e in etapas],
+        'duracao_total_s': round(time.perf_counter() - inicio_total, 3)
+    }
+
+
+def imprimir_relatorio(relatorio):
+    print("\n📋 Relatório do pipeline:")
+    for linha in relatorio['etapas']:
+        print(f"   {linha['etapa']:<16} {linha['status']:<10} {linha['duracao_s']:>8.1f}s  {linha['motivo']}")
+    soma = sum(linha['duracao_s'] for linha in relatorio['etapas'])
+    print(f"   {'total':<16} {'':<10} {relatorio['duracao_total_s']:>8.1f}s  (soma das etapas: {soma:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roda o pipeline (coleta -> merge -> treino -> comparativo) pulando o que não mudou.")
+    parser.add_argument("alvos", nargs="*", help="Etapas finais desejadas (padrão: todas). Dependências entram junto.")
+    parser.add_argument("--forcar", nargs="*", default=[], help="Etapas a rodar mesmo sem mudança.")
+    parser.add_argument("--offline", action="store_true", help="Não roda as coletas (DATASUS/Open-Meteo) se as saídas já existem.")
+    parser.add_argument("--workers", type=int, default=2, help="Etapas independentes em paralelo.")
+    parser.add_argument("--listar", action="store_true", help="Só mostra as etapas e dependências.")
+    args = parser.parse_args()
+
+    if args.listar:
+        validar_etapas(ETAPAS)
+        fontes = {e['nome']: e.get('fontes', []) for e in ETAPAS}
+        for nome, anteriores in dependencias(ETAPAS).items():
+            origem = anteriores + [f"{f} (fonte)" for f in fontes[nome]]
+            print(f"   {nome:<16} <- {', '.join(origem) or '(fontes externas)'}")
+    else:
+        print("🚀 Rodando o pipeline...")
+        relatorio = rodar_pipeline(alvos=args.alvos, forcar=set(args.forcar), offline=args.offline,
+                                   max_workers=args.workers)
+        imprimir_relatorio(relatorio)
+        with open(ARQUIVO_RELATORIO, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        print(f"💾 Relatório salvo: {ARQUIVO_RELATORIO}")
@@ -0,0 +1,89 @@
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from cenarios_clima import COLUNAS_CLIMA, montar_tensor
+from cubo_semanal import CHAVE_REGIONAL
+from motor_previsao import prever_recursivo_lote
+from processamento_final_merge import ARQUIVO_PAINEL_MUNICIPAL
+from registro_modelos import PASTA_MODELOS, carregar_por_apelido
+from treinamento_com_dengue_e_clima import APELIDO_MODELO_REGIONAL
+from treinamento_municipal import APELIDO_MODELO_MUNICIPAL, FEATURE_MUNICIPIO
+
+ARQUIVO_DATASET_REGIONAL = "dataset_ml_completo_com_clima.parquet"
+
+# Cenários oferecidos no painel (mesmo formato do cenarios_clima.definir_cenarios)
+CENARIOS_PAINEL = {
+    "Clima observado": {'nome': 'observado'},
+    "Mais seco (-40% de chuva)": {'nome': 'seco', 'fator_chuva': 0.6},
+    "Mais chuvoso (+40% de chuva)": {'nome': 'chuvoso', 'fator_chuva': 1.4},
+    "Mais quente (+1,5 °C)": {'nome': 'quente', 'delta_temp': 1.5},
+    "Clima de 2019 (análogo)": {'nome': 'analogo_2019', 'ano_analogo': 2019}
+}
+
+
+class MotorPainel:
+    """
+    Modelos do registro + séries semanais, carregados uma vez por processo
+    (o app guarda a instância em st.cache_resource).
+
+    prever(municipio, horizonte, cenario) e importancia(municipio) têm cache LRU:
+    a mesma pergunta de outro usuário não refaz a previsão. Os DataFrames
+    devolvidos são compartilhados entre sessões; não altere no lugar.
+    """
+
+    def __init__(self, arquivo_regional=ARQUIVO_DATASET_REGIONAL, arquivo_painel=ARQUIVO_PAINEL_MUNICIPAL,
+                 pasta_modelos=PASTA_MODELOS, tamanho_cache=256):
+        self.regional = carregar_por_apelido(APELIDO_MODELO_REGIONAL, pasta_modelos)
+        self.municipal = carregar_por_apelido(APELIDO_MODELO_MUNICIPAL, pasta_modelos)
+
+        # Só as colunas que a previsão usa (clima + casos); as features são recalculadas
+        colunas = ['DT_SEMANA'] + COLUNAS_CLIMA + ['casos']
+        self.bases = {}
+        if self.regional is not None and os.path.exists(arquivo_regional):
+            base = pd.read_parquet(arquivo_regional, columns=colunas)
+            self.bases[CHAVE_REGIONAL] = base.sort_values('DT_SEMANA').reset_index(drop=True)
+        if self.municipal is not None and os.path.exists(arquivo_painel):
+            painel = pd.read_parquet(arquivo_painel, columns=['ID_MN_RESI'] + colunas)
+            for codigo, base in painel.groupby('ID_MN_RESI', sort=False):
+                base = base.sort_values('DT_SEMANA').reset_index(drop=True)
+                base[FEATURE_MUNICIPIO] = int(codigo)
+                self.bases[codigo] = base
+
+        self.entrada = lru_cache(maxsize=tamanho_cache)(self._entrada)
+        self.prever = lru_cache(maxsize=tamanho_cache)(self._prever)
+        self.importancia = lru_cache(maxsize=8)(self._importancia)
+
+    def disponivel(self, municipio):
+        return municipio in self.bases
+
+    def modelo(self, municipio):
+        return self.regional if municipio == CHAVE_REGIONAL else self.municipal
+
+    def _entrada(self, municipio, cenario):
+        """
+        Estado de features de um município num cenário: (X (semanas, 1, features),
+        datas, histórico de casos). Compartilhado; o motor escreve em X, então copie.
+        """
+        features = self.modelo(municipio)[1]['features']
+        base = self.bases[municipio]
+        X, datas, futuro = montar_tensor(base, features, [CENARIOS_PAINEL[cenario]])
+        return X, datas, base['casos'].to_numpy(dtype='float32')[:futuro[0]]
+
+    def _prever(self, municipio, horizonte, cenario):
+        """Previsão recursiva das próximas 'horizonte' semanas (a partir de 2024) num cenário do painel."""
+        model, meta = self.modelo(municipio)
+        X, datas, historico = self.entrada(municipio, cenario)
+        horizonte = min(horizonte, len(datas))
+        previsto = prever_recursivo_lote(model, X[:horizonte].copy(), meta['features'], historico)[0]
+        return pd.DataFrame({'DT_SEMANA': datas[:horizonte], 'casos_previstos_ia': previsto})
+
+    def _importancia(self, municipio, top=15):
+        """Ganho médio de cada feature no modelo usado para o município."""
+        model, meta = self.modelo(municipio)
+        ganho = pd.Series(model.get_booster().get_score(importance_type='gain'), name='ganho')
+        # Modelos treinados em array NumPy chamam as colunas de f0, f1...
+        nomes = {f'f{i}': nome for i, nome in enumerate(meta['features'])}
+        ganho.index = [nomes.get(f, f) for f in ganho.index]
+        return ganho.sort_values(ascending=False).head(top).rename_axis('feature').reset_index()
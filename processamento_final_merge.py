@@ -1,12 +1,91 @@
 import pandas as pd
 import numpy as np
 
+from agregacao_semanal import agregar_casos_semanais, para_pandas, serie_regional
+from armazem_notificacoes import abrir_armazem
+from instrumentacao import contar, medir
+from motor_features import aplicar_spec
+
+ARQUIVO_PAINEL_MUNICIPAL = "dataset_ml_municipal.parquet"
+
+# Clima diário -> semana epidemiológica (mesmas regras do merge regional)
+AGREGACAO_CLIMA_SEMANAL = {
+    'temp_max': 'max',       # Máxima da semana
+    'temp_min': 'min',       # Mínima da semana
+    'temp_media': 'mean',    # Média da semana
+    'chuva_mm': 'sum',       # Chuva ACUMULADA na semana
+    'umidade': 'mean'
+}
+
+def fim_da_semana(datas):
+    """Domingo que fecha a semana de cada data (igual ao resample('W-SUN')): data + (6 - dia da semana)."""
+    dias = pd.to_datetime(datas).to_numpy().astype('datetime64[D]')
+    dia_da_semana = (dias.astype('int64') + 3) % 7  # 01/01/1970 foi uma quinta (3)
+    return dias + (6 - dia_da_semana)
+
+def agrupar_ordenado(municipios, semanas):
+    """
+    Ordena as linhas por (município, semana) e devolve (códigos dos municípios,
+    ordem, início de cada grupo), para reduzir com ufunc.reduceat sem groupby.
+    """
+    codigos, nomes = pd.factorize(pd.Series(municipios).astype(str), sort=True)
+    dias = semanas.astype('int64')
+    ordem = np.lexsort((dias, codigos))
+    cod_ord, dias_ord = codigos[ordem], dias[ordem]
+    quebra = np.ones(len(ordem), dtype=bool)
+    quebra[1:] = (cod_ord[1:] != cod_ord[:-1]) | (dias_ord[1:] != dias_ord[:-1])
+    inicios = np.flatnonzero(quebra)
+    chaves = pd.DataFrame({
+        'ID_MN_RESI': np.asarray(nomes)[cod_ord[inicios]],
+        'DT_SEMANA': dias_ord[inicios].astype('datetime64[D]').astype('datetime64[ns]')
+    })
+    return chaves, ordem, inicios
+
+def agregar_clima_semanal(df_clima):
+    """Clima diário por município -> (ID_MN_RESI, DT_SEMANA) com max/min/média/soma vetorizados."""
+    chaves, ordem, inicios = agrupar_ordenado(df_clima['ID_MN_RESI'], fim_da_semana(df_clima['date']))
+    for coluna, agregacao in AGREGACAO_CLIMA_SEMANAL.items():
+        valores = df_clima[coluna].to_numpy(dtype=np.float64)[ordem]
+        validos = ~np.isnan(valores)
+        if agregacao == 'max':
+            chaves[coluna] = np.fmax.reduceat(valores, inicios)   # fmax/fmin ignoram NaN
+        elif agregacao == 'min':
+            chaves[coluna] = np.fmin.reduceat(valores, inicios)
+        else:
+            soma = np.add.reduceat(np.where(validos, valores, 0.0), inicios)
+            if agregacao == 'sum':
+                chaves[coluna] = soma
+            else:
+                contagem = np.add.reduceat(validos.astype(np.int64), inicios)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    chaves[coluna] = np.where(contagem > 0, soma / contagem, np.nan)
+    return chaves
+
+def montar_painel_municipal(casos, df_clima, inicio='2019-01-01', fim='2024-12-31'):
+    """
+    Painel município x semana: clima semanal de cada município + casos do próprio
+    município (contagens do agregar_casos_semanais). A grade é completa (todo município
+    em toda semana do período), então os lags nunca pulam semanas; semana sem
+    notificação = 0 casos.
+    """
+    clima = agregar_clima_semanal(df_clima)
+
+    municipios = sorted(set(clima['ID_MN_RESI']) | set(casos['ID_MN_RESI']))
+    semanas = pd.date_range(inicio, fim, freq='W-SUN')
+    grade = pd.MultiIndex.from_product([municipios, semanas], names=['ID_MN_RESI', 'DT_SEMANA'])
+
+    painel = clima.set_index(['ID_MN_RESI', 'DT_SEMANA']).reindex(grade)
+    painel['casos'] = casos.set_index(['ID_MN_RESI', 'DT_SEMANA'])['casos'].reindex(grade).fillna(0)
+    return painel.reset_index()
+
+@medir("merge_regional")
 def processar_merge_final():
     print("🔄 Iniciando Fusão de Dados (Dengue + Clima)...")
 
     # 1. Carregar Dados Brutos
     try:
-        df_dengue = pd.read_parquet("dataset_dengue_II_GERES.parquet")
+        # Contagem semanal feita no Arrow: só o agregado (município x semana) vira pandas
+        casos = para_pandas(agregar_casos_semanais(abrir_armazem()))
         df_clima = pd.read_parquet("dados_climaticos_regional_detalhado.parquet")
     except FileNotFoundError as e:
         print(f"❌ Erro: Arquivo não encontrado ({e}). Rode os scripts de coleta anteriores.")
@@ -39,11 +118,8 @@ def processar_merge_final():
 
     # 3. Tratamento da Dengue (Agregação Semanal)
     print("   🦟 Processando dados de Dengue...")
-    df_dengue['DT_NOTIFIC'] = pd.to_datetime(df_dengue['DT_NOTIFIC'])
-    
     # Conta casos por semana na região toda
-    df_dengue_semanal = df_dengue.set_index('DT_NOTIFIC').resample('W-SUN').size().reset_index(name='casos')
-    df_dengue_semanal.rename(columns={'DT_NOTIFIC': 'DT_SEMANA'}, inplace=True)
+    df_dengue_semanal = serie_regional(casos)
 
     # 4. O Grande Merge (Left Join para manter datas da Dengue ou Outer para tudo)
     # Usaremos Outer para garantir que temos clima mesmo em semanas sem dengue (zero casos)
@@ -58,24 +134,10 @@ def processar_merge_final():
     df_final = df_final.sort_values('DT_SEMANA').reset_index(drop=True)
 
     # 5. Engenharia de Features (Recriar Lags + Features Climáticas)
-    print("   🧠 Criando Inteligência (Features)...")
-    
-    # Sazonalidade
-    df_final['semana_do_ano'] = df_final['DT_SEMANA'].dt.isocalendar().week.astype(int)
-    df_final['semana_sin'] = np.sin(2 * np.pi * df_final['semana_do_ano'] / 53)
-    df_final['semana_cos'] = np.cos(2 * np.pi * df_final['semana_do_ano'] / 53)
-
-    # Lags de Dengue (Autoregressivo)
-    for lag in [1, 2, 4, 8]:
-        df_final[f'lag_casos_w{lag}'] = df_final['casos'].shift(lag)
-
-    # Lags CLIMÁTICOS (O Segredo!) 
-    # O mosquito demora ~2 a 4 semanas para nascer após a chuva.
+    # Sazonalidade + lags de casos e de clima (spec SPEC_V2 do motor_features)
     # A chuva de hoje não causa dengue hoje. Causa dengue mês que vem.
-    for lag in [2, 3, 4, 8]: 
-        df_final[f'lag_chuva_w{lag}'] = df_final['chuva_mm'].shift(lag)
-        df_final[f'lag_temp_w{lag}'] = df_final['temp_media'].shift(lag)
-        df_final[f'lag_umid_w{lag}'] = df_final['umidade'].shift(lag)
+    print("   🧠 Criando Inteligência (Features)...")
+    df_final = aplicar_spec(df_final)
 
     # Remover linhas vazias geradas pelos lags
     df_ml = df_final.dropna().reset_index(drop=True)
@@ -83,11 +145,35 @@ def processar_merge_final():
     # Salvar
     arquivo_saida = "dataset_ml_completo_com_clima.parquet"
     df_ml.to_parquet(arquivo_saida, index=False)
+    contar(linhas_entrada=int(casos['casos'].sum()) + len(df_clima), linhas=len(df_ml))
     
     print(f"\n✅ SUCESSO! Dataset final pronto para treino: {arquivo_saida}")
     print(f"📊 Colunas geradas: {len(df_ml.columns)}")
     print("   Novas variáveis: lag_chuva_wX, lag_temp_wX...")
     print(df_ml[['DT_SEMANA', 'casos', 'chuva_mm', 'lag_chuva_w2']].tail())
 
+@medir("merge_municipal")
+def processar_merge_municipal(arquivo_saida=ARQUIVO_PAINEL_MUNICIPAL):
+    """Mesma fusão, sem colapsar a região: um painel município x semana com features por município."""
+    print("🏘️ Montando painel município x semana (casos + clima local)...")
+    try:
+        casos = para_pandas(agregar_casos_semanais(abrir_armazem()))
+        df_clima = pd.read_parquet("dados_climaticos_regional_detalhado.parquet",
+                                   columns=['date', 'ID_MN_RESI'] + list(AGREGACAO_CLIMA_SEMANAL))
+    except FileNotFoundError as e:
+        print(f"❌ Erro: Arquivo não encontrado ({e}). Rode os scripts de coleta anteriores.")
+        return None
+
+    painel = montar_painel_municipal(casos, df_clima)
+    # Lags nunca atravessam a fronteira entre dois municípios
+    painel = aplicar_spec(painel, grupo='ID_MN_RESI')
+    painel = painel.dropna().reset_index(drop=True)
+
+    painel.to_parquet(arquivo_saida, index=False)
+    contar(linhas_entrada=int(casos['casos'].sum()) + len(df_clima), linhas=len(painel))
+    print(f"📊 Painel: {painel['ID_MN_RESI'].nunique()} municípios, {len(painel)} linhas -> {arquivo_saida}")
+    return painel
+
 if __name__ == "__main__":
-    processar_merge_final()
\ No newline at end of file
+    processar_merge_final()
+    processar_merge_municipal()
\ No newline at end of file
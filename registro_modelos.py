@@ -0,0 +1,85 @@
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+import xgboost as xgb
+
+# Registro de modelos endereçado por conteúdo: modelos/<chave>/{modelo.ubj, meta.json}
+PASTA_MODELOS = "modelos"
+ARQUIVO_APELIDOS = "apelidos.json"
+
+
+def chave_modelo(X, y, features, parametros):
+    """
+    SHA-256 de (dados de treino, lista de features, hiperparâmetros, versão do XGBoost).
+    Mesmos dados + mesma spec = mesma chave = modelo reaproveitado.
+    """
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(pd.DataFrame(X), index=False).values.tobytes())
+    h.update(pd.util.hash_pandas_object(pd.Series(y), index=False).values.tobytes())
+    spec = {'features': list(features), 'parametros': parametros, 'xgboost': xgb.__version__}
+    h.update(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()[:24]
+
+
+def carregar_modelo(chave, pasta=PASTA_MODELOS):
+    """(XGBRegressor, metadados) do registro, ou None se a chave não existe."""
+    destino = os.path.join(pasta, chave)
+    if not os.path.exists(os.path.join(destino, "meta.json")):
+        return None
+    with open(os.path.join(destino, "meta.json"), encoding='utf-8') as f:
+        meta = json.load(f)
+    model = xgb.XGBRegressor()
+    model.load_model(os.path.join(destino, "modelo.ubj"))
+    return model, meta
+
+
+def salvar_modelo(chave, model, features, metadados=None, pasta=PASTA_MODELOS):
+    """Grava booster + features + metadados numa pasta temporária e troca de uma vez."""
+    destino = os.path.join(pasta, chave)
+    if os.path.exists(os.path.join(destino, "meta.json")):
+        return destino
+    temporaria = f"{destino}.tmp-{os.getpid()}"
+    os.makedirs(temporaria, exist_ok=True)
+    model.save_model(os.path.join(temporaria, "modelo.ubj"))
+    meta = {
+        'chave': chave,
+        'features': list(features),
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        **(metadados or {})
+    }
+    with open(os.path.join(temporaria, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False, default=str)
+    try:
+        os.replace(temporaria, destino)
+    except OSError:
+        # Outro processo gravou a mesma chave primeiro: o conteúdo é o mesmo
+        shutil.rmtree(temporaria, ignore_errors=True)
+    return destino
+
+
+def marcar_apelido(nome, chave, pasta=PASTA_MODELOS):
+    """Aponta um nome estável (ex: 'v2_regional') para a chave do último treino."""
+    os.makedirs(pasta, exist_ok=True)
+    arquivo = os.path.join(pasta, ARQUIVO_APELIDOS)
+    apelidos = {}
+    if os.path.exists(arquivo):
+        with open(arquivo, encoding='utf-8') as f:
+            apelidos = json.load(f)
+    apelidos[nome] = chave
+    with open(arquivo + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(apelidos, f, indent=2, ensure_ascii=False)
+    os.replace(arquivo + ".tmp", arquivo)
+
+
+def carregar_por_apelido(nome, pasta=PASTA_MODELOS):
+    """(XGBRegressor, metadados) do modelo apontado pelo apelido, ou None."""
+    arquivo = os.path.join(pasta, ARQUIVO_APELIDOS)
+    if not os.path.exists(arquivo):
+        return None
+    with open(arquivo, encoding='utf-8') as f:
+        chave = json.load(f).get(nome)
+    return carregar_modelo(chave, pasta) if chave else None
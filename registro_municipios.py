@@ -0,0 +1,87 @@
+import csv
+from functools import lru_cache
+
+from configuracao import caminho_dado
+
+# Cadastro de municípios: codigo_ibge (7 dígitos), codigo_sinan (6 dígitos, o do
+# ID_MN_RESI), nome, uf, geres, lat, lon (centroide, usado na coleta de clima).
+# Para cobrir outra GERES, acrescente as linhas dela (ou aponte $DENGUE_DADOS para
+# uma pasta com o cadastro completo do estado).
+ARQUIVO_MUNICIPIOS = "municipios.csv"
+REGIAO_PADRAO = "II"
+
+
+def digito_verificador(codigo_6):
+    """Dígito verificador do IBGE (pesos 1,2,1,2,1,2; produtos > 9 somam os algarismos)."""
+    soma = 0
+    for posicao, algarismo in enumerate(codigo_6):
+        produto = int(algarismo) * (1 if posicao % 2 == 0 else 2)
+        soma += produto // 10 + produto % 10
+    return (10 - soma % 10) % 10
+
+
+def normalizar_codigo(codigo):
+    """Código IBGE de 6 ou 7 dígitos (texto ou número) -> 6 dígitos, como no SINAN."""
+    texto = str(codigo).strip()
+    if len(texto) == 7:
+        texto = texto[:6]
+    if len(texto) != 6 or not texto.isdigit():
+        raise ValueError(f"Código IBGE inválido: {codigo!r}")
+    return texto
+
+
+def codigo_7_digitos(codigo):
+    """6 dígitos (SINAN) -> 7 dígitos (IBGE completo)."""
+    codigo = normalizar_codigo(codigo)
+    return codigo + str(digito_verificador(codigo))
+
+
+@lru_cache(maxsize=4)
+def carregar_municipios(arquivo=None):
+    """
+    Linhas do cadastro (dicts), na ordem do arquivo. Lido uma vez por processo.
+    codigo_ibge, quando preenchido, tem de ser o codigo_sinan + dígito verificador.
+    """
+    with open(arquivo or caminho_dado(ARQUIVO_MUNICIPIOS), encoding='utf-8', newline='') as f:
+        municipios = []
+        for linha in csv.DictReader(f):
+            linha['codigo_sinan'] = normalizar_codigo(linha.get('codigo_sinan') or linha['codigo_ibge'])
+            esperado = codigo_7_digitos(linha['codigo_sinan'])
+            if (linha.get('codigo_ibge') or '').strip() not in ('', esperado):
+                raise ValueError(f"Cadastro de municípios: codigo_ibge {linha['codigo_ibge']!r} de "
+                                 f"{linha.get('nome')} não corresponde ao codigo_sinan {linha['codigo_sinan']} "
+                                 f"(esperado {esperado})")
+            linha['lat'] = float(linha['lat']) if linha.get('lat') else None
+            linha['lon'] = float(linha['lon']) if linha.get('lon') else None
+            municipios.append(linha)
+    return tuple(municipios)
+
+
+def listar_regioes(arquivo=None):
+    """GERES presentes no cadastro, na ordem em que aparecem."""
+    return list(dict.fromkeys(m['geres'] for m in carregar_municipios(arquivo)))
+
+
+def municipios_regiao(regiao=REGIAO_PADRAO, arquivo=None):
+    municipios = [m for m in carregar_municipios(arquivo) if m['geres'] == regiao]
+    if not municipios:
+        raise KeyError(f"Região sem municípios no cadastro: {regiao}")
+    return municipios
+
+
+def codigos_regiao(regiao=REGIAO_PADRAO, arquivo=None):
+    """Códigos de 6 dígitos (ID_MN_RESI) de uma GERES."""
+    return [m['codigo_sinan'] for m in municipios_regiao(regiao, arquivo)]
+
+
+def coordenadas_regiao(regiao=REGIAO_PADRAO, arquivo=None):
+    """{código: {'nome', 'lat', 'lon'}} no formato da coleta de clima."""
+    return {
+        m['codigo_sinan']: {'nome': m['nome'], 'lat': m['lat'], 'lon': m['lon']}
+        for m in municipios_regiao(regiao, arquivo)
+    }
+
+
+def mapa_regioes(regioes=None, arquivo=None):
+    """{região: [códigos]} para o roteamento multi-região (padrão: todas do cadastro)."""
+    return {regiao: codigos_regiao(regiao, arquivo) for regiao in (regioes or listar_regioes(arquivo))}
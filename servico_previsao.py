@@ -0,0 +1,219 @@
+import json
+import queue
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from configuracao import caminho_dado
+from cubo_semanal import CHAVE_REGIONAL
+from instrumentacao import contar, etapa
+from motor_previsao import prever_recursivo_lote
+from previsao_interativa import ARQUIVO_DATASET_REGIONAL, CENARIOS_PAINEL, MotorPainel
+from processamento_final_merge import ARQUIVO_PAINEL_MUNICIPAL
+from registro_modelos import PASTA_MODELOS
+
+PORTA_PADRAO = 8765
+CENARIO_PADRAO = "Clima observado"
+HORIZONTE_PADRAO = 52
+
+# Micro-lote: espera até ESPERA_LOTE segundos por outros pedidos (ou até
+# MAX_SERIES_LOTE séries) antes de rodar uma previsão vetorizada só
+ESPERA_LOTE = 0.005
+MAX_SERIES_LOTE = 4096
+
+
+class ServidorPrevisao(ThreadingHTTPServer):
+    daemon_threads = True
+    # Fila de conexões maior que o padrão (5): clientes em rajada não levam reset
+    request_queue_size = 128
+
+
+class LoteadorPrevisoes:
+    """
+    Junta pedidos concorrentes em micro-lotes.
+
+    Cada pedido é uma lista de (município, cenário) + horizonte. Uma thread
+    única esvazia a fila, agrupa as séries de todos os pedidos por modelo e
+    roda um prever_recursivo_lote por grupo: uma chamada inplace_predict por
+    semana para o lote inteiro, em vez de uma por município por pedido.
+    """
+
+    def __init__(self, motor, espera=ESPERA_LOTE, max_series=MAX_SERIES_LOTE):
+        self.motor = motor
+        self.espera = espera
+        self.max_series = max_series
+        self.fila = queue.Queue()
+        self.lotes = 0
+        self.series = 0
+        threading.Thread(target=self._laco, daemon=True).start()
+
+    def submeter(self, series, horizonte):
+        """Enfileira um pedido; o Future devolve {(município, cenário): (datas, previsão)}."""
+        futuro = Future()
+        self.fila.put((series, horizonte, futuro))
+        return futuro
+
+    def _laco(self):
+        while True:
+            lote = [self.fila.get()]
+            n_series = len(lote[0][0])
+            try:
+                while n_series < self.max_series:
+                    lote.append(self.fila.get(timeout=self.espera))
+                    n_series += len(lote[-1][0])
+            except queue.Empty:
+                pass
+            self._rodar(lote)
+
+    def _rodar(self, lote):
+        # Séries iguais em pedidos diferentes são previstas uma vez só, no maior horizonte pedido
+        horizontes = {}
+        for series, horizonte, _ in lote:
+            for serie in series:
+                horizontes[serie] = max(horizonte, horizontes.get(serie, 0))
+
+        resultados, erro = {}, None
+        try:
+            # Uma linha de métrica por micro-lote: as previsões de cada grupo não
+            # registram a sua, só somam as semanas x séries previstas (linhas) nesta
+            with etapa("servico_lote", internas=False):
+                contar(pedidos=len(lote), series=len(horizontes))
+                # Um grupo por modelo (e tamanho de histórico, para empilhar os históricos)
+                grupos = {}
+                for municipio, cenario in horizontes:
+                    X, datas, historico = self.motor.entrada(municipio, cenario)
+                    chave = (municipio == CHAVE_REGIONAL, len(historico))
+                    grupos.setdefault(chave, []).append(((municipio, cenario), X, datas, historico))
+                contar(grupos=len(grupos))
+
+                for itens in grupos.values():
+                    municipio = itens[0][0][0]
+                    model, meta = self.motor.modelo(municipio)
+                    n_semanas = min(max(horizontes[s] for s, *_ in itens), min(len(d) for _, _, d, _ in itens))
+                    X = np.concatenate([X[:n_semanas] for _, X, _, _ in itens], axis=1)
+                    historicos = np.stack([h for *_, h in itens])
+                    previsto = prever_recursivo_lote(model, X, meta['features'], historicos)
+                    for (serie, _, datas, _), linha in zip(itens, previsto):
+                        resultados[serie] = (datas[:n_semanas], linha)
+        except Exception as e:
+            erro = e
+
+        self.lotes += 1
+        self.series += len(horizontes)
+        for series, horizonte, futuro in lote:
+            if erro is not None:
+                futuro.set_exception(erro)
+                continue
+            futuro.set_result({
+                serie: (resultados[serie][0][:horizonte], resultados[serie][1][:horizonte]) for serie in series
+            })
+
+
+def criar_servidor(motor, host="127.0.0.1", porta=PORTA_PADRAO):
+    """
+    Servidor HTTP local (uma thread por conexão) na frente do loteador.
+
+    - GET  /saude   -> modelos carregados, municípios disponíveis e contadores de lotes
+    - POST /prever  -> {"municipios": [...], "horizonte": 12, "cenario": "Clima observado"}
+    """
+    loteador = LoteadorPrevisoes(motor)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            if self.path != "/saude":
+                return self._responder(404, {'erro': 'rota inexistente'})
+            self._responder(200, {
+                'modelos': {
+                    'regional': motor.regional[1]['chave'] if motor.regional else None,
+                    'municipal': motor.municipal[1]['chave'] if motor.municipal else None
+                },
+                'municipios': sorted(motor.bases),
+                'cenarios': list(CENARIOS_PAINEL),
+                'lotes': loteador.lotes,
+                'series': loteador.series
+            })
+
+        def do_POST(self):
+            if self.path != "/prever":
+                return self._responder(404, {'erro': 'rota inexistente'})
+            try:
+                pedido = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b'{}')
+                municipios = pedido.get('municipios', [CHAVE_REGIONAL])
+                if isinstance(municipios, str):
+                    municipios = [municipios]
+                municipios = [str(m) for m in municipios]
+                horizonte = int(pedido.get('horizonte', HORIZONTE_PADRAO))
+                cenario = pedido.get('cenario', CENARIO_PADRAO)
+            except (ValueError, TypeError, AttributeError) as e:
+                return self._responder(400, {'erro': f'pedido inválido: {e}'})
+
+            faltando = [m for m in municipios if not motor.disponivel(m)]
+            if faltando or cenario not in CENARIOS_PAINEL or horizonte < 1:
+                return self._responder(400, {
+                    'erro': 'município/cenário/horizonte inválido',
+                    'municipios_indisponiveis': faltando
+                })
+
+            try:
+                resultado = loteador.submeter([(m, cenario) for m in municipios], horizonte).result()
+            except Exception as e:
+                return self._responder(500, {'erro': str(e)})
+            self._responder(200, {
+                'cenario': cenario,
+                'previsoes': {
+                    m: {
+                        'DT_SEMANA': [str(d.date()) for d in resultado[(m, cenario)][0]],
+                        'casos_previstos_ia': [round(float(v), 3) for v in resultado[(m, cenario)][1]]
+                    } for m in municipios
+                }
+            })
+
+        def log_message(self, formato, *args):
+            pass  # Sem uma linha no terminal por pedido
+
+    servidor = ServidorPrevisao((host, porta), Handler)
+    servidor.loteador = loteador
+    return servidor
+
+
+def prever_remoto(municipios, horizonte=HORIZONTE_PADRAO, cenario=CENARIO_PADRAO,
+                  url=f"http://127.0.0.1:{PORTA_PADRAO}", timeout=30):
+    """Cliente: pede previsões ao serviço local. Retorna o dict 'previsoes' da resposta."""
+    corpo = json.dumps({'municipios': municipios, 'horizonte': horizonte, 'cenario': cenario}).encode('utf-8')
+    pedido = urllib.request.Request(url + "/prever", data=corpo, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(pedido, timeout=timeout) as resposta:
+        return json.loads(resposta.read())['previsoes']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço local de previsão (HTTP, com micro-lotes).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    args = parser.parse_args()
+
+    print("🧠 Carregando modelos do registro e séries semanais...")
+    motor = MotorPainel(caminho_dado(ARQUIVO_DATASET_REGIONAL), caminho_dado(ARQUIVO_PAINEL_MUNICIPAL),
+                        caminho_dado(PASTA_MODELOS))
+    if not motor.bases:
+        print("❌ Nenhum modelo registrado. Rode treinamento_com_dengue_e_clima.py / treinamento_municipal.py antes.")
+    else:
+        servidor = criar_servidor(motor, args.host, args.porta)
+        print(f"🚀 Servindo {len(motor.bases)} série(s) em http://{args.host}:{args.porta} (POST /prever, GET /saude)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Serviço encerrado.")
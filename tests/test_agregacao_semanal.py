@@ -0,0 +1,33 @@
+import pandas as pd
+import pyarrow as pa
+
+from agregacao_semanal import agregar_casos_semanais, completar_semanas, para_pandas
+
+
+def test_completa_semanas_sem_notificacao():
+    casos = pd.DataFrame({
+        'ID_MN_RESI': ['260410', '260410', '260410', '260890'],
+        'DT_SEMANA': pd.to_datetime(['2024-01-07', '2024-01-28', '2024-02-04', '2024-01-14']),
+        'casos': [3, 1, 2, 5]
+    })
+    completo = completar_semanas(casos)
+
+    carpina = completo[completo['ID_MN_RESI'] == '260410']
+    assert list(carpina['DT_SEMANA']) == list(pd.date_range('2024-01-07', '2024-02-04', freq='W-SUN'))
+    assert list(carpina['casos']) == [3, 0, 0, 1, 2]
+    # Cada município só da sua primeira à sua última semana com caso
+    assert completo[completo['ID_MN_RESI'] == '260890']['casos'].tolist() == [5]
+
+
+def test_igual_ao_resample_das_notificacoes():
+    notificacoes = pd.DataFrame({
+        'DT_NOTIFIC': ['20240101', '20240107', '20240108', '20240125', '20240102', None, '20240214'],
+        'ID_MN_RESI': ['260410', '260410', '260410', '260410', '260890', '260890', '260890']
+    })
+    obtido = completar_semanas(para_pandas(agregar_casos_semanais(pa.Table.from_pandas(notificacoes))))
+
+    datas = notificacoes.assign(DT_NOTIFIC=pd.to_datetime(notificacoes['DT_NOTIFIC'], format='%Y%m%d'))
+    esperado = (datas.dropna().set_index('DT_NOTIFIC').groupby('ID_MN_RESI')
+                .resample('W-SUN').size().rename('casos').reset_index()
+                .rename(columns={'DT_NOTIFIC': 'DT_SEMANA'}))
+    pd.testing.assert_frame_equal(obtido, esperado, check_dtype=False)
@@ -0,0 +1,37 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from armazem_notificacoes import gravar_armazem, ler_notificacoes
+
+
+def gravar_base(tmp_path):
+    regional = tmp_path / "regional.parquet"
+    pq.write_table(pa.table({
+        'DT_NOTIFIC': ['20230105', '20230210', '20240103', '20240320', '20240401'],
+        'ID_MN_RESI': ['260410', '260890', '260410', '260410', '260890'],
+        'CS_SEXO': ['F', 'M', 'F', 'M', 'F'],
+        'NU_IDADE_N': ['4030', '4012', '4050', '4001', '4077'],
+        'ano_base': [2023, 2023, 2024, 2024, 2024]
+    }), regional)
+    pasta = str(tmp_path / "notificacoes")
+    gravar_armazem(str(regional), pasta)
+    return pasta
+
+
+def test_le_so_particoes_e_colunas_pedidas(tmp_path):
+    pasta = gravar_base(tmp_path)
+    tabela = ler_notificacoes(anos=[2024], municipios=['260410'], colunas=['DT_NOTIFIC', 'CS_SEXO'], pasta=pasta)
+    assert tabela.column_names == ['DT_NOTIFIC', 'CS_SEXO']
+    assert sorted(str(d) for d in tabela['DT_NOTIFIC'].to_pylist()) == ['2024-01-03', '2024-03-20']
+
+    assert ler_notificacoes(municipios=[260890], pasta=pasta).num_rows == 2
+    assert ler_notificacoes(anos=[2023], pasta=pasta).num_rows == 2
+    assert ler_notificacoes(pasta=pasta).num_rows == 5
+
+
+def test_tipos_da_base(tmp_path):
+    tabela = ler_notificacoes(pasta=gravar_base(tmp_path))
+    assert tabela.schema.field('DT_NOTIFIC').type == pa.date32()
+    assert pa.types.is_dictionary(tabela.schema.field('ID_MN_RESI').type)
+    assert pa.types.is_dictionary(tabela.schema.field('CS_SEXO').type)
+    assert tabela.schema.field('NU_IDADE_N').type == pa.int16()
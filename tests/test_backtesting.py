@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtesting as bt
+
+FEATURES = ['semana_do_ano', 'lag_casos_w1']
+SEMANAS_OBSERVADAS = 40
+
+
+@pytest.fixture
+def matriz(monkeypatch):
+    """60 semanas; as 20 últimas são os zeros que o merge põe onde a base ainda não chegou."""
+    datas = pd.date_range('2023-01-01', periods=60, freq='W-SUN').to_numpy(dtype='datetime64[ns]')
+    y = np.zeros(60, dtype=np.float32)
+    y[:SEMANAS_OBSERVADAS] = 10 + 5 * np.sin(np.arange(SEMANAS_OBSERVADAS) / 4)
+    X = np.column_stack([np.arange(60) % 52 + 1, np.r_[np.nan, y[:-1]]]).astype(np.float32)
+
+    monkeypatch.setitem(bt.PARAMETROS_V2, 'n_estimators', 20)
+    monkeypatch.setattr(bt, '_MATRIZ', {})
+    bt._MATRIZ['dados'] = ({'X': X, 'y': y, 'datas': datas}, FEATURES)
+    bt._MATRIZ['fim_observado'] = bt.ultima_semana_observada(y, datas)
+    return datas
+
+
+def test_ultima_semana_observada(matriz):
+    assert bt._MATRIZ['fim_observado'] == matriz[SEMANAS_OBSERVADAS - 1]
+
+
+def test_fold_para_na_ultima_semana_observada(matriz):
+    corte = str(pd.Timestamp(matriz[35]).date())
+    detalhe = bt._avaliar_fold(corte, 13, 0)
+    assert len(detalhe) == SEMANAS_OBSERVADAS - 35
+    assert detalhe['DT_SEMANA'].max() == matriz[SEMANAS_OBSERVADAS - 1]
+    assert (detalhe['casos'] > 0).all()
+
+
+def test_fold_sem_semana_observada_e_pulado(matriz):
+    assert bt._avaliar_fold(str(pd.Timestamp(matriz[45]).date()), 13, 0) is None
+
+
+def test_zero_real_no_fim_da_cobertura_e_avaliado(matriz):
+    # Cobertura do SINAN vai 2 semanas além do último caso: esses zeros são observação
+    bt._MATRIZ['fim_observado'] = matriz[SEMANAS_OBSERVADAS + 1]
+    detalhe = bt._avaliar_fold(str(pd.Timestamp(matriz[35]).date()), 13, 0)
+    assert detalhe['DT_SEMANA'].max() == matriz[SEMANAS_OBSERVADAS + 1]
+    assert detalhe['casos'].tolist()[-2:] == [0, 0]
+
+
+def test_fim_cobertura_pelo_cubo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bt, 'caminho_dado', lambda nome: str(tmp_path / nome))
+    assert bt.fim_cobertura() is None
+    pd.DataFrame({
+        'ID_MN_RESI': ['260410', 'TOTAL', 'TOTAL'],
+        'DT_SEMANA': pd.to_datetime(['2023-12-31', '2023-12-24', '2023-12-31']),
+        'casos': [0, 3, 1]
+    }).to_parquet(tmp_path / bt.ARQUIVO_CUBO, index=False)
+    assert bt.fim_cobertura() == np.datetime64('2023-12-31', 'ns')
@@ -0,0 +1,31 @@
+import json
+
+from benchmark_pipeline import anexar_resultado, comparar_com_anterior, rodar_benchmark
+
+ETAPAS = ['filtro_regional', 'agregacao_semanal', 'merge_clima', 'features', 'treino', 'previsao_recursiva']
+
+
+def test_registro_jsonl_de_uma_execucao_pequena(tmp_path):
+    resultado = rodar_benchmark(4000, 25, [2022, 2023], n_extras=2, arvores=5, pasta=str(tmp_path / "dados"))
+    arquivo = str(tmp_path / "resultados.jsonl")
+    assert comparar_com_anterior(resultado, arquivo) is None
+    anexar_resultado(resultado, arquivo)
+
+    with open(arquivo, encoding='utf-8') as f:
+        registro = json.loads(f.readline())
+    assert registro['escala']['notificacoes'] == 4000
+    assert registro['escala']['municipios'] == 25
+    assert registro['escala']['bytes_dataset'] > 0
+    assert {'python', 'pyarrow', 'pandas', 'xgboost', 'nucleos'} <= set(registro['ambiente'])
+    assert [e['etapa'] for e in registro['etapas']] == ETAPAS
+    for etapa in registro['etapas']:
+        assert etapa['segundos'] >= 0 and etapa['rss_pico_mb'] >= etapa['rss_inicio_mb']
+    # O filtro lê o Brasil inteiro e só devolve a II GERES
+    filtro = registro['etapas'][0]
+    assert filtro['linhas'] == 4000 and 0 < filtro['linhas_saida'] < 4000
+
+    # Segunda execução na mesma escala (dataset reaproveitado): razão de tempo por etapa
+    segundo = rodar_benchmark(4000, 25, [2022, 2023], n_extras=2, arvores=5, pasta=str(tmp_path / "dados"))
+    segundo['quando'] = "2099-01-01T00:00:00"  # 'quando' tem resolução de segundos
+    versao, razoes = comparar_com_anterior(segundo, arquivo)
+    assert set(razoes) <= set(ETAPAS)
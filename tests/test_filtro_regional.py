@@ -0,0 +1,41 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from filtro_regional import iterar_lotes_por_regiao
+
+REGIOES = {'I': ['260005', '261160'], 'II': ['260410', '260890', '260290'], 'III': ['260050']}
+
+
+@pytest.fixture
+def nacional(tmp_path):
+    codigos = ['260410', '350000', '260005', '260890', '260050', '261160', '260290', '530010'] * 25
+    caminho = tmp_path / "DENGBR24.parquet"
+    pq.write_table(pa.table({'ID_MN_RESI': codigos, 'linha': list(range(len(codigos)))}), caminho,
+                   row_group_size=30)
+    return str(caminho), codigos
+
+
+def test_cada_linha_vai_para_a_sua_regiao(nacional):
+    caminho, codigos = nacional
+    recebidas = {regiao: [] for regiao in REGIOES}
+    for regiao, batch in iterar_lotes_por_regiao(caminho, REGIOES, batch_size=7):
+        assert set(batch['ID_MN_RESI'].to_pylist()) <= set(REGIOES[regiao])
+        recebidas[regiao] += batch['linha'].to_pylist()
+
+    for regiao, municipios in REGIOES.items():
+        esperadas = [i for i, codigo in enumerate(codigos) if codigo in municipios]
+        assert sorted(recebidas[regiao]) == esperadas
+
+
+def test_uma_regiao_so(nacional):
+    caminho, codigos = nacional
+    lotes = list(iterar_lotes_por_regiao(caminho, {'II': REGIOES['II']}))
+    assert {regiao for regiao, _ in lotes} == {'II'}
+    assert sum(batch.num_rows for _, batch in lotes) == sum(codigo in REGIOES['II'] for codigo in codigos)
+
+
+def test_municipio_em_duas_regioes(nacional):
+    caminho, _ = nacional
+    with pytest.raises(ValueError):
+        list(iterar_lotes_por_regiao(caminho, {'I': ['260410'], 'II': ['260410', '260890']}))
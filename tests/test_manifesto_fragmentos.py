@@ -0,0 +1,150 @@
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import manifesto_fragmentos as mf
+
+REGIAO = ["260410", "260890"]
+
+
+def gravar_fragmento(caminho, municipios):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    pq.write_table(pa.table({
+        'DT_NOTIFIC': ['20240105'] * len(municipios),
+        'ID_MN_RESI': municipios
+    }), caminho)
+    return str(caminho)
+
+
+@pytest.fixture
+def refiltros(monkeypatch):
+    """Registra os fragmentos que realmente passaram pelo filtro."""
+    chamados = []
+    original = mf.filtrar_fragmento_para_parte
+
+    def filtrar(caminho, *args, **kwargs):
+        chamados.append(os.path.abspath(caminho))
+        return original(caminho, *args, **kwargs)
+
+    monkeypatch.setattr(mf, 'filtrar_fragmento_para_parte', filtrar)
+    return chamados
+
+
+def linhas(partes):
+    return sum(pq.read_metadata(parte).num_rows for _, parte in partes)
+
+
+def test_so_refiltra_fragmento_alterado(tmp_path, monkeypatch, refiltros):
+    monkeypatch.chdir(tmp_path)
+    a = gravar_fragmento(tmp_path / "fonte" / "a.parquet", ["260410", "350000"])
+    b = gravar_fragmento(tmp_path / "fonte" / "b.parquet", ["260890"])
+    fontes = [(2024, a), (2024, b)]
+
+    assert linhas(mf.atualizar_regiao_incremental(fontes, REGIAO, "partes")) == 2
+    assert len(refiltros) == 2
+
+    refiltros.clear()
+    mf.atualizar_regiao_incremental(fontes, REGIAO, "partes")
+    assert refiltros == []
+
+    gravar_fragmento(a, ["260410", "260410", "260890", "350000"])
+    partes = mf.atualizar_regiao_incremental(fontes, REGIAO, "partes")
+    assert refiltros == [os.path.abspath(a)]
+    assert linhas(partes) == 4
+
+
+def test_partes_com_caminho_absoluto(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    a = gravar_fragmento(tmp_path / "fonte" / "a.parquet", ["260410"])
+    partes = mf.atualizar_regiao_incremental([(2024, a)], REGIAO, "partes")
+    assert all(os.path.isabs(parte) for _, parte in partes)
+
+    # De outra pasta de trabalho o manifesto continua válido
+    outra = tmp_path / "outra"
+    outra.mkdir()
+    monkeypatch.chdir(outra)
+    assert mf.atualizar_regiao_incremental([(2024, a)], REGIAO, str(tmp_path / "partes")) == partes
+
+
+def test_remove_parte_de_fragmento_que_sumiu(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    a = gravar_fragmento(tmp_path / "fonte" / "a.parquet", ["260410"])
+    b = gravar_fragmento(tmp_path / "fonte" / "b.parquet", ["260890"])
+    partes = mf.atualizar_regiao_incremental([(2024, a), (2024, b)], REGIAO, "partes")
+    parte_b = partes[1][1]
+
+    os.remove(b)
+    partes = mf.atualizar_regiao_incremental([(2024, a)], REGIAO, "partes")
+    assert [p for _, p in partes] == [partes[0][1]]
+    assert not os.path.exists(parte_b)
+    manifesto = mf.carregar_manifesto(os.path.join("partes", "manifesto.json"))
+    assert os.path.abspath(b) not in manifesto['fragmentos']
+
+
+def test_fragmento_ilegivel_nao_deixa_parte_antiga(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    a = gravar_fragmento(tmp_path / "fonte" / "a.parquet", ["260410"])
+    b = gravar_fragmento(tmp_path / "fonte" / "b.parquet", ["260890"])
+    parte_b = mf.atualizar_regiao_incremental([(2024, a), (2024, b)], REGIAO, "partes")[1][1]
+
+    with open(b, 'wb') as f:
+        f.write(b"download interrompido")
+    partes = mf.atualizar_regiao_incremental([(2024, a), (2024, b)], REGIAO, "partes", ignorar_erros=True)
+    assert len(partes) == 1 and linhas(partes) == 1
+    assert not os.path.exists(parte_b)
+    manifesto = mf.carregar_manifesto(os.path.join("partes", "manifesto.json"))
+    assert os.path.abspath(b) not in manifesto['fragmentos']
+
+
+def test_dois_chamadores_na_mesma_pasta(tmp_path, monkeypatch, refiltros):
+    """Cache do PySUS + downloads_2024 (um script) x só downloads_2024 (outro)."""
+    monkeypatch.chdir(tmp_path)
+    cache = gravar_fragmento(tmp_path / "pysus" / "c.parquet", ["260410"])
+    download = gravar_fragmento(tmp_path / "downloads_2024" / "d.parquet", ["260890"])
+    todas = [(2024, cache), (2024, download)]
+    so_download = [(2024, download)]
+
+    partes_todas = mf.atualizar_regiao_incremental(todas, REGIAO, "partes")
+    mf.atualizar_regiao_incremental(so_download, REGIAO, "partes")
+    refiltros.clear()
+
+    # Nenhum dos dois apaga as partes do outro nem refiltra nada
+    assert mf.atualizar_regiao_incremental(todas, REGIAO, "partes") == partes_todas
+    assert mf.atualizar_regiao_incremental(so_download, REGIAO, "partes") == partes_todas[1:]
+    assert refiltros == []
+    assert all(os.path.exists(parte) for _, parte in partes_todas)
+
+
+def test_consolidado_por_conjunto_de_partes(tmp_path, monkeypatch):
+    """Dois chamadores alternando não reescrevem o consolidado um do outro."""
+    monkeypatch.chdir(tmp_path)
+    cache = gravar_fragmento(tmp_path / "pysus" / "c.parquet", ["260410"])
+    download = gravar_fragmento(tmp_path / "downloads_2024" / "d.parquet", ["260890", "260890"])
+    colunas = ['DT_NOTIFIC', 'ID_MN_RESI']
+
+    partes_todas = mf.atualizar_regiao_incremental([(2024, cache), (2024, download)], REGIAO, "partes")
+    partes_download = mf.atualizar_regiao_incremental([(2024, download)], REGIAO, "partes")
+    assert mf.ler_partes_consolidadas(partes_todas, "partes", colunas).num_rows == 3
+    assert mf.ler_partes_consolidadas(partes_download, "partes", colunas).num_rows == 2
+
+    reconstruidos = []
+    original = mf.ler_partes
+    monkeypatch.setattr(mf, 'ler_partes', lambda *a, **k: reconstruidos.append(1) or original(*a, **k))
+    assert mf.ler_partes_consolidadas(partes_todas, "partes", colunas).num_rows == 3
+    assert mf.ler_partes_consolidadas(partes_download, "partes", colunas).num_rows == 2
+    assert reconstruidos == []
+
+    # Fragmento alterado: o mesmo arquivo é refeito com o conteúdo novo
+    gravar_fragmento(download, ["260890"])
+    partes_download = mf.atualizar_regiao_incremental([(2024, download)], REGIAO, "partes")
+    assert mf.ler_partes_consolidadas(partes_download, "partes", colunas).num_rows == 1
+    assert reconstruidos == [1]
+
+
+def test_consolidado_sem_partes_legiveis(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(mf, 'ler_partes', lambda *a, **k: None)
+    assert mf.ler_partes_consolidadas([(2024, str(tmp_path / "x.parquet"))], "partes") is None
+    assert mf.ler_partes_consolidadas([], "partes") is None
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from motor_features import ORIGENS, SPEC_V2, aplicar_spec, nomes_features
+
+
+def serie_semanal(n=30, semente=0, inicio='2023-01-01'):
+    aleatorio = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'DT_SEMANA': pd.date_range(inicio, periods=n, freq='W-SUN'),
+        'casos': aleatorio.integers(0, 50, n).astype(float),
+        'chuva_mm': aleatorio.uniform(0, 80, n),
+        'temp_media': aleatorio.uniform(20, 32, n),
+        'umidade': aleatorio.uniform(50, 95, n)
+    })
+
+
+def lags_com_shift(df, grupo=None):
+    """As features do notebook original: um shift() por coluna (por município no painel)."""
+    esperado = pd.DataFrame(index=df.index)
+    semana = df['DT_SEMANA'].dt.isocalendar().week.astype(float)
+    esperado['semana_do_ano'] = semana
+    esperado['semana_sin'] = np.sin(2 * np.pi * semana / 53)
+    esperado['semana_cos'] = np.cos(2 * np.pi * semana / 53)
+    for prefixos, lags in SPEC_V2['lags']:
+        for lag in lags:
+            for p in prefixos:
+                origem = df.groupby(grupo)[ORIGENS[p]] if grupo else df[ORIGENS[p]]
+                esperado[f'lag_{p}_w{lag}'] = origem.shift(lag)
+    return esperado
+
+
+def test_lags_iguais_ao_shift():
+    df = serie_semanal()
+    obtido = aplicar_spec(df)
+    nomes = nomes_features()
+    pd.testing.assert_frame_equal(obtido[nomes], lags_com_shift(df)[nomes], check_dtype=False, rtol=1e-5)
+
+
+def test_lags_por_grupo_nao_atravessam_municipios():
+    df = pd.concat([
+        serie_semanal(20, semente=1).assign(ID_MN_RESI='260410'),
+        serie_semanal(12, semente=2).assign(ID_MN_RESI='260890')
+    ], ignore_index=True)
+    obtido = aplicar_spec(df, grupo='ID_MN_RESI')
+    nomes = nomes_features()
+    pd.testing.assert_frame_equal(obtido[nomes], lags_com_shift(df, 'ID_MN_RESI')[nomes],
+                                  check_dtype=False, rtol=1e-5)
+    # Primeiras semanas do segundo município: sem lag vindo do primeiro
+    assert obtido.loc[20, 'lag_casos_w1'] != obtido.loc[20, 'lag_casos_w1']
+
+
+def test_janelas_iguais_ao_rolling():
+    df = serie_semanal()
+    spec = {'janelas': [(['casos'], [4], ['media', 'max'])]}
+    obtido = aplicar_spec(df, spec)
+    anteriores = df['casos'].rolling(4).agg(['mean', 'max']).shift(1)
+    np.testing.assert_allclose(obtido['media_casos_4w'], anteriores['mean'], rtol=1e-5)
+    np.testing.assert_allclose(obtido['max_casos_4w'], anteriores['max'], rtol=1e-5)
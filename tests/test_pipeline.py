@@ -0,0 +1,26 @@
+import pytest
+
+from pipeline import ETAPAS, dependencias, validar_etapas
+
+
+def test_etapas_do_projeto_tem_produtor_ou_fonte():
+    validar_etapas(ETAPAS)
+    deps = dependencias(ETAPAS)
+    assert deps['treino_municipal'] == ['merge']
+    assert deps['cenarios'] == ['merge']
+
+
+def test_entrada_sem_produtor():
+    etapas = [{'nome': 'a', 'script': 'a.py', 'entradas': ['x.parquet'], 'saidas': ['y.parquet']}]
+    with pytest.raises(ValueError, match="x.parquet"):
+        validar_etapas(etapas)
+    validar_etapas([{**etapas[0], 'fontes': ['x.parquet']}])
+
+
+def test_saida_com_dois_produtores():
+    etapas = [
+        {'nome': 'a', 'script': 'a.py', 'entradas': [], 'saidas': ['y.parquet']},
+        {'nome': 'b', 'script': 'b.py', 'entradas': [], 'saidas': ['y.parquet']}
+    ]
+    with pytest.raises(ValueError, match="produzida por a e b"):
+        validar_etapas(etapas)
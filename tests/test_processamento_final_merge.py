@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from processamento_final_merge import AGREGACAO_CLIMA_SEMANAL, agregar_clima_semanal, fim_da_semana
+
+
+def clima_diario():
+    aleatorio = np.random.default_rng(0)
+    partes = []
+    for codigo, inicio, dias in (('260410', '2023-12-20', 40), ('260290', '2024-01-03', 17)):
+        datas = pd.date_range(inicio, periods=dias, freq='D')
+        parte = pd.DataFrame({
+            'date': datas.date,
+            'ID_MN_RESI': codigo,
+            'temp_max': aleatorio.uniform(28, 35, dias),
+            'temp_min': aleatorio.uniform(18, 23, dias),
+            'temp_media': aleatorio.uniform(22, 29, dias),
+            'chuva_mm': aleatorio.uniform(0, 30, dias),
+            'umidade': aleatorio.uniform(50, 95, dias)
+        })
+        partes.append(parte)
+    df = pd.concat(partes, ignore_index=True)
+    # Dias sem medição (a API devolve NaN): ficam fora da agregação, como no resample
+    df.loc[[3, 4, 45], 'chuva_mm'] = np.nan
+    df.loc[[10], ['temp_max', 'umidade']] = np.nan
+    return df
+
+
+def test_fim_da_semana_igual_ao_resample():
+    datas = pd.date_range('2019-12-25', '2020-03-01', freq='D')
+    # Rótulo de cada semana do resample = domingo que a fecha (intervalo fechado à direita)
+    semanas = pd.Series(1, index=datas).resample('W-SUN').sum()
+    esperado = semanas.index[np.searchsorted(semanas.index, datas)]
+    np.testing.assert_array_equal(fim_da_semana(datas), esperado.to_numpy().astype('datetime64[D]'))
+
+
+def test_clima_semanal_igual_ao_resample():
+    df = clima_diario()
+    obtido = agregar_clima_semanal(df)
+
+    esperado = (df.assign(date=pd.to_datetime(df['date']))
+                .set_index('date').groupby('ID_MN_RESI')
+                .resample('W-SUN').agg(AGREGACAO_CLIMA_SEMANAL)
+                .reset_index().rename(columns={'date': 'DT_SEMANA'}))
+
+    colunas = ['ID_MN_RESI', 'DT_SEMANA'] + list(AGREGACAO_CLIMA_SEMANAL)
+    pd.testing.assert_frame_equal(obtido[colunas].reset_index(drop=True), esperado[colunas],
+                                  check_dtype=False, check_index_type=False)
@@ -0,0 +1,30 @@
+import pytest
+
+from registro_municipios import carregar_municipios, codigo_7_digitos
+
+CABECALHO = "codigo_ibge,codigo_sinan,nome,uf,geres,lat,lon\n"
+
+
+def gravar_cadastro(tmp_path, linhas):
+    arquivo = tmp_path / "municipios.csv"
+    arquivo.write_text(CABECALHO + "".join(linha + "\n" for linha in linhas), encoding='utf-8')
+    return str(arquivo)
+
+
+def test_digito_verificador_do_cadastro_publicado():
+    for municipio in carregar_municipios():
+        assert codigo_7_digitos(municipio['codigo_sinan']) == municipio['codigo_ibge']
+
+
+def test_codigo_ibge_vazio_ou_so_de_7_digitos(tmp_path):
+    arquivo = gravar_cadastro(tmp_path, [
+        ",260290,Buenos Aires,PE,II,-7.7,-35.3",
+        "2604106,,Carpina,PE,II,-7.8,-35.2"
+    ])
+    assert [m['codigo_sinan'] for m in carregar_municipios(arquivo)] == ['260290', '260410']
+
+
+def test_codigo_ibge_divergente(tmp_path):
+    arquivo = gravar_cadastro(tmp_path, ["2604107,260410,Carpina,PE,II,-7.8,-35.2"])
+    with pytest.raises(ValueError, match="esperado 2604106"):
+        carregar_municipios(arquivo)
@@ -0,0 +1,61 @@
+import json
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+import instrumentacao
+from cubo_semanal import CHAVE_REGIONAL
+from servico_previsao import LoteadorPrevisoes
+
+FEATURES = ['semana_do_ano', 'lag_casos_w1']
+
+
+class Booster:
+    def inplace_predict(self, X):
+        return X[:, 1] + 1
+
+
+class MotorFalso:
+    """Mesma interface do MotorPainel: entrada (X, datas, histórico) e modelo por município."""
+
+    def entrada(self, municipio, cenario):
+        semanas = 8
+        X = np.zeros((semanas, 1, len(FEATURES)), dtype=np.float32)
+        datas = np.arange('2024-01-07', semanas * 7 + 6, 7, dtype='datetime64[D]')[:semanas]
+        historico = np.full(10 if municipio == CHAVE_REGIONAL else 6, float(len(municipio)), dtype=np.float32)
+        return X, datas, historico
+
+    def modelo(self, municipio):
+        return Booster(), {'features': FEATURES}
+
+
+@pytest.fixture
+def log_metricas(tmp_path, monkeypatch):
+    arquivo = tmp_path / "metricas.jsonl"
+    monkeypatch.setattr(instrumentacao, 'ARQUIVO_METRICAS', str(arquivo))
+    return arquivo
+
+
+def test_uma_linha_de_metrica_por_micro_lote(log_metricas):
+    loteador = LoteadorPrevisoes(MotorFalso())
+    lote = [
+        ([('260410', 'obs'), (CHAVE_REGIONAL, 'obs')], 4, Future()),
+        ([('260410', 'obs'), ('260890', 'obs')], 6, Future())
+    ]
+    loteador._rodar(lote)
+
+    resultado = lote[1][2].result(timeout=1)
+    assert len(resultado[('260890', 'obs')][1]) == 6
+    linhas = [json.loads(linha) for linha in log_metricas.read_text(encoding='utf-8').splitlines()]
+    assert [linha['etapa'] for linha in linhas] == ['servico_lote']
+    # 3 séries distintas em 2 grupos (regional x municípios); semanas x séries previstas somadas
+    assert (linhas[0]['pedidos'], linhas[0]['series'], linhas[0]['grupos']) == (2, 3, 2)
+    assert linhas[0]['linhas'] == 4 * 1 + 6 * 2  # regional pedido só até 4 semanas
+
+
+def test_prever_recursivo_fora_do_servico_continua_medido(log_metricas):
+    from motor_previsao import prever_recursivo_lote
+    prever_recursivo_lote(Booster(), np.zeros((3, 2, 2), dtype=np.float32), FEATURES, np.ones(4))
+    linhas = [json.loads(linha) for linha in log_metricas.read_text(encoding='utf-8').splitlines()]
+    assert [linha['etapa'] for linha in linhas] == ['previsao_recursiva']
@@ -1,12 +1,100 @@
+import os
+import json
+
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-# Configuração visual
-sns.set_theme(style="whitegrid")
+from instrumentacao import anotar, contar, medir
+from motor_previsao import prever_recursivo
+from registro_modelos import chave_modelo, carregar_modelo, salvar_modelo, marcar_apelido
+
+def definir_features(df):
+    """Removemos DT_SEMANA e o alvo 'casos' da lista de input"""
+    return [c for c in df.columns if c not in ['DT_SEMANA', 'casos']]
+
+# Hiperparâmetros do modelo V2 (Histórico + Clima)
+PARAMETROS_V2 = dict(
+    n_estimators=1000,
+    learning_rate=0.01,
+    max_depth=6, # Um pouco mais profundo para capturar nuances do clima
+    subsample=0.8,
+    colsample_bytree=0.8,
+    random_state=42
+)
+
+# Nome estável do modelo regional no registro (painel e previsão carregam por ele)
+APELIDO_MODELO_REGIONAL = "v2_regional"
+
+# Melhor configuração encontrada pelo ajuste_hiperparametros.py (se existir)
+ARQUIVO_CONFIG_XGB = "config_xgb_v2.json"
+
+def carregar_config_xgb(arquivo=ARQUIVO_CONFIG_XGB):
+    """{'parametros', 'lags_casos', 'lags_clima', ...} ou None se ainda não houve ajuste."""
+    if not os.path.exists(arquivo):
+        return None
+    with open(arquivo, encoding='utf-8') as f:
+        return json.load(f)
+
+def filtrar_features_por_lags(features, lags_casos, lags_clima):
+    """Mantém só as colunas lag_* dos lags escolhidos (calendário e clima da semana ficam sempre)."""
+    selecionadas = []
+    for nome in features:
+        if nome.startswith('lag_'):
+            prefixo, lag = nome[4:].rsplit('_w', 1)
+            permitidos = lags_casos if prefixo == 'casos' else lags_clima
+            if int(lag) not in permitidos:
+                continue
+        selecionadas.append(nome)
+    return selecionadas
+
+def configurar_modelo_regional(df):
+    """
+    Features e parâmetros do modelo regional publicado: com config_xgb_v2.json
+    (ajuste_hiperparametros.py), os lags e parâmetros escolhidos; sem ele, todas
+    as features e PARAMETROS_V2 (parametros=None).
+    """
+    features = definir_features(df)
+    config = carregar_config_xgb()
+    if not config:
+        return features, None
+    print(f"⚙️ Usando configuração ajustada: {ARQUIVO_CONFIG_XGB}")
+    return filtrar_features_por_lags(features, config['lags_casos'], config['lags_clima']), config['parametros']
+
+@medir("treino_xgboost")
+def treinar_modelo_clima(df_treino, features, target='casos', n_jobs=None, parametros=None,
+                         usar_cache=True, apelido=None):
+    """
+    Modelo V2 (Histórico + Clima). parametros=None usa PARAMETROS_V2.
+    Com usar_cache, o modelo fica no registro (registro_modelos.py) sob o hash de
+    (dados de treino, features, parâmetros): o mesmo treino não é refeito.
+    """
+    parametros = parametros or PARAMETROS_V2
+    chave = chave_modelo(df_treino[features], df_treino[target], features, parametros)
+    registrado = carregar_modelo(chave) if usar_cache else None
 
+    contar(linhas=len(df_treino))
+    anotar(reaproveitado=registrado is not None)
+    if registrado is not None:
+        model = registrado[0]
+        print(f"♻️ Modelo reaproveitado do registro: {chave}")
+    else:
+        model = xgb.XGBRegressor(**parametros, n_jobs=n_jobs)
+        model.fit(df_treino[features], df_treino[target])
+        if usar_cache:
+            salvar_modelo(chave, model, features, {
+                'parametros': parametros,
+                'target': target,
+                'semanas_treino': len(df_treino),
+                'inicio_treino': df_treino['DT_SEMANA'].min() if 'DT_SEMANA' in df_treino else None,
+                'fim_treino': df_treino['DT_SEMANA'].max() if 'DT_SEMANA' in df_treino else None
+            })
+
+    if apelido and usar_cache:
+        marcar_apelido(apelido, chave)
+    return model
+
+@medir("treino_regional")
 def rodar_revanche_com_clima():
     print("🥊 Iniciando a Revanche do Modelo (Agora com Clima!)...")
     
@@ -20,53 +108,19 @@ def rodar_revanche_com_clima():
     
     print(f"📚 Treinando com {len(df_treino)} semanas (2019-2023)...")
     
-    # 3. Definir Features
-    # Removemos DT_SEMANA e o alvo 'casos' da lista de input
-    features = [c for c in df.columns if c not in ['DT_SEMANA', 'casos']]
-    target = 'casos'
+    # 3. Definir Features (e parâmetros ajustados, se houver)
+    features, parametros = configurar_modelo_regional(df)
     
     # 4. Treinar XGBoost
-    model = xgb.XGBRegressor(
-        n_estimators=1000,
-        learning_rate=0.01,
-        max_depth=6, # Um pouco mais profundo para capturar nuances do clima
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42
-    )
-    
-    model.fit(df_treino[features], df_treino[target])
+    model = treinar_modelo_clima(df_treino, features, parametros=parametros, apelido=APELIDO_MODELO_REGIONAL)
     
     # 5. O Loop de Previsão Recursiva (Walk-Forward)
     print("🔮 Prevendo 2024 semana a semana...")
     
     # Precisamos do histórico para calcular os lags de CASOS
     # (Os lags de CLIMA já estão prontos no dataframe df_2024_clima, pois baixamos o real)
-    historico_casos = list(df_treino['casos'].values)
-    previsoes_2024 = []
-    
-    # Itera sobre cada semana de 2024
-    for i, row in df_2024_clima.iterrows():
-        # A. Montar a linha de input baseada no que já sabemos (Clima + Calendário)
-        input_data = row[features].to_dict()
-        
-        # B. Atualizar os Lags de CASOS com base nas previsões anteriores (Recursão)
-        # Ex: lag_casos_w1 é a previsão da semana passada, não o zero que estava lá
-        input_data['lag_casos_w1'] = historico_casos[-1]
-        input_data['lag_casos_w2'] = historico_casos[-2]
-        input_data['lag_casos_w4'] = historico_casos[-4]
-        input_data['lag_casos_w8'] = historico_casos[-8]
-        
-        # Converter para DataFrame para o XGBoost
-        df_input = pd.DataFrame([input_data])
-        
-        # C. Prever
-        pred = model.predict(df_input)[0]
-        pred = max(0, pred) # Sem casos negativos
-        
-        # D. Salvar e Atualizar Histórico
-        previsoes_2024.append(pred)
-        historico_casos.append(pred) # Adiciona a previsão como "fato" para a próxima semana
+    # O motor atualiza lag_casos_w* num buffer NumPy e prevê direto no booster
+    previsoes_2024 = prever_recursivo(model, df_2024_clima, features, df_treino['casos'].values)
         
     # 6. Salvar Resultado
     df_2024_resultado = df_2024_clima[['DT_SEMANA']].copy()
@@ -76,6 +130,11 @@ def rodar_revanche_com_clima():
     print("💾 Previsão salva: previsao_2024_com_clima.parquet")
     
 
+    # Bibliotecas de gráfico só aqui: quem importa o módulo (painel, cenários) não paga por elas
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_theme(style="whitegrid")
+
     # Feature Importance (Para ver se o clima foi usado)
     plt.figure(figsize=(10, 8))
     xgb.plot_importance(model, max_num_features=15, height=0.5)
@@ -0,0 +1,170 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from instrumentacao import contar, medir
+from motor_previsao import prever_recursivo_lote
+from processamento_final_merge import ARQUIVO_PAINEL_MUNICIPAL, processar_merge_municipal
+from registro_modelos import chave_modelo, carregar_modelo, salvar_modelo, marcar_apelido
+from treinamento_com_dengue_e_clima import PARAMETROS_V2, definir_features
+
+ARQUIVO_PREVISAO_MUNICIPIOS = "previsao_2024_municipios.parquet"
+INICIO_PREVISAO = "2024-01-01"
+
+# Modo agrupado: um modelo só, com o código do município como feature
+CHAVE_AGRUPADO = "AGRUPADO"
+FEATURE_MUNICIPIO = "cod_municipio"
+# Nome do modelo agrupado no registro (o painel carrega por ele)
+APELIDO_MODELO_MUNICIPAL = "v2_municipal"
+
+# Matrizes do painel anexadas uma vez por worker (memória compartilhada)
+_PAINEL = {}
+
+
+def publicar_matriz(matriz):
+    """Copia a matriz para um bloco de memória compartilhada. Retorna (shm, descritor)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(matriz.nbytes, 1))
+    np.ndarray(matriz.shape, dtype=matriz.dtype, buffer=shm.buf)[:] = matriz
+    return shm, (shm.name, matriz.shape, matriz.dtype.str)
+
+
+def anexar_matriz(descritor):
+    """Abre (sem copiar) uma matriz publicada por publicar_matriz."""
+    nome, forma, tipo = descritor
+    shm = shared_memory.SharedMemory(name=nome)
+    return shm, np.ndarray(forma, dtype=tipo, buffer=shm.buf)
+
+
+def _inicializar_worker(descritor_X, descritor_y):
+    _PAINEL['X'] = anexar_matriz(descritor_X)
+    _PAINEL['y'] = anexar_matriz(descritor_y)
+
+
+def _treinar_municipio(codigo, inicio, fim, n_treino, features):
+    """Worker: treina o modelo de um município (1 thread) e prevê as semanas seguintes ao treino."""
+    X = _PAINEL['X'][1]
+    y = _PAINEL['y'][1]
+    corte = inicio + n_treino
+
+    model = xgb.XGBRegressor(**PARAMETROS_V2, n_jobs=1)
+    model.fit(X[inicio:corte], y[inicio:corte])
+
+    # Cópia: o motor escreve os lags de casos no buffer e a matriz é compartilhada
+    futuro = X[corte:fim].copy()[:, None, :]
+    previsoes = prever_recursivo_lote(model, futuro, features, y[inicio:corte])[0]
+    return codigo, bytes(model.get_booster().save_raw()), previsoes
+
+
+def blocos_municipios(painel, inicio_previsao=INICIO_PREVISAO):
+    """[(codigo, linha inicial, linha final, semanas de treino)] do painel ordenado."""
+    treino = (painel['DT_SEMANA'] < inicio_previsao).to_numpy()
+    blocos = []
+    for codigo, linhas in painel.groupby('ID_MN_RESI', sort=False).indices.items():
+        inicio, fim = int(linhas[0]), int(linhas[-1]) + 1
+        blocos.append((codigo, inicio, fim, int(treino[inicio:fim].sum())))
+    return blocos
+
+
+@medir("treino_municipal")
+def treinar_municipios(painel, modo='individual', max_workers=None, inicio_previsao=INICIO_PREVISAO):
+    """
+    Treina e prevê por município.
+
+    - 'individual': um XGBoost por ID_MN_RESI, distribuídos num pool de processos
+      (1 thread cada). X e y ficam em memória compartilhada; cada worker só
+      recebe os índices do seu município.
+    - 'agrupado': um modelo só para o painel inteiro (código do município como
+      feature), usando todas as threads do XGBoost.
+
+    Retorna (previsões por município/semana, {chave: booster}).
+    """
+    painel = painel.sort_values(['ID_MN_RESI', 'DT_SEMANA']).reset_index(drop=True)
+    features = [c for c in definir_features(painel) if c != 'ID_MN_RESI']
+    if modo == 'agrupado':
+        painel[FEATURE_MUNICIPIO] = painel['ID_MN_RESI'].astype(int)
+        features.append(FEATURE_MUNICIPIO)
+
+    X = np.ascontiguousarray(painel[features].to_numpy(dtype=np.float32))
+    y = painel['casos'].to_numpy(dtype=np.float32)
+    blocos = blocos_municipios(painel, inicio_previsao)
+    contar(linhas=len(painel), municipios=len(blocos))
+    max_workers = max_workers or os.cpu_count() or 1
+
+    previsoes = np.full(len(painel), np.nan, dtype=np.float32)
+    modelos = {}
+
+    if modo == 'agrupado':
+        treino = (painel['DT_SEMANA'] < inicio_previsao).to_numpy()
+        # Registro de modelos: mesmo painel + mesma spec = modelo reaproveitado
+        chave = chave_modelo(X[treino], y[treino], features, PARAMETROS_V2)
+        registrado = carregar_modelo(chave)
+        if registrado is not None:
+            model = registrado[0]
+        else:
+            model = xgb.XGBRegressor(**PARAMETROS_V2, n_jobs=max_workers)
+            model.fit(X[treino], y[treino])
+            salvar_modelo(chave, model, features, {
+                'parametros': PARAMETROS_V2,
+                'modo': modo,
+                'municipios': int(painel['ID_MN_RESI'].nunique()),
+                'linhas_treino': int(treino.sum())
+            })
+        marcar_apelido(APELIDO_MODELO_MUNICIPAL, chave)
+        modelos[CHAVE_AGRUPADO] = model.get_booster()
+        for codigo, inicio, fim, n_treino in blocos:
+            corte = inicio + n_treino
+            previsoes[corte:fim] = prever_recursivo_lote(
+                model, X[corte:fim].copy()[:, None, :], features, y[inicio:corte]
+            )[0]
+    else:
+        shm_X, descritor_X = publicar_matriz(X)
+        shm_y, descritor_y = publicar_matriz(y)
+        try:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(blocos)),
+                                     initializer=_inicializar_worker,
+                                     initargs=(descritor_X, descritor_y)) as executor:
+                futuros = {
+                    executor.submit(_treinar_municipio, codigo, inicio, fim, n_treino, features): (inicio + n_treino, fim)
+                    for codigo, inicio, fim, n_treino in blocos
+                }
+                for futuro in futuros:
+                    codigo, modelo_bruto, previsto = futuro.result()
+                    corte, fim = futuros[futuro]
+                    previsoes[corte:fim] = previsto
+                    booster = xgb.Booster()
+                    booster.load_model(bytearray(modelo_bruto))
+                    modelos[codigo] = booster
+        finally:
+            for shm in (shm_X, shm_y):
+                shm.close()
+                shm.unlink()
+
+    resultado = painel[['ID_MN_RESI', 'DT_SEMANA', 'casos']].copy()
+    resultado['casos_previstos_ia'] = previsoes
+    resultado = resultado[resultado['DT_SEMANA'] >= inicio_previsao].reset_index(drop=True)
+    return resultado, modelos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Modelo V2 por município (painel município x semana).")
+    parser.add_argument("--modo", choices=["individual", "agrupado"], default="individual",
+                        help="Um modelo por município ou um modelo agrupado para o painel todo.")
+    parser.add_argument("--workers", type=int, default=None, help="Processos (individual) ou threads (agrupado).")
+    args = parser.parse_args()
+
+    # Painel gravado pela etapa de merge; sem ele, a fusão roda aqui
+    if os.path.exists(ARQUIVO_PAINEL_MUNICIPAL):
+        print(f"📂 Painel município x semana: {ARQUIVO_PAINEL_MUNICIPAL}")
+        painel = pd.read_parquet(ARQUIVO_PAINEL_MUNICIPAL)
+    else:
+        painel = processar_merge_municipal()
+    if painel is not None:
+        print(f"📚 Treinando modo '{args.modo}' e prevendo 2024...")
+        resultado, modelos = treinar_municipios(painel, args.modo, args.workers)
+        resultado.to_parquet(ARQUIVO_PREVISAO_MUNICIPIOS, index=False)
+        print(f"💾 Previsão salva: {ARQUIVO_PREVISAO_MUNICIPIOS} ({len(modelos)} modelo(s))")